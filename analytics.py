@@ -0,0 +1,302 @@
+"""
+Append-only analytics with rolled-up hourly counters.
+
+Request handlers only update in-memory counters and enqueue the event, which
+is O(1) and never touches disk. A background writer drains the queue in
+batches and appends the events either to a JSON-lines log or to a SQLite
+table in WAL mode. Per-hour visit and download counters are persisted next
+to the events so stats such as visits_24h are answered from at most 24
+buckets instead of by scanning raw events.
+
+The counters never need old raw events, so they are not kept forever: the
+JSON-lines log is rotated once it has been folded into a snapshot and grown
+past max_log_bytes, and the SQLite writer deletes events older than
+retention_hours.
+"""
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+
+
+class Analytics:
+    """Base class holding the counters and the background writer thread"""
+
+    def __init__(self, retention_hours=24 * 30, recent_size=20, batch_size=500):
+        self.retention_hours = retention_hours
+        self.batch_size = batch_size
+        self.total_visits = 0
+        self.total_downloads = 0
+        self.hourly = {}  # hour start timestamp -> {'visits': n, 'downloads': n}
+        self.recent_visits = deque(maxlen=recent_size)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._load()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def log_visit(self, page, ip):
+        """Count a page visit and queue it for the event log"""
+        event = {'type': 'visit', 'timestamp': time.time(), 'page': page, 'ip': ip}
+        with self._lock:
+            self._apply(event)
+        self._queue.put(event)
+
+    def increment_downloads(self):
+        """Count a started download and queue it for the event log"""
+        event = {'type': 'download', 'timestamp': time.time()}
+        with self._lock:
+            self._apply(event)
+            total = self.total_downloads
+        self._queue.put(event)
+        return total
+
+    def stats(self):
+        """Return the dashboard numbers from the rolled-up counters"""
+        current_hour = int(time.time() // HOUR * HOUR)
+        with self._lock:
+            visits_24h = sum(self.hourly.get(current_hour - i * HOUR, {}).get('visits', 0)
+                             for i in range(24))
+            return {
+                'total_visits': self.total_visits,
+                'total_downloads': self.total_downloads,
+                'visits_24h': visits_24h,
+                'recent_visits': [self._format_visit(v) for v in self.recent_visits]
+            }
+
+    def flush(self, timeout=5):
+        """Block until every queued event has been written"""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    def _apply(self, event):
+        """Fold one event into the counters; caller holds the lock"""
+        hour = int(event['timestamp'] // HOUR * HOUR)
+        bucket = self.hourly.get(hour)
+        if bucket is None:
+            bucket = self.hourly[hour] = {'visits': 0, 'downloads': 0}
+            self._prune(hour)
+        if event['type'] == 'visit':
+            self.total_visits += 1
+            bucket['visits'] += 1
+            self.recent_visits.append(event)
+        elif event['type'] == 'download':
+            self.total_downloads += 1
+            bucket['downloads'] += 1
+
+    def _prune(self, current_hour):
+        cutoff = current_hour - self.retention_hours * HOUR
+        for hour in [h for h in self.hourly if h < cutoff]:
+            del self.hourly[hour]
+
+    @staticmethod
+    def _format_visit(event):
+        return {
+            'timestamp': datetime.fromtimestamp(event['timestamp']).isoformat(),
+            'page': event['page'],
+            'ip': event['ip']
+        }
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                logger.error(f"Analytics write error ({len(batch)} events dropped): {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _write_batch(self, events):
+        raise NotImplementedError
+
+
+class LogAnalytics(Analytics):
+    """Appends events to a JSON-lines file and snapshots the hourly rollups beside it"""
+
+    def __init__(self, path='/tmp/analytics.log', snapshot_interval=60, max_log_bytes=16 * 1024 * 1024, **kwargs):
+        self.path = path
+        self.rollup_path = f"{path}.rollup.json"
+        self.snapshot_interval = snapshot_interval
+        self.max_log_bytes = max_log_bytes
+        self._offset = 0
+        self._last_snapshot = time.time()
+        super().__init__(**kwargs)
+
+    def _load(self):
+        """Restore the last rollup snapshot and replay only events logged after it"""
+        try:
+            with open(self.rollup_path, 'r') as f:
+                snapshot = json.load(f)
+            self.total_visits = snapshot['total_visits']
+            self.total_downloads = snapshot['total_downloads']
+            self.hourly = {int(h): c for h, c in snapshot['hourly'].items()}
+            self.recent_visits.extend(snapshot['recent_visits'])
+            self._offset = snapshot['offset']
+        except (OSError, ValueError, KeyError):
+            self._offset = 0
+
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            if self._offset > os.path.getsize(self.path):
+                self._offset = 0  # log was truncated or replaced
+            f.seek(self._offset)
+            for line in f:
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError):
+                    continue
+            self._offset = f.tell()
+
+    def _write_batch(self, events):
+        data = ''.join(json.dumps(event) + '\n' for event in events).encode()
+        with open(self.path, 'ab') as f:
+            f.write(data)
+            self._offset = f.tell()
+        # Only snapshot once the queue is drained so the counters match the offset
+        if self._queue.empty() and time.time() - self._last_snapshot >= self.snapshot_interval:
+            self._snapshot()
+            if self._offset >= self.max_log_bytes:
+                self._rotate()
+
+    def _rotate(self):
+        """Move the log, which the snapshot now covers, aside and start an empty one"""
+        # If the process dies before the new snapshot, _load() sees an offset past the
+        # end of the new log and replays it from the start, which is still correct
+        os.replace(self.path, f"{self.path}.1")
+        self._offset = 0
+        self._snapshot()
+
+    def _snapshot(self):
+        with self._lock:
+            snapshot = {
+                'total_visits': self.total_visits,
+                'total_downloads': self.total_downloads,
+                'hourly': {h: dict(c) for h, c in self.hourly.items()},
+                'recent_visits': list(self.recent_visits),
+                'offset': self._offset
+            }
+        tmp_path = f"{self.rollup_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.rollup_path)
+        self._last_snapshot = time.time()
+
+
+class SQLiteAnalytics(Analytics):
+    """Stores events and hourly rollups in a SQLite database in WAL mode"""
+
+    def __init__(self, path='/tmp/analytics.db', **kwargs):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(
+            'CREATE TABLE IF NOT EXISTS events ('
+            'timestamp REAL NOT NULL, type TEXT NOT NULL, page TEXT, ip TEXT);'
+            'CREATE TABLE IF NOT EXISTS hourly ('
+            'hour INTEGER PRIMARY KEY, visits INTEGER NOT NULL DEFAULT 0, '
+            'downloads INTEGER NOT NULL DEFAULT 0);'
+        )
+        self._conn.commit()
+        self._next_prune = 0
+        super().__init__(**kwargs)
+
+    def _load(self):
+        """Restore the counters from the rollup table; raw events are not scanned"""
+        cutoff = int(time.time() // HOUR * HOUR) - self.retention_hours * HOUR
+        totals = self._conn.execute(
+            'SELECT COALESCE(SUM(visits), 0), COALESCE(SUM(downloads), 0) FROM hourly'
+        ).fetchone()
+        self.total_visits, self.total_downloads = totals
+        for hour, visits, downloads in self._conn.execute(
+                'SELECT hour, visits, downloads FROM hourly WHERE hour >= ?', (cutoff,)):
+            self.hourly[hour] = {'visits': visits, 'downloads': downloads}
+        rows = self._conn.execute(
+            "SELECT timestamp, page, ip FROM events WHERE type = 'visit' "
+            'ORDER BY rowid DESC LIMIT ?', (self.recent_visits.maxlen,)
+        ).fetchall()
+        for timestamp, page, ip in reversed(rows):
+            self.recent_visits.append({'type': 'visit', 'timestamp': timestamp, 'page': page, 'ip': ip})
+
+    def stats(self):
+        """Return the dashboard numbers from the shared tables, so every worker reports the same.
+
+        Events this process has queued but not yet written are not included.
+        """
+        current_hour = int(time.time() // HOUR * HOUR)
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            total_visits, total_downloads = conn.execute(
+                'SELECT COALESCE(SUM(visits), 0), COALESCE(SUM(downloads), 0) FROM hourly'
+            ).fetchone()
+            visits_24h = conn.execute(
+                'SELECT COALESCE(SUM(visits), 0) FROM hourly WHERE hour > ?', (current_hour - 24 * HOUR,)
+            ).fetchone()[0]
+            rows = conn.execute(
+                "SELECT timestamp, page, ip FROM events WHERE type = 'visit' "
+                'ORDER BY rowid DESC LIMIT ?', (self.recent_visits.maxlen,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return {
+            'total_visits': total_visits,
+            'total_downloads': total_downloads,
+            'visits_24h': visits_24h,
+            'recent_visits': [self._format_visit({'timestamp': timestamp, 'page': page, 'ip': ip})
+                              for timestamp, page, ip in reversed(rows)]
+        }
+
+    def _write_batch(self, events):
+        rollup = {}
+        for event in events:
+            hour = int(event['timestamp'] // HOUR * HOUR)
+            counts = rollup.setdefault(hour, [0, 0])
+            counts[0 if event['type'] == 'visit' else 1] += 1
+        with self._conn:
+            self._conn.executemany(
+                'INSERT INTO events (timestamp, type, page, ip) VALUES (?, ?, ?, ?)',
+                [(e['timestamp'], e['type'], e.get('page'), e.get('ip')) for e in events]
+            )
+            self._conn.executemany(
+                'INSERT INTO hourly (hour, visits, downloads) VALUES (?, ?, ?) '
+                'ON CONFLICT(hour) DO UPDATE SET visits = visits + excluded.visits, '
+                'downloads = downloads + excluded.downloads',
+                [(hour, v, d) for hour, (v, d) in rollup.items()]
+            )
+            # Old raw events only take space; the hourly rollups keep the totals
+            if time.time() >= self._next_prune:
+                cutoff = time.time() - self.retention_hours * HOUR
+                self._conn.execute('DELETE FROM events WHERE timestamp < ?', (cutoff,))
+                self._next_prune = time.time() + HOUR
+
+
+def create_analytics():
+    """Build the analytics backend selected by the ANALYTICS_BACKEND environment variable"""
+    backend = os.environ.get('ANALYTICS_BACKEND', 'log').lower()
+    if backend == 'sqlite':
+        return SQLiteAnalytics(os.environ.get('ANALYTICS_PATH', '/tmp/analytics.db'))
+    if backend != 'log':
+        logger.warning(f"Unknown ANALYTICS_BACKEND '{backend}', falling back to log")
+    return LogAnalytics(os.environ.get('ANALYTICS_PATH', '/tmp/analytics.log'))
@@ -1,11 +1,11 @@
 from http.server import BaseHTTPRequestHandler
 import json
-import re
+import os
+import sys
 
-def validate_youtube_url(url):
-    """Validate if the URL is a valid YouTube URL"""
-    youtube_regex = r'^(https?:\/\/)?(www\.)?(youtube\.com|youtu\.be)\/.+'
-    return bool(re.match(youtube_regex, url))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from youtube_url import validate_youtube_url
 
 class handler(BaseHTTPRequestHandler):
     def do_POST(self):
@@ -0,0 +1,323 @@
+"""
+Asyncio (ASGI) serving mode for the web downloader.
+
+The hot API routes are served natively on the event loop:
+- /api/list_formats runs the yt-dlp extraction on a bounded thread pool and
+  awaits it, so slow lookups do not hold a request thread each
+- /api/progress/<id> and /api/progress/<id>/stream await progress changes
+  with ProgressBroadcaster.wait_async(), so thousands of open progress
+  streams cost one coroutine each instead of one thread each
+
+Every other route falls through to the Flask app in railway_app.py, run on
+a thread pool of its own, and downloads keep running on its
+DownloadScheduler workers.
+
+Run with: uvicorn asgi_app:app --host 0.0.0.0 --port $PORT
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+import railway_app
+from railway_app import (TRUSTED_PROXIES, check_rate_limit, download_sessions, format_limiter, format_listing,
+                         progress_broadcaster, progress_payload)
+from rate_limiter import client_address
+
+logger = logging.getLogger(__name__)
+
+# Concurrent yt-dlp format lookups; further lookups wait for a free thread
+EXTRACT_WORKERS = int(os.environ.get('EXTRACT_WORKERS', 16))
+extract_executor = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix="extract")
+
+# Concurrent requests handled by the Flask app, including file transfers
+WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 32))
+wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+# Response bytes collected from the Flask app before each send
+WSGI_SEND_BUFFER = 256 * 1024
+
+PROGRESS_RE = re.compile(r'^/api/progress/([\w-]+)(/stream)?$')
+
+
+def build_environ(scope, body):
+    """Translate an ASGI HTTP scope into a WSGI environ"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            environ[name] = value
+            continue
+        key = f"HTTP_{name}"
+        if key in environ:
+            # HTTP/2 may split cookies over several header fields; they join with "; ", not ","
+            value = f"{environ[key]}{'; ' if key == 'HTTP_COOKIE' else ','}{value}"
+        environ[key] = value
+    return environ
+
+
+async def flask_app(scope, receive, send):
+    """Serve a request with the Flask app on the WSGI thread pool.
+
+    Unlike asgiref's WsgiToAsgi, which runs every request on one shared
+    thread, each request gets its own pool thread, so a long file transfer
+    does not hold up other routes.
+    """
+    if scope['type'] != 'http':
+        return
+    loop = asyncio.get_running_loop()
+    with SpooledTemporaryFile(max_size=65536) as body:
+        while True:
+            message = await receive()
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+
+        # Stop iterating the response once the client goes away
+        disconnected = threading.Event()
+        async def wait_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+        watcher = asyncio.ensure_future(wait_disconnect())
+        try:
+            await loop.run_in_executor(wsgi_executor, run_wsgi, scope, body, loop, send, disconnected)
+        finally:
+            watcher.cancel()
+
+
+def run_wsgi(scope, body, loop, send, disconnected):
+    """Call the Flask app and relay its response; runs on a WSGI pool thread"""
+    response_start = {}
+
+    def start_response(status, headers, exc_info=None):
+        response_start.update({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers]
+        })
+
+    def send_sync(message):
+        if disconnected.is_set():
+            raise ConnectionAbortedError("client disconnected")
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    result = railway_app.app(build_environ(scope, body), start_response)
+    try:
+        started = False
+        # send_file yields small blocks of a sized body; batch them to cut event loop round trips.
+        # Event streams and unsized bodies (files still being written) are relayed as they come.
+        headers = dict(response_start.get('headers', []))
+        coalesce = (b'content-length' in headers
+                    and not headers.get(b'content-type', b'').startswith(b'text/event-stream'))
+        buffer = bytearray()
+        for chunk in result:
+            if not started:
+                send_sync(response_start)
+                started = True
+            buffer += chunk
+            if buffer and (not coalesce or len(buffer) >= WSGI_SEND_BUFFER):
+                send_sync({'type': 'http.response.body', 'body': bytes(buffer), 'more_body': True})
+                buffer.clear()
+        if not started:
+            send_sync(response_start)
+        send_sync({'type': 'http.response.body', 'body': bytes(buffer)})
+    except ConnectionAbortedError:
+        pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+
+async def read_json(receive):
+    """Read the whole request body and decode it as JSON, or None if it is not JSON"""
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    try:
+        return json.loads(body or b'null')
+    except ValueError:
+        return None
+
+
+async def send_json(send, payload, status=200, headers=None):
+    body = json.dumps(payload).encode()
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode())
+        ] + [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def session_payload(session_id):
+    """progress_payload() without touching the session store on the event loop"""
+    if session_id in download_sessions:
+        return progress_payload(session_id)
+    return await asyncio.get_running_loop().run_in_executor(None, progress_payload, session_id)
+
+
+def scope_client(scope):
+    """Return the client IP of an ASGI request, the way railway_app.request_client() does"""
+    forwarded_for = ','.join(value.decode('latin1') for name, value in scope['headers']
+                             if name == b'x-forwarded-for')
+    remote_addr = scope['client'][0] if scope.get('client') else None
+    return client_address(remote_addr, forwarded_for or None, TRUSTED_PROXIES)
+
+
+async def list_formats(scope, receive, send):
+    data = await read_json(receive)
+    try:
+        url = data.get('url', '').strip()
+        # The video check may read the info cache from disk, so it runs off the event loop
+        limited = await asyncio.get_running_loop().run_in_executor(
+            None, check_rate_limit, format_limiter, scope_client(scope), url)
+        if limited:
+            await send_json(send, *limited)
+            return
+        payload = await asyncio.get_running_loop().run_in_executor(extract_executor, format_listing, url)
+    except Exception as e:
+        payload = {
+            'success': False,
+            'error': f'Error fetching formats: {str(e)}'
+        }
+    await send_json(send, payload)
+
+
+async def get_progress(session_id, send):
+    payload = await session_payload(session_id)
+    if payload is None:
+        payload = {
+            'success': False,
+            'error': 'Session not found'
+        }
+    await send_json(send, payload)
+
+
+async def stream_progress(session_id, receive, send):
+    """Server-Sent Events version of get_progress, same protocol as the Flask route"""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no')
+        ]
+    })
+
+    # Servers drop writes after a disconnect, so watch for it explicitly
+    async def wait_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+    disconnected = asyncio.ensure_future(wait_disconnect())
+
+    async def event(data):
+        await send({'type': 'http.response.body', 'body': data.encode(), 'more_body': True})
+
+    try:
+        last_payload = None
+        version = progress_broadcaster.version(session_id)
+        while not disconnected.done():
+            payload = await session_payload(session_id)
+            if payload is None:
+                await event(f"data: {json.dumps({'success': False, 'error': 'Session not found'})}\n\n")
+                break
+
+            # Only push when something the client shows has changed
+            if payload != last_payload:
+                await event(f"data: {json.dumps(payload)}\n\n")
+                last_payload = payload
+            if payload['status'] in ('completed', 'error'):
+                break
+
+            # Throttle, then wait for the download to publish a change or the client to leave
+            await asyncio.sleep(railway_app.PROGRESS_STREAM_INTERVAL)
+            local = session_id in download_sessions and payload['status'] != 'queued'
+            changed = asyncio.ensure_future(
+                progress_broadcaster.wait_async(session_id, version, 15 if local else 1))
+            await asyncio.wait({changed, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not changed.done():
+                changed.cancel()
+                break
+            new_version = changed.result()
+            if new_version == version and local:
+                await event(": keepalive\n\n")
+            version = new_version
+    finally:
+        disconnected.cancel()
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            logger.info(f"ASGI app ready with {EXTRACT_WORKERS} extraction and {WSGI_THREADS} WSGI threads")
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            extract_executor.shutdown(wait=False, cancel_futures=True)
+            wsgi_executor.shutdown(wait=False, cancel_futures=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http':
+        path, method = scope['path'], scope['method']
+        if path == '/api/list_formats' and method == 'POST':
+            await list_formats(scope, receive, send)
+            return
+        match = PROGRESS_RE.match(path)
+        if match and method == 'GET':
+            if match.group(2):
+                await stream_progress(match.group(1), receive, send)
+            else:
+                await get_progress(match.group(1), send)
+            return
+
+    await flask_app(scope, receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 8080))
+    print(f"🚀 Starting async YouTube Downloader on http://localhost:{port}")
+    uvicorn.run(app, host='0.0.0.0', port=port)
@@ -0,0 +1,230 @@
+"""
+Batch and playlist download jobs.
+
+A batch takes a list of video URLs and playlist URLs. Every item becomes an
+ordinary download session, so items share the download cache, join
+identical running downloads and report through /api/progress like any other
+download. The batch adds three things on top:
+- playlists are expanded lazily: the next entry (and the next page of the
+  playlist) is only fetched once the batch has a free slot for it
+- each batch keeps at most `parallel` items in the download pool, so one
+  long playlist cannot fill the queue that single downloads wait in
+- items the pool cannot take yet (QueueFullError) are retried instead of
+  failing the batch
+"""
+
+import logging
+import threading
+import time
+import uuid
+
+import yt_dlp
+
+from download_scheduler import QueueFullError
+from youtube_url import parse_youtube_url, playlist_id_from_url
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ('completed', 'error')
+
+
+def is_batch_source(url):
+    """Return True for URLs a batch accepts: single videos and playlists"""
+    return parse_youtube_url(url) is not None or playlist_id_from_url(url) is not None
+
+
+def playlist_entries(url, user_agent=None):
+    """Yield watch URLs of a playlist, fetching further pages only as they are consumed"""
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'skip_download': True,
+        'extract_flat': 'in_playlist',
+        'extractor_retries': 3
+    }
+    if user_agent:
+        ydl_opts['user_agent'] = user_agent
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        # Unprocessed results keep the extractor's entry generator, which pages on demand
+        info = ydl.extract_info(url, download=False, process=False)
+        while info.get('_type') in ('url', 'url_transparent'):
+            info = ydl.extract_info(info['url'], download=False, process=False)
+        for entry in info.get('entries') or []:
+            video_id = entry.get('id') if entry else None
+            if video_id:
+                yield f"https://www.youtube.com/watch?v={video_id}"
+
+
+def expand_sources(sources, max_items, user_agent=None):
+    """Yield canonical video URLs for a list of video and playlist URLs, up to max_items"""
+    count = 0
+    for source in sources:
+        parsed = parse_youtube_url(source)
+        urls = [parsed.canonical_url] if parsed else playlist_entries(source, user_agent)
+        for url in urls:
+            if count >= max_items:
+                return
+            count += 1
+            yield url
+
+
+class BatchJob:
+    """Items of one batch and how far its expansion has got"""
+
+    def __init__(self, batch_id, sources, quality, client=None):
+        self.batch_id = batch_id
+        self.sources = sources
+        self.quality = quality
+        self.client = client
+        self.items = []  # {'url', 'session_id', 'error'} in expansion order
+        self.expanded = False
+        self.finished = False
+        self.cancelled = False
+        self.error = None
+        self.created_at = time.time()
+        self.wake = threading.Event()
+
+    def snapshot(self):
+        """Return a JSON-serializable copy for the session store"""
+        return {
+            'batch': True,
+            'quality': self.quality,
+            'created_at': self.created_at,
+            'expanded': self.expanded,
+            'cancelled': self.cancelled,
+            'error': self.error,
+            'items': [dict(item) for item in self.items]
+        }
+
+
+class BatchRunner:
+    """Feeds the items of each batch to the download pool from a thread per batch.
+
+    start_item(url, quality, client) starts a download for the client that
+    started the batch and returns its session ID, raising QueueFullError
+    while the pool is full. item_status(session_id)
+    returns a session's status, cancel_item(session_id) cancels a download
+    that has not started, and on_change(job) is called whenever the batch
+    gains an item or finishes.
+    """
+
+    def __init__(self, start_item, item_status, cancel_item, on_change, parallel=2,
+                 max_batches=4, max_items=200, retry_interval=2.0, retention=60, user_agent=None):
+        self.start_item = start_item
+        self.item_status = item_status
+        self.cancel_item = cancel_item
+        self.on_change = on_change
+        self.parallel = parallel
+        self.max_batches = max_batches
+        self.max_items = max_items
+        self.retry_interval = retry_interval
+        self.retention = retention
+        self.user_agent = user_agent
+        self._jobs = {}  # batch_id -> BatchJob
+        self._sessions = {}  # item session_id -> batch_id
+        self._lock = threading.Lock()
+
+    def submit(self, sources, quality, client=None):
+        """Start a batch and return its BatchJob; raises QueueFullError when too many are running"""
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if not job.finished)
+            if running >= self.max_batches:
+                raise QueueFullError(f"Too many batches running ({self.max_batches})")
+            job = BatchJob(f"batch-{uuid.uuid4()}", list(sources), quality, client)
+            self._jobs[job.batch_id] = job
+        self.on_change(job)
+        thread = threading.Thread(target=self._run, args=(job,), name=f"batch-{job.batch_id[6:14]}", daemon=True)
+        thread.start()
+        return job
+
+    def get(self, batch_id):
+        """Return the batch if this process runs it, else None"""
+        with self._lock:
+            return self._jobs.get(batch_id)
+
+    def batch_for(self, session_id):
+        """Return the ID of the batch an item session belongs to, or None"""
+        return self._sessions.get(session_id)
+
+    def notify(self, batch_id):
+        """Wake the batch's feeder, e.g. because one of its items changed status"""
+        job = self.get(batch_id)
+        if job is not None:
+            job.wake.set()
+
+    def cancel(self, batch_id):
+        """Stop expanding a batch and cancel its queued items; running items finish"""
+        job = self.get(batch_id)
+        if job is None:
+            return False
+        job.cancelled = True
+        job.wake.set()
+        for item in list(job.items):
+            if item['session_id'] and self.item_status(item['session_id']) not in TERMINAL_STATUSES:
+                self.cancel_item(item['session_id'])
+        return True
+
+    def stats(self):
+        """Return batch counts for health checks"""
+        with self._lock:
+            return {
+                'running': sum(1 for job in self._jobs.values() if not job.finished),
+                'max_batches': self.max_batches,
+                'parallel': self.parallel
+            }
+
+    def _in_flight(self, job):
+        return sum(1 for item in job.items
+                   if item['session_id'] and self.item_status(item['session_id']) not in TERMINAL_STATUSES)
+
+    def _wait_for_slot(self, job, slots):
+        while not job.cancelled and self._in_flight(job) > self.parallel - slots:
+            job.wake.wait(self.retry_interval)
+            job.wake.clear()
+
+    def _start(self, job, item):
+        while not job.cancelled:
+            try:
+                session_id = self.start_item(item['url'], job.quality, job.client)
+            except QueueFullError:
+                job.wake.wait(self.retry_interval)
+                job.wake.clear()
+                continue
+            except Exception as e:
+                item['error'] = str(e)
+                return
+            self._sessions[session_id] = job.batch_id
+            item['session_id'] = session_id
+            return
+
+    def _run(self, job):
+        try:
+            for url in expand_sources(job.sources, self.max_items, self.user_agent):
+                self._wait_for_slot(job, 1)
+                if job.cancelled:
+                    break
+                item = {'url': url, 'session_id': None, 'error': None}
+                job.items.append(item)
+                self._start(job, item)
+                self.on_change(job)
+        except Exception as e:
+            job.error = f"Could not expand playlist: {e}"
+            logger.error(f"Batch {job.batch_id} expansion failed: {e}")
+        finally:
+            job.expanded = True
+            self.on_change(job)
+
+        # Stay until every item ends so item changes keep reaching the batch
+        self._wait_for_slot(job, self.parallel)
+        job.finished = True
+        logger.info(f"Batch {job.batch_id} finished with {len(job.items)} items")
+        self.on_change(job)
+        cleanup = threading.Timer(self.retention, self._forget, args=(job,))
+        cleanup.daemon = True
+        cleanup.start()
+
+    def _forget(self, job):
+        with self._lock:
+            self._jobs.pop(job.batch_id, None)
+            for item in job.items:
+                self._sessions.pop(item['session_id'], None)
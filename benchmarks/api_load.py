@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Offline load benchmark for the web API.
+
+yt_dlp.YoutubeDL.extract_info is replaced with a stub that returns a
+recorded info-dict fixture, and every format URL in the fixture points at a
+local HTTP server, so the whole request path (format listing, scheduling,
+yt-dlp's downloader, progress and file serving) runs without network access.
+
+Each simulated user performs one journey:
+  POST /api/list_formats -> POST /api/download -> GET /api/progress/<id>
+  until finished -> GET /api/download_file/<id>
+
+The report lists p50/p95/p99 latency per endpoint, journey and byte
+throughput, and process RSS, optionally as JSON for comparing runs.
+
+Usage:
+  python benchmarks/api_load.py [--users 40] [--concurrency 8] [--videos 10]
+  python benchmarks/api_load.py --record https://www.youtube.com/watch?v=...  (needs network)
+"""
+
+import argparse
+import copy
+import json
+import os
+import re
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests
+import yt_dlp
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'youtube_video.json')
+VIDEO_ID_RE = re.compile(r'(?:v=|youtu\.be/|shorts/|embed/)([\w-]{11})')
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """Serves the same random payload for every media URL, with Range support"""
+
+    protocol_version = 'HTTP/1.1'
+    data = b''
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def _serve(self, head):
+        size = len(self.data)
+        start, end, status = 0, size - 1, 200
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else end, end)
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        if not head:
+            self.wfile.write(self.data[start:end + 1])
+
+    def log_message(self, *args):
+        pass
+
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+def load_fixture(path, media_base):
+    """Load an info-dict fixture with its format URLs pointed at the media server"""
+    with open(path, 'r') as f:
+        text = f.read()
+    # Recorded fixtures keep their original URLs; templated ones use {media}
+    info = json.loads(text.replace('{media}', media_base))
+    for fmt in info.get('formats', []):
+        fmt['url'] = f"{media_base}/{fmt['format_id']}"
+        fmt['protocol'] = 'http'
+        fmt.pop('fragments', None)
+        fmt.pop('manifest_url', None)
+    return info
+
+
+def install_stub(fixture, extract_delay):
+    """Replace YoutubeDL.extract_info with a fixture-backed, offline version"""
+    def extract_info(self, url, download=True, ie_key=None, extra_info=None, process=True, force_generic_extractor=False):
+        match = VIDEO_ID_RE.search(url)
+        info = copy.deepcopy(fixture)
+        if match:
+            info['id'] = match.group(1)
+            info['webpage_url'] = info['original_url'] = url
+        if extract_delay:
+            # Stand-in for the network round trips of a real extraction
+            time.sleep(extract_delay)
+        if not process:
+            return info
+        return self.process_ie_result(info, download=download, extra_info=extra_info or {})
+
+    yt_dlp.YoutubeDL.extract_info = extract_info
+
+
+def record_fixture(url, path):
+    """Extract a live video once and save its sanitized info dict as a fixture"""
+    with yt_dlp.YoutubeDL({'quiet': True, 'skip_download': True, 'format': 'all'}) as ydl:
+        info = ydl.extract_info(url, download=False)
+    info = yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True)
+    with open(path, 'w') as f:
+        json.dump(info, f)
+    print(f"💾 Recorded {info.get('title')} ({len(info.get('formats', []))} formats) to {path}")
+
+
+def configure_environment(work_dir):
+    """Point every piece of server state at a throwaway directory"""
+    os.environ.update({
+        'DOWNLOAD_CACHE_DIR': os.path.join(work_dir, 'cache'),
+        'DOWNLOAD_WORK_DIR': os.path.join(work_dir, 'downloads'),
+        'SESSION_DIR': work_dir,
+        'SESSION_DB_PATH': os.path.join(work_dir, 'sessions.db'),
+        'ANALYTICS_PATH': os.path.join(work_dir, 'analytics.log'),
+        'JOB_DB_PATH': os.path.join(work_dir, 'jobs.db'),
+        'MIN_FREE_MB': '0',
+        # All load comes from one client, which the per-client limits would throttle
+        'RATE_LIMIT_DOWNLOADS_PER_MIN': '0',
+        'RATE_LIMIT_FORMATS_PER_MIN': '0',
+        'RATE_LIMIT_VIDEO_PER_MIN': '0',
+        'DOWNLOAD_QUEUE_PER_CLIENT': '0'
+    })
+    os.environ.pop('INFO_CACHE_DIR', None)
+    os.environ.pop('METRICS_DIR', None)
+
+
+def start_app(port, asgi):
+    """Serve the app in this process so the extract_info stub applies"""
+    if asgi:
+        import uvicorn
+        import asgi_app
+        server = uvicorn.Server(uvicorn.Config(asgi_app.app, host='127.0.0.1', port=port, log_level='warning'))
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+    else:
+        from werkzeug.serving import make_server
+        import railway_app
+        server = make_server('127.0.0.1', port, railway_app.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+def rss_mb():
+    """Return the current resident set size of this process in MB"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class Recorder:
+    """Thread-safe latency samples and error counts per endpoint"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.bytes = 0
+
+    def time(self, name, fn):
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except Exception:
+            with self.lock:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            raise
+        with self.lock:
+            self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+        return result
+
+    def error(self, name):
+        with self.lock:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+
+def journey(base, video, quality, poll_interval, recorder):
+    """Run one user journey; returns True if the file was received"""
+    session = requests.Session()
+    url = f"https://www.youtube.com/watch?v={video}"
+    start = time.perf_counter()
+
+    formats = recorder.time('list_formats', lambda: session.post(
+        f"{base}/api/list_formats", json={'url': url}, timeout=60).json())
+    if not formats.get('success'):
+        recorder.error('list_formats')
+        return False
+
+    started = recorder.time('download', lambda: session.post(
+        f"{base}/api/download", json={'url': url, 'quality': quality}, timeout=60).json())
+    if not started.get('success'):
+        recorder.error('download')
+        return False
+    session_id = started['session_id']
+
+    while True:
+        progress = recorder.time('progress', lambda: session.get(
+            f"{base}/api/progress/{session_id}", timeout=60).json())
+        if progress.get('status') == 'completed':
+            break
+        if progress.get('status') == 'error' or not progress.get('success'):
+            recorder.error('progress')
+            return False
+        time.sleep(poll_interval)
+
+    def fetch():
+        received = 0
+        with session.get(f"{base}/api/download_file/{session_id}", stream=True, timeout=60) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(256 * 1024):
+                received += len(chunk)
+        return received
+
+    received = recorder.time('download_file', fetch)
+    with recorder.lock:
+        recorder.bytes += received
+        recorder.latencies.setdefault('journey', []).append(time.perf_counter() - start)
+    return received > 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=40, help='total journeys to run')
+    parser.add_argument('--concurrency', type=int, default=8, help='journeys running at once')
+    parser.add_argument('--videos', type=int, default=10,
+                        help='distinct video IDs; fewer IDs means more cache and coalescing hits')
+    parser.add_argument('--quality', default='720p', help='quality passed to /api/download')
+    parser.add_argument('--media-mb', type=float, default=8, help='size of each served media file')
+    parser.add_argument('--extract-delay', type=float, default=0.0,
+                        help='seconds the stubbed extract_info sleeps, to mimic network latency')
+    parser.add_argument('--poll-interval', type=float, default=0.2, help='seconds between progress polls')
+    parser.add_argument('--fixture', default=DEFAULT_FIXTURE, help='info-dict fixture to serve')
+    parser.add_argument('--asgi', action='store_true', help='serve asgi_app instead of the Flask server')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+    parser.add_argument('--record', metavar='URL', help='record a live fixture into --fixture and exit')
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixture(args.record, args.fixture)
+        return
+
+    work_dir = tempfile.mkdtemp(prefix='api_load_')
+    configure_environment(work_dir)
+    os.environ.setdefault('DOWNLOAD_QUEUE_SIZE', str(max(20, args.users)))
+
+    MediaHandler.data = os.urandom(int(args.media_mb * 1024 * 1024))
+    media_server = QuietServer(('127.0.0.1', 0), MediaHandler)
+    threading.Thread(target=media_server.serve_forever, daemon=True).start()
+    fixture = load_fixture(args.fixture, f"http://127.0.0.1:{media_server.server_port}/media")
+    install_stub(fixture, args.extract_delay)
+
+    import logging
+    logging.disable(logging.WARNING)
+    start_app(args.port, args.asgi)
+    base = f"http://127.0.0.1:{args.port}"
+
+    # Distinct 11-character IDs so the app's URL parsing and caches see different videos
+    videos = [f"bench{i:06d}" for i in range(args.videos)]
+    recorder = Recorder()
+    rss_before = rss_mb()
+    print(f"🚀 {args.users} journeys, concurrency {args.concurrency}, {args.videos} videos, "
+          f"{args.media_mb} MB media, {'asgi' if args.asgi else 'flask'} server")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [pool.submit(journey, base, videos[i % len(videos)], args.quality,
+                               args.poll_interval, recorder) for i in range(args.users)]
+        completed = 0
+        for future in futures:
+            try:
+                completed += bool(future.result())
+            except Exception as e:
+                print(f"❌ Journey failed: {e}")
+    elapsed = time.perf_counter() - start
+
+    results = {
+        'users': args.users,
+        'concurrency': args.concurrency,
+        'completed': completed,
+        'seconds': elapsed,
+        'journeys_per_second': completed / elapsed,
+        'mb_per_second': recorder.bytes / elapsed / (1024 * 1024),
+        'rss_mb_before': rss_before,
+        'rss_mb_after': rss_mb(),
+        'rss_mb_peak': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'endpoints': {}
+    }
+    print(f"\n{'endpoint':<15} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name in ('list_formats', 'download', 'progress', 'download_file', 'journey'):
+        samples = recorder.latencies.get(name, [])
+        stats = {
+            'count': len(samples),
+            'errors': recorder.errors.get(name, 0),
+            'p50_ms': percentile(samples, 50) * 1000,
+            'p95_ms': percentile(samples, 95) * 1000,
+            'p99_ms': percentile(samples, 99) * 1000,
+            'mean_ms': statistics.fmean(samples) * 1000 if samples else 0.0
+        }
+        results['endpoints'][name] = stats
+        print(f"{name:<15} {stats['count']:>6} {stats['errors']:>6} {stats['p50_ms']:>9.1f} "
+              f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+
+    print(f"\n✅ {completed}/{args.users} journeys in {elapsed:.2f}s "
+          f"({results['journeys_per_second']:.2f}/s, {results['mb_per_second']:.1f} MB/s)")
+    print(f"📊 RSS {rss_before:.0f} MB -> {results['rss_mb_after']:.0f} MB (peak {results['rss_mb_peak']:.0f} MB)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Compare the full extraction path with the lightweight format-listing path.
+
+Offline (default), both paths run on a recorded info-dict fixture, so the
+numbers cover yt-dlp's result processing, sanitizing and what each path
+keeps in its cache:
+- full: process_ie_result(format='all') + sanitize_info, as extract_video_info() does
+- listing: sort_formats + project_info, as extract_format_listing() does
+
+With --live URL both paths also run against the real site, which adds the
+network requests the listing path skips (manifests, the "next" API call).
+
+Usage: python benchmarks/format_listing.py [--iterations 50] [--live URL]
+"""
+
+import argparse
+import copy
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+from format_metadata import LISTING_EXTRACTOR_ARGS, extract_format_listing, project_info
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'youtube_video.json')
+
+
+def full_path(ydl, info):
+    info = ydl.process_ie_result(info, download=False)
+    return yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True)
+
+
+def listing_path(ydl, info):
+    ydl.sort_formats(info)
+    return project_info(info)
+
+
+def measure(name, fn, ydl_opts, make_input, iterations):
+    """Return timing, peak traced memory and cached size for one path"""
+    # Build the YoutubeDL outside the timing; its construction cost does not depend on the path
+    ydl = yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, **ydl_opts})
+    durations = []
+    for _ in range(iterations):
+        data = make_input()
+        start = time.perf_counter()
+        result = fn(ydl, data)
+        durations.append(time.perf_counter() - start)
+
+    data = make_input()
+    tracemalloc.start()
+    result = fn(ydl, data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'path': name,
+        'mean_ms': statistics.fmean(durations) * 1000,
+        'p95_ms': sorted(durations)[max(0, int(len(durations) * 0.95) - 1)] * 1000,
+        'peak_kb': peak / 1024,
+        'cached_kb': len(json.dumps(result)) / 1024
+    }
+
+
+class RequestCounter:
+    """Counts HTTP requests yt-dlp makes while active"""
+
+    def __init__(self):
+        self.count = 0
+        self._original = yt_dlp.YoutubeDL.urlopen
+
+    def __enter__(self):
+        counter = self
+
+        def urlopen(ydl, req):
+            counter.count += 1
+            return counter._original(ydl, req)
+
+        yt_dlp.YoutubeDL.urlopen = urlopen
+        return self
+
+    def __exit__(self, *exc):
+        yt_dlp.YoutubeDL.urlopen = self._original
+
+
+def live(url):
+    """Time both paths against the real site and count their HTTP requests"""
+    rows = []
+    for name in ('full', 'listing'):
+        with RequestCounter() as counter:
+            tracemalloc.start()
+            start = time.perf_counter()
+            if name == 'full':
+                with yt_dlp.YoutubeDL({'format': 'all', 'quiet': True, 'skip_download': True}) as ydl:
+                    result = yt_dlp.YoutubeDL.sanitize_info(ydl.extract_info(url, download=False),
+                                                            remove_private_keys=True)
+            else:
+                result = extract_format_listing(url)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        rows.append((name, elapsed * 1000, counter.count, peak / 1024, len(json.dumps(result)) / 1024,
+                     len(result.get('formats', []))))
+
+    print(f"\n🌐 Live: {url}")
+    print(f"{'path':<10} {'ms':>9} {'requests':>9} {'peak KB':>10} {'cached KB':>10} {'formats':>8}")
+    for name, ms, requests, peak, cached, formats in rows:
+        print(f"{name:<10} {ms:>9.0f} {requests:>9} {peak:>10.0f} {cached:>10.1f} {formats:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--fixture', default=DEFAULT_FIXTURE)
+    parser.add_argument('--live', metavar='URL', help='also compare both paths against the real site')
+    args = parser.parse_args()
+
+    with open(args.fixture, 'r') as f:
+        fixture = json.load(f)
+    # Processing validates format URLs, so give the templated fixture real-looking ones
+    for fmt in fixture.get('formats', []):
+        fmt['url'] = f"https://rr1---sn-fixture.googlevideo.com/videoplayback?itag={fmt['format_id']}&expire=1893456000"
+
+    print(f"📦 Fixture: {os.path.basename(args.fixture)} ({len(json.dumps(fixture)) / 1024:.0f} KB, "
+          f"{len(fixture.get('formats', []))} formats), {args.iterations} iterations")
+    print(f"🔧 Listing extractor args: {LISTING_EXTRACTOR_ARGS}")
+    results = [
+        measure('full', full_path, {'format': 'all'}, lambda: copy.deepcopy(fixture), args.iterations),
+        measure('listing', listing_path, {}, lambda: copy.deepcopy(fixture), args.iterations)
+    ]
+    print(f"\n{'path':<10} {'mean ms':>9} {'p95 ms':>9} {'peak KB':>10} {'cached KB':>10}")
+    for row in results:
+        print(f"{row['path']:<10} {row['mean_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+              f"{row['peak_kb']:>10.0f} {row['cached_kb']:>10.1f}")
+    full, listing = results
+    print(f"\n✅ Listing path: {full['mean_ms'] / listing['mean_ms']:.1f}x faster, "
+          f"{full['peak_kb'] / listing['peak_kb']:.1f}x less peak memory, "
+          f"{full['cached_kb'] / listing['cached_kb']:.0f}x smaller cache entries")
+
+    if args.live:
+        live(args.live)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Benchmark download throughput for the yt-dlp concurrency modes.
+
+Starts a local HTTP server that serves a large file with Range support and
+an HLS playlist cut from the same bytes, caps the bandwidth of every
+connection (like upstream CDNs do), and times yt-dlp downloading them with
+the options from download_options.concurrency_options().
+
+Usage: python benchmarks/fragment_download.py [--size-mb 64] [--connection-mbps 8]
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+from download_options import concurrency_options
+
+SEGMENT_SIZE = 1024 * 1024
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves /file.bin with Range support and /stream.m3u8 with its segments"""
+
+    protocol_version = 'HTTP/1.1'
+    data = b''
+    bytes_per_second = 0
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def _serve(self, head):
+        if self.path == '/stream.m3u8':
+            body = self._playlist().encode()
+            self._send(200, body, 'application/vnd.apple.mpegurl', head)
+            return
+        match = re.match(r'^/seg/(\d+)\.ts$', self.path)
+        if match:
+            start = int(match.group(1)) * SEGMENT_SIZE
+            self._send(200, self.data[start:start + SEGMENT_SIZE], 'video/mp2t', head)
+            return
+        if self.path != '/file.bin':
+            self._send(404, b'', 'text/plain', head)
+            return
+
+        size = len(self.data)
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            headers = {'Content-Range': f'bytes {start}-{end}/{size}'}
+            self._send(206, self.data[start:end + 1], 'video/mp4', head, headers)
+        else:
+            self._send(200, self.data, 'video/mp4', head)
+
+    def _playlist(self):
+        count = (len(self.data) + SEGMENT_SIZE - 1) // SEGMENT_SIZE
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:2', '#EXT-X-MEDIA-SEQUENCE:0']
+        for i in range(count):
+            lines += ['#EXTINF:2.0,', f'/seg/{i}.ts']
+        lines.append('#EXT-X-ENDLIST')
+        return '\n'.join(lines) + '\n'
+
+    def _send(self, status, body, content_type, head, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Accept-Ranges', 'bytes')
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if head:
+            return
+        # Throttle each connection to emulate a per-connection bandwidth cap
+        chunk = 64 * 1024
+        for offset in range(0, len(body), chunk):
+            self.wfile.write(body[offset:offset + chunk])
+            if self.bytes_per_second:
+                time.sleep(chunk / self.bytes_per_second)
+
+    def log_message(self, *args):
+        pass
+
+
+class QuietServer(ThreadingHTTPServer):
+    """Ignores clients hanging up on kept-alive connections"""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+def run_download(url, opts):
+    """Download url with extra yt-dlp options and return (seconds, bytes)"""
+    with tempfile.TemporaryDirectory() as download_dir:
+        ydl_opts = {
+            'outtmpl': os.path.join(download_dir, 'out.%(ext)s'),
+            'quiet': True,
+            'no_warnings': True,
+            'noprogress': True,
+            **opts
+        }
+        start = time.time()
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            ydl.download([url])
+        elapsed = time.time() - start
+        size = sum(os.path.getsize(os.path.join(download_dir, f)) for f in os.listdir(download_dir))
+    return elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=64, help='size of the served file')
+    parser.add_argument('--connection-mbps', type=float, default=8,
+                        help='bandwidth cap per connection in MB/s (0 for unlimited)')
+    parser.add_argument('--connections', type=int, default=4, help='connections for concurrent modes')
+    args = parser.parse_args()
+
+    RangeHandler.data = os.urandom(args.size_mb * 1024 * 1024)
+    RangeHandler.bytes_per_second = args.connection_mbps * 1024 * 1024
+    server = QuietServer(('127.0.0.1', 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    chunked = concurrency_options(args.connections, external_downloader='')
+    modes = [
+        ('single connection', f'{base}/file.bin', {}),
+        ('ranged chunks', f'{base}/file.bin', {'http_chunk_size': chunked.get('http_chunk_size', 10 * 1024 * 1024)}),
+        ('hls, 1 fragment at a time', f'{base}/stream.m3u8', {'concurrent_fragment_downloads': 1}),
+        (f'hls, {args.connections} concurrent fragments', f'{base}/stream.m3u8',
+         {'concurrent_fragment_downloads': chunked['concurrent_fragment_downloads']}),
+    ]
+    aria2c = concurrency_options(args.connections, external_downloader='aria2c')
+    if 'external_downloader' in aria2c:
+        modes.append((f'aria2c, {args.connections} connections', f'{base}/file.bin', aria2c))
+    else:
+        print("ℹ️  aria2c not installed, skipping external downloader mode")
+
+    print(f"🚀 Serving {args.size_mb} MB at {args.connection_mbps} MB/s per connection")
+    print(f"{'mode':<32} {'seconds':>8} {'MB/s':>8}")
+    for name, url, opts in modes:
+        elapsed, size = run_download(url, opts)
+        print(f"{name:<32} {elapsed:>8.2f} {size / elapsed / (1024 * 1024):>8.1f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for YouTube URL validation and video ID extraction.
+
+Compares the shared parser in youtube_url.py with what a request used to
+do: validate_youtube_url() trying four uncompiled patterns with re.match,
+then a second regex to pull out the video ID for the cache key.
+
+Usage: python benchmarks/url_parsing.py [--number 200000]
+"""
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from youtube_url import parse_youtube_url, validate_youtube_url, video_id_from_url
+
+SAMPLE_URLS = [
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+    'https://www.youtube.com/watch?feature=share&v=dQw4w9WgXcQ&t=42s',
+    'https://youtu.be/dQw4w9WgXcQ?si=Qm9ndXNTaGFyZUlk',
+    'https://www.youtube.com/embed/dQw4w9WgXcQ',
+    'https://www.youtube.com/shorts/dQw4w9WgXcQ',
+    'https://m.youtube.com/watch?v=dQw4w9WgXcQ&list=PLFgquLnL59alCl_2TQvOiD5Vgm1hCaGSI',
+    'https://vimeo.com/76979871',
+    'not a url at all',
+]
+
+_LEGACY_ID_RE = re.compile(
+    r'(?:https?://)?(?:www\.|m\.)?'
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|embed/|v/|shorts/)|youtu\.be/)'
+    r'([\w-]{11})'
+)
+
+
+def legacy_validate(url):
+    """validate_youtube_url() as railway_app.py used to define it"""
+    if not url:
+        return False
+
+    patterns = [
+        r'(?:https?://)?(?:www\.)?youtube\.com/watch\?v=[\w-]+',
+        r'(?:https?://)?(?:www\.)?youtube\.com/embed/[\w-]+',
+        r'(?:https?://)?(?:www\.)?youtu\.be/[\w-]+',
+        r'(?:https?://)?(?:www\.)?youtube\.com/v/[\w-]+'
+    ]
+
+    import re
+    for pattern in patterns:
+        if re.match(pattern, url):
+            return True
+    return False
+
+
+def legacy_request(url):
+    """Validation followed by the separate video ID lookup used for cache keys"""
+    if legacy_validate(url):
+        match = _LEGACY_ID_RE.match(url)
+        return match.group(1) if match else None
+    return None
+
+
+def shared_request(url):
+    """The same work with the shared parser"""
+    return video_id_from_url(url)
+
+
+def bench(fn, number):
+    """Return nanoseconds per URL for fn over the sample URLs"""
+    timer = timeit.Timer(lambda: [fn(url) for url in SAMPLE_URLS])
+    loops = max(1, number // len(SAMPLE_URLS))
+    best = min(timer.repeat(repeat=5, number=loops))
+    return best / (loops * len(SAMPLE_URLS)) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=200000, help='URLs parsed per timing run')
+    args = parser.parse_args()
+
+    rows = [
+        ('legacy validate', bench(legacy_validate, args.number)),
+        ('shared validate', bench(validate_youtube_url, args.number)),
+        ('legacy validate + ID', bench(legacy_request, args.number)),
+        ('shared video ID', bench(shared_request, args.number)),
+        ('shared full parse', bench(parse_youtube_url, args.number)),
+    ]
+    print(f"📦 {len(SAMPLE_URLS)} sample URLs, best of 5 runs of {args.number} parses")
+    print(f"\n{'path':<22} {'ns/url':>9}")
+    for name, ns in rows:
+        print(f"{name:<22} {ns:>9.0f}")
+    print(f"\n✅ Shared parser: {rows[0][1] / rows[1][1]:.1f}x faster validation, "
+          f"{rows[2][1] / rows[3][1]:.1f}x faster validation + ID")
+
+
+if __name__ == '__main__':
+    main()
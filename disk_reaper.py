@@ -0,0 +1,140 @@
+"""
+Background cleanup of download artifacts and a global disk quota.
+
+Every interval the reaper deletes per-download work directories and session
+snapshots that have been idle for longer than the retention window, expires
+idle download cache entries, and evicts the least recently used cached files
+while total usage is above the quota. New jobs are refused while free space
+on the download volume is below a minimum.
+
+Several worker processes may run a reaper against the same directories. Each
+one touches the work directories its own jobs are using and renews its
+download cache leases on every pass, so other workers' reapers leave them
+alone as long as the retention window and cache lease outlast the interval.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def directory_size(path):
+    """Return the total size in bytes of the files under path"""
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def last_modified(path):
+    """Return the newest mtime of path and anything directly inside it"""
+    latest = os.path.getmtime(path)
+    for entry in os.scandir(path):
+        try:
+            latest = max(latest, entry.stat().st_mtime)
+        except OSError:
+            pass
+    return latest
+
+
+class DiskReaper:
+    """Periodically reclaims disk space used by downloads"""
+
+    def __init__(self, work_dir, download_cache, session_store, active_dirs=None,
+                 retention=3600, quota_bytes=4 * 1024 * 1024 * 1024,
+                 min_free_bytes=512 * 1024 * 1024, interval=60):
+        self.work_dir = work_dir
+        self.download_cache = download_cache
+        self.session_store = session_store
+        self.active_dirs = active_dirs or (lambda: set())
+        self.retention = retention
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self.interval = interval
+        self.last_run = None
+        self.work_bytes = 0
+        os.makedirs(work_dir, exist_ok=True)
+
+    def start(self):
+        """Run the reaper on a daemon thread"""
+        thread = threading.Thread(target=self._loop, name="disk-reaper", daemon=True)
+        thread.start()
+
+    def run_once(self):
+        """Reap expired artifacts and enforce the quota; returns what was removed"""
+        cutoff = time.time() - self.retention
+        removed_dirs = 0
+        active = self.active_dirs()
+        for path in active:
+            # Mark our jobs' directories as in use for reapers in other workers
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        self.download_cache.renew_leases()
+        for entry in os.scandir(self.work_dir):
+            if not entry.is_dir() or entry.path in active:
+                continue
+            try:
+                if last_modified(entry.path) < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    removed_dirs += 1
+            except OSError:
+                continue
+
+        expired = self.download_cache.expire(self.retention)
+        sessions = self.session_store.purge(self.retention)
+
+        # Over quota: drop the least recently used cached files first
+        self.work_bytes = directory_size(self.work_dir)
+        evicted = 0
+        if self.work_bytes + self.download_cache.stats()['bytes'] > self.quota_bytes:
+            evicted = self.download_cache.evict_to(max(0, self.quota_bytes - self.work_bytes))
+
+        self.last_run = time.time()
+        if removed_dirs or expired or sessions or evicted:
+            logger.info(f"Reaper removed {removed_dirs} work dirs, {expired} expired and "
+                        f"{evicted} evicted cache entries, {sessions} sessions")
+        return {
+            'work_dirs': removed_dirs,
+            'cache_expired': expired,
+            'cache_evicted': evicted,
+            'sessions': sessions
+        }
+
+    def free_bytes(self):
+        """Return the free space on the volume holding the work directory"""
+        return shutil.disk_usage(self.work_dir).free
+
+    def has_space(self):
+        """Return True if there is enough free disk space to start another job"""
+        return self.free_bytes() >= self.min_free_bytes
+
+    def usage(self):
+        """Return disk usage figures for /health"""
+        cache_bytes = self.download_cache.stats()['bytes']
+        return {
+            'work_bytes': self.work_bytes,
+            'cache_bytes': cache_bytes,
+            'used_bytes': self.work_bytes + cache_bytes,
+            'quota_bytes': self.quota_bytes,
+            'free_bytes': self.free_bytes(),
+            'min_free_bytes': self.min_free_bytes,
+            'last_run': self.last_run
+        }
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Reaper error: {e}")
+            time.sleep(self.interval)
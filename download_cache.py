@@ -0,0 +1,266 @@
+"""
+Content-addressed cache of completed downloads.
+
+Finished files are published into the cache under a name derived from
+(video_id, format_id), so the same video in the same format is fetched from
+upstream once and then served to every later session. Publishing is an
+atomic rename, entries in use are reference counted, and the least recently
+used idle entries are evicted once the cache grows past its size budget.
+
+Reference counts only cover the current process. Worker processes sharing the
+cache directory also hold a lease on each entry they use by touching its
+metadata file, and renew_leases() keeps that lease fresh while a reference is
+held. An entry is never expired or evicted while any process holds a lease.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry:
+    """A published file plus the bookkeeping needed for LRU eviction"""
+
+    def __init__(self, key, path, filename, size, last_access):
+        self.key = key
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.last_access = last_access
+        self.refs = 0
+
+
+class DownloadCache:
+    """Thread-safe on-disk cache of finished downloads keyed by (video_id, format_id)"""
+
+    def __init__(self, root='/tmp/download_cache', max_bytes=2 * 1024 * 1024 * 1024, lease=300):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lease = lease
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}  # key -> CacheEntry
+        self._by_path = {}  # path -> key
+        self._size = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._scan()
+
+    @staticmethod
+    def make_key(video_id, format_id):
+        """Return the content address for a video in a given format"""
+        return hashlib.sha256(f"{video_id}:{format_id}".encode()).hexdigest()
+
+    def acquire(self, video_id, format_id):
+        """Return a referenced entry on a hit, or None; call release() when done"""
+        if not video_id or not format_id:
+            return None
+        key = self.make_key(video_id, format_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # Another worker process may have published it since our last scan
+                entry = self._load_shard(key)
+            if entry is None or not os.path.exists(entry.path):
+                if entry is not None:
+                    self._forget(entry)
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry.refs += 1
+            entry.last_access = time.time()
+            self._touch(entry)
+            return entry
+
+    def pin(self, path):
+        """Take a reference on the entry stored at path; returns its key or None"""
+        with self._lock:
+            key = self._by_path.get(path)
+            if key is None:
+                entry = self._load(path)
+                if entry is None:
+                    return None
+                key = entry.key
+            entry = self._entries[key]
+            entry.refs += 1
+            entry.last_access = time.time()
+            self._touch(entry)
+            return key
+
+    def release(self, key):
+        """Drop a reference taken by acquire(), pin() or publish()"""
+        if key is None:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.refs > 0:
+                entry.refs -= 1
+            self._evict()
+
+    def publish(self, video_id, format_id, src_path, filename):
+        """Move a finished file into the cache and return a referenced entry"""
+        key = self.make_key(video_id, format_id)
+        ext = os.path.splitext(filename)[1]
+        path = os.path.join(self.root, key[:2], f"{key}{ext}")
+
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing and os.path.exists(existing.path):
+                # Another session published the same content first; keep theirs
+                existing.refs += 1
+                existing.last_access = time.time()
+                self._touch(existing)
+                os.remove(src_path)
+                return existing
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.replace(src_path, path)
+        except OSError:
+            # Different filesystem: copy next to the target, then rename into place
+            shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, path)
+            os.remove(src_path)
+        with open(f"{path}.json", 'w') as f:
+            json.dump({'video_id': video_id, 'format_id': format_id, 'filename': filename}, f)
+
+        entry = CacheEntry(key, path, filename, os.path.getsize(path), time.time())
+        entry.refs = 1
+        with self._lock:
+            self._add(entry)
+            self._evict()
+        logger.info(f"Cached {video_id} format {format_id} ({entry.size} bytes)")
+        return entry
+
+    def renew_leases(self):
+        """Refresh the lease on every entry this process holds a reference to"""
+        with self._lock:
+            held = [e for e in self._entries.values() if e.refs > 0]
+            for entry in held:
+                self._touch(entry)
+        return len(held)
+
+    def expire(self, max_age):
+        """Delete idle entries not used for max_age seconds; returns how many were removed"""
+        cutoff = time.time() - max_age
+        with self._lock:
+            stale = [e for e in self._entries.values()
+                     if self._idle(e) and e.last_access < cutoff]
+            for entry in stale:
+                self._delete(entry)
+        return len(stale)
+
+    def evict_to(self, max_bytes):
+        """Evict least recently used idle entries until the cache fits in max_bytes"""
+        with self._lock:
+            return self._evict(max_bytes)
+
+    def stats(self):
+        """Return cache usage for health checks"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _add(self, entry):
+        """Index an entry; caller holds the lock"""
+        old = self._entries.get(entry.key)
+        if old:
+            self._forget(old)
+        self._entries[entry.key] = entry
+        self._by_path[entry.path] = entry.key
+        self._size += entry.size
+
+    def _forget(self, entry):
+        """Remove an entry from the index; caller holds the lock"""
+        self._entries.pop(entry.key, None)
+        self._by_path.pop(entry.path, None)
+        self._size -= entry.size
+
+    def _evict(self, max_bytes=None):
+        """Delete least recently used idle entries until under budget; caller holds the lock"""
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        evicted = 0
+        if self._size <= max_bytes:
+            return evicted
+        for entry in sorted(self._entries.values(), key=lambda e: e.last_access):
+            if self._size <= max_bytes:
+                break
+            if not self._idle(entry):
+                continue
+            self._delete(entry)
+            evicted += 1
+            logger.info(f"Evicted cached download {entry.filename} ({entry.size} bytes)")
+        return evicted
+
+    def _touch(self, entry):
+        """Take or renew this process's lease on an entry; caller holds the lock"""
+        try:
+            os.utime(f"{entry.path}.json")
+        except OSError:
+            pass
+
+    def _idle(self, entry):
+        """Return True if no process is using an entry; caller holds the lock"""
+        if entry.refs > 0:
+            return False
+        try:
+            leased_at = os.path.getmtime(f"{entry.path}.json")
+        except OSError:
+            return True
+        # Other workers' use shows up only through the lease, so fold it into the LRU order
+        entry.last_access = max(entry.last_access, leased_at)
+        return leased_at < time.time() - self.lease
+
+    def _delete(self, entry):
+        """Unindex an entry and remove its files; caller holds the lock"""
+        self._forget(entry)
+        for path in (entry.path, f"{entry.path}.json"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _load(self, path):
+        """Index the cached file at path from its metadata file; caller holds the lock"""
+        try:
+            with open(f"{path}.json", 'r') as f:
+                meta = json.load(f)
+            stat = os.stat(path)
+            key = self.make_key(meta['video_id'], meta['format_id'])
+        except (OSError, ValueError, KeyError):
+            return None
+        entry = CacheEntry(key, path, meta['filename'], stat.st_size, stat.st_mtime)
+        self._add(entry)
+        return entry
+
+    def _load_shard(self, key):
+        """Look for a file published under key by another process; caller holds the lock"""
+        try:
+            names = os.listdir(os.path.join(self.root, key[:2]))
+        except OSError:
+            return None
+        for name in names:
+            if name.startswith(key) and name.endswith('.json'):
+                return self._load(os.path.join(self.root, key[:2], name[:-len('.json')]))
+        return None
+
+    def _scan(self):
+        """Rebuild the index from the metadata files left by earlier runs"""
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith('.json'):
+                    self._load(os.path.join(dirpath, name[:-len('.json')]))
+        self._evict()
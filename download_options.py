@@ -0,0 +1,96 @@
+"""
+Connection concurrency and time-range settings for yt-dlp downloads.
+
+By default yt-dlp fetches DASH/HLS fragments one at a time over a single
+connection. concurrency_options() returns the options that download several
+fragments in parallel, split large progressive files into ranged chunks, and
+optionally hand single files to aria2c for multi-connection range downloads.
+
+clip_options() turns a download into a clip of one time range. yt-dlp hands
+sections to ffmpeg, which seeks through the media with HTTP range requests
+and stream-copies from the keyframe at or before the start, so only the
+bytes around the range are fetched and nothing is re-encoded.
+"""
+
+import os
+import shutil
+
+from yt_dlp.utils import download_range_func, parse_duration
+
+# Parallel connections a job uses unless it asks for something else
+DEFAULT_CONCURRENCY = int(os.environ.get('DOWNLOAD_CONCURRENCY', 4))
+# Upper bound on connections for any single job
+MAX_CONCURRENCY = int(os.environ.get('DOWNLOAD_CONCURRENCY_MAX', 8))
+# Size of each ranged request for progressive files; 0 disables chunking
+HTTP_CHUNK_SIZE = int(os.environ.get('HTTP_CHUNK_SIZE_MB', 10)) * 1024 * 1024
+# Set to "aria2c" to use it for http(s) downloads when it is installed
+EXTERNAL_DOWNLOADER = os.environ.get('EXTERNAL_DOWNLOADER', '').strip().lower()
+
+
+def job_concurrency(requested=None):
+    """Return the connection count for a job, clamped to the per-job cap"""
+    try:
+        connections = int(requested) if requested else DEFAULT_CONCURRENCY
+    except (TypeError, ValueError):
+        connections = DEFAULT_CONCURRENCY
+    return max(1, min(connections, MAX_CONCURRENCY))
+
+
+def concurrency_options(connections=None, external_downloader=None):
+    """Return yt-dlp options for a job that may use up to `connections` connections"""
+    connections = job_concurrency(connections)
+    opts = {'concurrent_fragment_downloads': connections}
+    if HTTP_CHUNK_SIZE:
+        opts['http_chunk_size'] = HTTP_CHUNK_SIZE
+
+    external_downloader = EXTERNAL_DOWNLOADER if external_downloader is None else external_downloader
+    if external_downloader == 'aria2c' and connections > 1 and shutil.which('aria2c'):
+        # aria2c opens several ranged connections for a single progressive file
+        opts['external_downloader'] = {'http': 'aria2c'}
+        opts['external_downloader_args'] = {'aria2c': [
+            '--max-connection-per-server', str(connections),
+            '--split', str(connections),
+            '--min-split-size', '1M',
+            '--file-allocation', 'none'
+        ]}
+    return opts
+
+
+def _seconds(value):
+    seconds = value if isinstance(value, (int, float)) else parse_duration(str(value).strip())
+    if seconds is None:
+        raise ValueError(f"Invalid time: {value}")
+    return float(seconds)
+
+
+def parse_clip(start_time=None, end_time=None):
+    """Return (start, end) seconds for a clip request, or None for the whole video.
+
+    Times are seconds or [HH:]MM:SS strings. A missing start means 0 and a
+    missing end means the end of the video. Raises ValueError for bad ranges.
+    """
+    if start_time in (None, '') and end_time in (None, ''):
+        return None
+    start = _seconds(start_time) if start_time not in (None, '') else 0.0
+    end = _seconds(end_time) if end_time not in (None, '') else None
+    if start < 0:
+        raise ValueError("Clip start cannot be negative")
+    if end is not None and end <= start:
+        raise ValueError("Clip end must be after its start")
+    return (start, end)
+
+
+def clip_label(clip):
+    """Return a short, filename-safe label for a clip such as 60-90 or 60-end"""
+    start, end = clip
+    return f"{start:g}-{'end' if end is None else f'{end:g}'}"
+
+
+def clip_options(clip):
+    """Return yt-dlp options that fetch and cut only the clip's time range"""
+    start, end = clip
+    return {
+        'download_ranges': download_range_func(None, [(start, float('inf') if end is None else end)]),
+        # Cut on keyframes with stream copy; exact cuts would re-encode the whole clip
+        'force_keyframes_at_cuts': False
+    }
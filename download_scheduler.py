@@ -0,0 +1,249 @@
+"""
+Bounded worker pool for download jobs.
+
+A fixed number of worker threads run downloads; everything else waits in a
+bounded FIFO queue. Once the queue is full, submit() raises QueueFullError so
+the API can answer 503 instead of starting another yt-dlp process.
+
+FairScheduler replaces FIFO order with weighted fair queueing between
+clients, so one client with many queued downloads cannot make everyone
+else wait behind all of them. It also weighs jobs by their expected size:
+short jobs start first, waiting jobs age so long ones still get their
+turn, and a small-job lane keeps short downloads moving while long ones
+hold every regular worker.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the download queue cannot accept another job"""
+
+
+class ClientQueueFullError(QueueFullError):
+    """Raised when one client already has as many queued jobs as it may"""
+
+
+class DownloadScheduler:
+    """Runs submitted jobs on a fixed-size pool of worker threads"""
+
+    def __init__(self, workers=2, max_queue=20):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue = deque()  # (job_id, fn)
+        self._active = set()
+        self._cond = threading.Condition()
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"download-worker-{i}", daemon=True)
+            thread.start()
+
+    def submit(self, job_id, fn):
+        """Queue fn() to run on a worker; returns the 1-based queue position"""
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                raise QueueFullError(f"Download queue is full ({self.max_queue} jobs waiting)")
+            self._queue.append((job_id, fn))
+            self._cond.notify()
+            return len(self._queue)
+
+    def position(self, job_id):
+        """Return the 1-based queue position, 0 if running, or None if unknown"""
+        with self._cond:
+            if job_id in self._active:
+                return 0
+            for index, (queued_id, _) in enumerate(self._queue):
+                if queued_id == job_id:
+                    return index + 1
+        return None
+
+    def cancel(self, job_id):
+        """Remove a job that has not started yet; returns True if it was queued"""
+        with self._cond:
+            for entry in self._queue:
+                if entry[0] == job_id:
+                    self._queue.remove(entry)
+                    return True
+        return False
+
+    def stats(self):
+        """Return pool occupancy for health checks"""
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'active': len(self._active),
+                'queued': len(self._queue),
+                'max_queue': self.max_queue
+            }
+
+    def _next_job(self, lane):
+        """Take the next job a worker of lane may run, or None; caller holds the lock"""
+        return self._queue.popleft() if self._queue else None
+
+    def _worker(self, lane=None):
+        while True:
+            with self._cond:
+                entry = self._next_job(lane)
+                while entry is None:
+                    self._cond.wait()
+                    entry = self._next_job(lane)
+                job_id, fn = entry
+                self._active.add(job_id)
+            try:
+                fn()
+            except Exception as e:
+                logger.error(f"Download job {job_id} failed: {e}")
+            finally:
+                with self._cond:
+                    self._active.discard(job_id)
+                    self._finished(job_id)
+
+    def _finished(self, job_id):
+        """Called when a job has run; caller holds the lock"""
+
+
+class FairScheduler(DownloadScheduler):
+    """DownloadScheduler that shares the workers between clients by weighted fair
+    queueing and starts the shortest expected jobs first.
+
+    Each job has an expected cost in units of unit_cost (e.g. bytes to fetch);
+    a job without an estimate costs one unit. A client's queued jobs get
+    virtual finish tags cheapest first: from the client's start tag (the
+    scheduler's virtual time when its backlog began, advanced by the cost of
+    each job it has started), each adds cost/weight. Jobs start in tag
+    order, so clients share the workers in proportion to their weights and
+    each client's shortest jobs go first. A client may also hold at most
+    max_per_client running and queued jobs.
+
+    Waiting lowers a job's tag by one unit every `aging` seconds, so a job
+    waits at most about cost * aging seconds for newer, shorter ones.
+    small_workers extra threads only run jobs whose known cost is at most
+    small_cost, so short downloads never wait behind long ones that occupy
+    every regular worker.
+    """
+
+    def __init__(self, workers=2, max_queue=20, max_per_client=None, unit_cost=1.0, aging=0,
+                 small_workers=0, small_cost=0):
+        self.max_per_client = max_per_client
+        self.unit_cost = unit_cost
+        self.aging = aging
+        self.small_workers = small_workers
+        self.small_cost = small_cost
+        self._jobs = {}  # job_id -> {'client', 'cost', 'units', 'tag', 'queued_at'}
+        self._client_tags = {}  # client -> start tag of its queued jobs
+        self._running = {}  # job_id -> client of jobs a worker has taken
+        self._virtual_time = 0.0
+        super().__init__(workers, max_queue)
+        for i in range(small_workers):
+            thread = threading.Thread(target=self._worker, args=('small',), name=f"download-small-{i}", daemon=True)
+            thread.start()
+
+    def submit(self, job_id, fn, client=None, weight=1.0, cost=None):
+        """Queue fn() for client with an expected cost (None if unknown); returns the 1-based position in start order"""
+        with self._cond:
+            queued = sum(1 for job in self._jobs.values() if job['client'] == client)
+            if self.max_per_client and client is not None:
+                held = queued + sum(1 for running in self._running.values() if running == client)
+                if held >= self.max_per_client:
+                    raise ClientQueueFullError(f"Client already has {held} downloads running or waiting")
+            super().submit(job_id, fn)
+            if not queued:
+                # A client that had nothing queued starts level with the others
+                self._client_tags[client] = max(self._virtual_time, self._client_tags.get(client, 0.0))
+            units = cost / self.unit_cost if cost is not None else 1.0
+            self._jobs[job_id] = {'client': client, 'cost': cost, 'units': units / weight,
+                                  'tag': 0.0, 'queued_at': time.monotonic()}
+            self._retag(client)
+            if self.small_workers:
+                # The worker notify() woke may be a small-lane one that cannot take this job
+                self._cond.notify_all()
+            return self.position(job_id)
+
+    def position(self, job_id):
+        """Return the 1-based position in start order, 0 if running, or None if unknown"""
+        with self._cond:
+            if job_id in self._active:
+                return 0
+            if job_id not in self._jobs:
+                return None
+            now = time.monotonic()
+            priority = self._priority(self._jobs[job_id], now)
+            ahead, reached = 0, False
+            for queued_id, _ in self._queue:
+                if queued_id == job_id:
+                    reached = True
+                    continue
+                queued_priority = self._priority(self._jobs[queued_id], now)
+                # Equal priorities start in arrival order, which is queue order
+                if queued_priority < priority or (queued_priority == priority and not reached):
+                    ahead += 1
+            return ahead + 1
+
+    def cancel(self, job_id):
+        """Remove a job that has not started yet; returns True if it was queued"""
+        with self._cond:
+            cancelled = super().cancel(job_id)
+            if cancelled:
+                self._retag(self._jobs.pop(job_id)['client'])
+            return cancelled
+
+    def stats(self):
+        """Return pool occupancy, the number of clients with queued jobs and the small-job lane"""
+        with self._cond:
+            stats = super().stats()
+            stats['clients'] = len({job['client'] for job in self._jobs.values()})
+            stats['small_workers'] = self.small_workers
+            stats['small_queued'] = sum(1 for job in self._jobs.values() if self._is_small(job))
+            return stats
+
+    def _finished(self, job_id):
+        self._running.pop(job_id, None)
+
+    def _is_small(self, job):
+        return job['cost'] is not None and job['cost'] <= self.small_cost
+
+    def _priority(self, job, now):
+        if not self.aging:
+            return job['tag']
+        return job['tag'] - (now - job['queued_at']) / self.aging
+
+    def _retag(self, client):
+        """Give client's queued jobs consecutive finish tags, cheapest first; caller holds the lock"""
+        tag = self._client_tags.get(client, 0.0)
+        # sorted() is stable, so equal costs keep arrival order
+        for job in sorted((job for job in self._jobs.values() if job['client'] == client),
+                          key=lambda job: job['units']):
+            tag += job['units']
+            job['tag'] = tag
+
+    def _next_job(self, lane):
+        """Take the queued job with the lowest aged tag that lane may run, or None; caller holds the lock"""
+        now = time.monotonic()
+        entry, best = None, None
+        for queued in self._queue:
+            job = self._jobs[queued[0]]
+            if lane == 'small' and not self._is_small(job):
+                continue
+            priority = self._priority(job, now)
+            if best is None or priority < best:
+                entry, best = queued, priority
+        if entry is None:
+            return None
+        self._queue.remove(entry)
+        job = self._jobs.pop(entry[0])
+        client = job['client']
+        self._running[entry[0]] = client
+        # The client has used up the job's cost; its other queued jobs move up behind it
+        self._client_tags[client] += job['units']
+        self._virtual_time = max(self._virtual_time, job['tag'] - job['units'])
+        self._retag(client)
+        # Clients with nothing queued and a start tag the virtual time has passed are level with new ones
+        if len(self._client_tags) > 2 * len(self._queue) + 64:
+            queued_clients = {job['client'] for job in self._jobs.values()}
+            self._client_tags = {client: tag for client, tag in self._client_tags.items()
+                                 if tag > self._virtual_time or client in queued_clients}
+        return entry
@@ -0,0 +1,86 @@
+"""
+Lightweight metadata extraction for format lists.
+
+A full extract_info() call downloads the DASH and HLS manifests, fetches the
+"next" API response that carries chapters, comments and the heatmap, lists
+translated caption tracks, and then runs yt-dlp's whole result processing
+(format selection, thumbnail sorting, subtitle handling) before the caller
+keeps five formats. extract_format_listing() asks the extractor to skip that
+work, sorts the raw formats the same way yt-dlp would, and keeps only the
+fields a format picker needs, which is a small fraction of the info dict.
+
+Listings have no download URLs, so downloads still use a full extraction.
+
+Building a YoutubeDL registers every extractor, which costs more than
+sorting and projecting a result, so each thread keeps one listing instance.
+"""
+
+import threading
+
+import yt_dlp
+
+# Extractor work that a format list never needs
+LISTING_EXTRACTOR_ARGS = {
+    'youtube': {
+        # Manifest requests and translated caption tracks
+        'skip': ['hls', 'dash', 'translated_subs'],
+        # The "next" API response only feeds chapters, comments, heatmap and likes
+        'player_skip': ['initial_data']
+    }
+}
+
+# Per-format fields kept in a listing
+FORMAT_FIELDS = ('format_id', 'ext', 'height', 'width', 'fps', 'vcodec', 'acodec',
+                 'filesize', 'filesize_approx', 'tbr')
+
+
+def project_info(info):
+    """Reduce a full or raw info dict to the compact structure used for format lists"""
+    formats = []
+    for fmt in info.get('formats') or []:
+        if fmt.get('format_id') is None:
+            continue
+        formats.append({key: fmt[key] for key in FORMAT_FIELDS if fmt.get(key) is not None})
+    return {
+        'id': info.get('id'),
+        'title': info.get('title', 'Unknown'),
+        'duration': info.get('duration'),
+        'formats': formats
+    }
+
+
+_local = threading.local()
+
+
+def _listing_ydl(user_agent):
+    """Return this thread's YoutubeDL configured for listings"""
+    ydl = getattr(_local, 'ydl', None)
+    if ydl is not None and ydl.params.get('user_agent') == user_agent:
+        return ydl
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'skip_download': True,
+        'extractor_retries': 3,
+        'noplaylist': True,
+        'playlist_items': '1',
+        'getcomments': False,
+        'extractor_args': LISTING_EXTRACTOR_ARGS
+    }
+    if user_agent:
+        ydl_opts['user_agent'] = user_agent
+    _local.ydl = yt_dlp.YoutubeDL(ydl_opts)
+    return _local.ydl
+
+
+def extract_format_listing(url, user_agent=None):
+    """Extract only what a format list needs and return project_info() of it"""
+    ydl = _listing_ydl(user_agent)
+    info = ydl.extract_info(url, download=False, process=False)
+    if info.get('_type', 'video') != 'video':
+        # Redirects and playlists need yt-dlp's processing to resolve a single video
+        info = ydl.extract_info(url, download=False)
+    else:
+        # Unprocessed formats are in extractor order; order them worst to best like a full extraction
+        ydl.sort_formats(info)
+    return project_info(info)
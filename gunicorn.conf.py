@@ -0,0 +1,40 @@
+"""
+Production launcher: gunicorn -c gunicorn.conf.py
+
+Pre-forks WEB_CONCURRENCY worker processes. SERVER_MODE picks the app:
+- asgi (default): asgi_app:app on uvicorn workers, so each worker holds
+  many progress streams on its event loop
+- wsgi: railway_app:app on threaded workers
+
+Workers share sessions, analytics and the running-job registry through
+SQLite files, so any worker can answer /api/progress and
+/api/download_file for a download started in another one.
+"""
+
+import multiprocessing
+import os
+
+# Session snapshots and analytics must be visible to every worker
+os.environ.setdefault('SESSION_STORE', 'sqlite')
+os.environ.setdefault('ANALYTICS_BACKEND', 'sqlite')
+# Each worker publishes metric snapshots here so /metrics covers all of them
+os.environ.setdefault('METRICS_DIR', '/tmp/metrics')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(4, multiprocessing.cpu_count())))
+
+if os.environ.get('SERVER_MODE', 'asgi').lower() == 'wsgi':
+    wsgi_app = 'railway_app:app'
+    worker_class = 'gthread'
+    threads = int(os.environ.get('WEB_THREADS', 32))
+else:
+    wsgi_app = 'asgi_app:app'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+
+# Downloads run on threads started at import, so each worker imports the app itself
+preload_app = False
+# Progress streams and file downloads stay open for minutes
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
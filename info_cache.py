@@ -0,0 +1,179 @@
+"""
+Shared cache of yt-dlp info dicts keyed by YouTube video ID.
+
+Entries live in an in-memory LRU bounded by total serialized size and can
+optionally be mirrored to a directory on disk so they survive restarts.
+Each entry expires after the configured TTL or shortly before the signed
+media URLs inside it stop working, whichever comes first.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger(__name__)
+
+_PATH_EXPIRE_RE = re.compile(r'/expire/(\d+)')
+
+
+def signed_url_expiry(info):
+    """Return the earliest expiry timestamp of the signed URLs in an info dict"""
+    expiries = []
+    for fmt in info.get('formats') or []:
+        for key in ('url', 'manifest_url'):
+            url = fmt.get(key)
+            if not url:
+                continue
+            expire = parse_qs(urlparse(url).query).get('expire')
+            if expire and expire[0].isdigit():
+                expiries.append(int(expire[0]))
+                continue
+            match = _PATH_EXPIRE_RE.search(url)
+            if match:
+                expiries.append(int(match.group(1)))
+    return min(expiries) if expiries else None
+
+
+class InfoCache:
+    """Thread-safe LRU cache of sanitized info dicts with an optional disk tier"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=3600, disk_dir=None, expiry_margin=300):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.expiry_margin = expiry_margin
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # video_id -> (expires_at, serialized info)
+        self._size = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, video_id):
+        """Return a fresh copy of the cached info dict, or None on a miss"""
+        if not video_id:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(video_id)
+                self.hits += 1
+                return json.loads(entry[1])
+            if entry:
+                self._remove(video_id)
+
+        entry = self._load_from_disk(video_id, now)
+        with self._lock:
+            if entry:
+                self.hits += 1
+                self._store(video_id, *entry)
+                return json.loads(entry[1])
+            self.misses += 1
+        return None
+
+    def contains(self, video_id):
+        """Return True if a fresh entry is in memory, without copying it or counting a hit"""
+        with self._lock:
+            entry = self._entries.get(video_id)
+            return bool(entry and entry[0] > time.time())
+
+    def put(self, video_id, info):
+        """Cache a sanitized (JSON-serializable) info dict for video_id"""
+        if not video_id or not info:
+            return
+        expires_at = time.time() + self.ttl
+        url_expiry = signed_url_expiry(info)
+        if url_expiry:
+            expires_at = min(expires_at, url_expiry - self.expiry_margin)
+        if expires_at <= time.time():
+            return
+
+        try:
+            data = json.dumps(info)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Info for {video_id} is not cacheable: {e}")
+            return
+
+        with self._lock:
+            self._store(video_id, expires_at, data)
+        self._save_to_disk(video_id, expires_at, data)
+
+    def invalidate(self, video_id):
+        """Drop a video from both cache tiers"""
+        with self._lock:
+            self._remove(video_id)
+        if self.disk_dir:
+            try:
+                os.remove(self._disk_path(video_id))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Return cache counters for diagnostics"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def _store(self, video_id, expires_at, data):
+        """Insert an entry and evict least recently used ones; caller holds the lock"""
+        self._remove(video_id)
+        if len(data) > self.max_bytes:
+            return
+        self._entries[video_id] = (expires_at, data)
+        self._size += len(data)
+        while self._size > self.max_bytes:
+            evicted_id, (_, evicted) = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            logger.info(f"Info cache evicted {evicted_id}")
+
+    def _remove(self, video_id):
+        """Remove an in-memory entry; caller holds the lock"""
+        entry = self._entries.pop(video_id, None)
+        if entry:
+            self._size -= len(entry[1])
+
+    def _disk_path(self, video_id):
+        return os.path.join(self.disk_dir, f"{video_id}.json")
+
+    def _load_from_disk(self, video_id, now):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(video_id)
+        try:
+            with open(path, 'r') as f:
+                expires_at = float(f.readline())
+                data = f.read()
+        except (OSError, ValueError):
+            return None
+        if expires_at <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return expires_at, data
+
+    def _save_to_disk(self, video_id, expires_at, data):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(video_id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(f"{expires_at}\n")
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write info cache file {path}: {e}")
@@ -0,0 +1,184 @@
+"""
+Cross-process registry of running download jobs.
+
+With several worker processes, the in-memory inflight map only knows about
+jobs started in the same process. The registry records which session owns
+each (video, format) job in a SQLite database that all workers on the host
+share, so a request landing on any worker joins the running job instead of
+starting a duplicate. Sessions that join another worker's job are stored as
+aliases of the owning session, which lets any worker resolve their progress
+and finished file through the shared session store.
+
+SQLite's file locks serialize claims: claim() runs in a BEGIN IMMEDIATE
+transaction, so two workers cannot both take the same job.
+
+Each job also records the request that started it. When a worker dies or
+restarts mid-download, orphans() lists its jobs and adopt() hands each one
+to exactly one surviving worker, which resumes it from its .part files.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def process_started_at(pid):
+    """Return the start time of a process as a Unix timestamp, or None if it is unknown"""
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            # The command name may contain spaces; fields after it are fixed
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/stat', 'r') as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith('btime'))
+        return boot_time + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+
+
+def process_alive(pid, since=None):
+    """Return True if a process with this pid exists on the host.
+
+    With since, a process that started after that time is a different
+    process reusing the pid, which is common after a container restart.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    if since is not None:
+        started_at = process_started_at(pid)
+        if started_at is not None and started_at > since + 1:
+            return False
+    return True
+
+
+class JobRegistry:
+    """Shared map of job keys to owning sessions plus session aliases"""
+
+    def __init__(self, path='/tmp/jobs.db', alias_retention=3600, job_timeout=6 * 3600):
+        self.path = path
+        self.job_timeout = job_timeout
+        self.alias_retention = alias_retention
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'job_key TEXT PRIMARY KEY, session_id TEXT NOT NULL, pid INTEGER NOT NULL, '
+            'started_at REAL NOT NULL, request TEXT)'
+        )
+        # Databases created before requests were recorded
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')]
+        if 'request' not in columns:
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN request TEXT')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS aliases ('
+            'session_id TEXT PRIMARY KEY, primary_id TEXT NOT NULL, created_at REAL NOT NULL)'
+        )
+
+    def claim(self, job_key, session_id, request=None):
+        """Register session_id as the owner of job_key.
+
+        Returns None if the claim succeeded, or the session ID of the live job
+        that already owns the key. Jobs left behind by dead processes, or older
+        than job_timeout, are taken over. request is a JSON-serializable
+        description of the download, kept so orphans() can resume it.
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT session_id, pid, started_at FROM jobs WHERE job_key = ?', (job_key,)
+                ).fetchone()
+                if (row and row[0] != session_id and process_alive(row[1], since=row[2])
+                        and time.time() - row[2] < self.job_timeout):
+                    self._conn.execute('COMMIT')
+                    return row[0]
+                if row and row[0] != session_id:
+                    logger.info(f"Taking over stale job {job_key} from pid {row[1]}")
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO jobs (job_key, session_id, pid, started_at, request) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (job_key, session_id, os.getpid(), time.time(),
+                     json.dumps(request) if request is not None else None)
+                )
+                self._conn.execute('COMMIT')
+                return None
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def orphans(self):
+        """Return (job_key, session_id, request) for resumable jobs whose owner has died"""
+        cutoff = time.time() - self.job_timeout
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT job_key, session_id, pid, started_at, request FROM jobs '
+                'WHERE request IS NOT NULL AND started_at > ?', (cutoff,)
+            ).fetchall()
+        return [(job_key, session_id, json.loads(request))
+                for job_key, session_id, pid, started_at, request in rows
+                if not process_alive(pid, since=started_at)]
+
+    def adopt(self, job_key, session_id):
+        """Take over an orphaned job for this process; returns False if another worker did first"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT session_id, pid, started_at FROM jobs WHERE job_key = ?', (job_key,)
+                ).fetchone()
+                if not row or row[0] != session_id or process_alive(row[1], since=row[2]):
+                    self._conn.execute('COMMIT')
+                    return False
+                self._conn.execute(
+                    'UPDATE jobs SET pid = ?, started_at = ? WHERE job_key = ?',
+                    (os.getpid(), time.time(), job_key)
+                )
+                self._conn.execute('COMMIT')
+                return True
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def release(self, job_key, session_id):
+        """Remove job_key if session_id still owns it"""
+        with self._lock:
+            self._conn.execute(
+                'DELETE FROM jobs WHERE job_key = ? AND session_id = ?', (job_key, session_id)
+            )
+
+    def alias(self, session_id, primary_id):
+        """Record that session_id follows the job owned by primary_id"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO aliases (session_id, primary_id, created_at) VALUES (?, ?, ?)',
+                (session_id, primary_id, now)
+            )
+            self._conn.execute(
+                'DELETE FROM aliases WHERE created_at < ?', (now - self.alias_retention,)
+            )
+
+    def resolve(self, session_id):
+        """Return the owning session of an aliased session, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT primary_id FROM aliases WHERE session_id = ?', (session_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def stats(self):
+        """Return registry counts for health checks"""
+        with self._lock:
+            jobs = self._conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+            aliases = self._conn.execute('SELECT COUNT(*) FROM aliases').fetchone()[0]
+        return {'jobs': jobs, 'aliases': aliases}
@@ -0,0 +1,206 @@
+"""
+Remuxing of separately downloaded video and audio streams, and audio
+extraction for audio-only downloads.
+
+YouTube serves resolutions above 360p-720p only as DASH streams with video
+and audio in separate files. After both are downloaded, ffmpeg copies them
+into one container without re-encoding (-c copy), which is disk-bound and
+takes seconds even for long videos.
+
+Merges run as ffmpeg child processes from a small pool of their own, so:
+- the remux never runs under the server's GIL or on a download thread's CPU
+- MERGE_WORKERS caps how many remuxes compete for disk at once, however
+  many downloads finish together
+- ffmpeg's -progress output is parsed so the merge reports its own progress
+
+Audio-only downloads go through an AudioPool. When the downloaded stream
+already has the requested codec it is stream-copied into the target
+container; only a codec change (e.g. AAC to MP3) is transcoded. Transcodes
+are CPU-bound, so they get their own pool size (TRANSCODE_WORKERS) instead
+of competing with merges for MERGE_WORKERS.
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import yt_dlp
+
+logger = logging.getLogger(__name__)
+
+
+class MergeError(Exception):
+    """Raised when ffmpeg cannot remux or convert the streams"""
+
+
+def merged_extension(video_ext, audio_ext):
+    """Pick a container that holds both streams without re-encoding, like yt-dlp does"""
+    if video_ext == 'mp4' and audio_ext in ('m4a', 'mp4'):
+        return 'mp4'
+    if video_ext == 'webm' and audio_ext == 'webm':
+        return 'webm'
+    return 'mkv'
+
+
+# Output extension, source codecs that can be stream-copied, and encoder arguments
+AudioTarget = namedtuple('AudioTarget', ['ext', 'copy_codecs', 'encoder'])
+
+AUDIO_TARGETS = {
+    'm4a': AudioTarget('m4a', ('mp4a', 'aac'), ['-c:a', 'aac', '-b:a', '160k']),
+    'opus': AudioTarget('opus', ('opus',), ['-c:a', 'libopus', '-b:a', '128k']),
+    'mp3': AudioTarget('mp3', ('mp3',), ['-c:a', 'libmp3lame', '-q:a', '2']),
+}
+
+
+def can_copy_audio(acodec, target):
+    """Return True if a stream with codec acodec fits the target container without transcoding"""
+    return (acodec or '').lower().startswith(AUDIO_TARGETS[target].copy_codecs)
+
+
+# Codecs of YouTube's audio-only streams
+SOURCE_AUDIO_CODECS = ('mp4a', 'opus')
+
+
+def needs_transcode(target):
+    """Return True if no YouTube audio stream can be copied into the target, so it needs ffmpeg"""
+    return not any(can_copy_audio(acodec, target) for acodec in SOURCE_AUDIO_CODECS)
+
+
+def audio_target(quality):
+    """Return the target of an audio-only quality choice such as "audio-mp3", or None"""
+    kind, _, target = (quality or '').partition('-')
+    return target if kind == 'audio' and target in AUDIO_TARGETS else None
+
+
+def audio_format_spec(target, min_kbps=96, copy_only=False):
+    """Return a yt-dlp format spec for the smallest audio-only stream that suits the target.
+
+    Streams below min_kbps only win when nothing better exists, and a
+    progressive format is the last resort for videos without audio-only streams.
+    With copy_only (no ffmpeg) only streams already in the target's codec
+    match, so a video without one fails at format selection, before downloading.
+    """
+    if target == 'opus':
+        preferred = '[acodec=opus]'
+    else:
+        # AAC is stream-copied into m4a and is the smallest good source for an MP3
+        preferred = '[ext=m4a]'
+    spec = f"worstaudio{preferred}[abr>={min_kbps}]/bestaudio{preferred}"
+    if copy_only:
+        return spec
+    return f"{spec}/worstaudio[abr>={min_kbps}]/bestaudio/best"
+
+
+class FFmpegPool:
+    """Runs ffmpeg child processes with bounded concurrency"""
+
+    def __init__(self, workers=2, ffmpeg='ffmpeg', name='ffmpeg'):
+        self.workers = workers
+        self.ffmpeg = shutil.which(ffmpeg)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._active = 0
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        """True if ffmpeg was found"""
+        return self.ffmpeg is not None
+
+    def stats(self):
+        """Return pool occupancy for health checks"""
+        with self._lock:
+            return {'workers': self.workers, 'active': self._active, 'ffmpeg': self.available}
+
+    def _run(self, arguments, output_path, duration, on_progress):
+        if not self.available:
+            raise MergeError("ffmpeg is not installed")
+        command = [self.ffmpeg, '-y', '-nostdin', '-loglevel', 'error', '-nostats', '-progress', 'pipe:1']
+        command += arguments + [output_path]
+        with self._lock:
+            self._active += 1
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            # stderr only carries errors at this log level; drain it so ffmpeg never blocks on it
+            errors = []
+            reader = threading.Thread(target=lambda: errors.extend(process.stderr), daemon=True)
+            reader.start()
+            for line in process.stdout:
+                key, _, value = line.strip().partition('=')
+                if key == 'out_time_us' and value.isdigit() and duration and on_progress:
+                    on_progress(min(100.0, int(value) / 1e6 / duration * 100))
+            process.wait()
+            reader.join()
+        finally:
+            with self._lock:
+                self._active -= 1
+
+        if process.returncode != 0:
+            try:
+                os.remove(output_path)
+            except OSError:
+                pass
+            raise MergeError(''.join(errors).strip() or f"ffmpeg exited with {process.returncode}")
+        if on_progress:
+            on_progress(100.0)
+        return output_path
+
+
+class MergePool(FFmpegPool):
+    """Runs ffmpeg stream-copy merges with bounded concurrency"""
+
+    def __init__(self, workers=2, ffmpeg='ffmpeg'):
+        super().__init__(workers, ffmpeg, name='merge')
+
+    def submit(self, video_path, audio_path, output_path, duration=None, on_progress=None):
+        """Queue a merge; returns a Future that resolves to output_path or raises MergeError"""
+        arguments = ['-i', video_path, '-i', audio_path, '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy']
+        return self._executor.submit(self._run, arguments, output_path, duration, on_progress)
+
+
+class AudioPool(FFmpegPool):
+    """Converts downloaded streams to audio files, copying the codec where it already fits"""
+
+    def __init__(self, workers=1, ffmpeg='ffmpeg'):
+        super().__init__(workers, ffmpeg, name='audio')
+
+    def submit(self, input_path, output_path, target, acodec=None, duration=None, on_progress=None):
+        """Queue an extraction; returns a Future that resolves to output_path or raises MergeError"""
+        if can_copy_audio(acodec, target):
+            codec = ['-c:a', 'copy']
+        else:
+            codec = AUDIO_TARGETS[target].encoder
+        arguments = ['-i', input_path, '-map', '0:a:0', '-vn'] + codec
+        return self._executor.submit(self._run, arguments, output_path, duration, on_progress)
+
+    def extract(self, info, target, output_template, on_progress=None):
+        """Turn the stream yt-dlp downloaded for info into an audio file of the target format.
+
+        Blocks until the file is written under output_template and returns
+        (info, mode): info with the output's extension, and 'copy' or
+        'transcode', or None when ffmpeg is missing and a stream that already
+        has the target codec keeps the container it came in. on_progress gets
+        0.0 as ffmpeg starts, then its progress.
+        """
+        source_path = info['requested_downloads'][0]['filepath']
+        acodec = info.get('acodec')
+        copy_codec = can_copy_audio(acodec, target)
+        if not self.available:
+            if not copy_codec:
+                raise MergeError(f"Converting {acodec} audio to {target} needs ffmpeg")
+            with yt_dlp.YoutubeDL({'outtmpl': output_template}) as ydl:
+                os.replace(source_path, ydl.prepare_filename(info))
+            return info, None
+
+        if on_progress:
+            on_progress(0.0)
+        info = dict(info, ext=AUDIO_TARGETS[target].ext)
+        with yt_dlp.YoutubeDL({'outtmpl': output_template}) as ydl:
+            output_path = ydl.prepare_filename(info)
+        self.submit(source_path, output_path, target, acodec, info.get('duration'), on_progress).result()
+        # The stream is converted into the final file, so it is kept under its own name until now
+        os.remove(source_path)
+        return info, 'copy' if copy_codec else 'transcode'
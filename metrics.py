@@ -0,0 +1,299 @@
+"""
+In-process metrics with a Prometheus text exposition endpoint.
+
+Counters and histograms are plain in-memory numbers updated under a lock,
+cheap enough for hot paths. Gauges can be set directly or computed from a
+callback when /metrics is scraped.
+
+With several worker processes each worker only sees its own numbers, so
+when a shared directory is configured every worker periodically writes a
+snapshot there and render() adds up the snapshots of all live workers.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from job_registry import process_alive
+
+logger = logging.getLogger(__name__)
+
+# Default histogram buckets in seconds
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class for a named metric with optional labels"""
+
+    kind = 'untyped'
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def snapshot(self):
+        """Return the current values as JSON-serializable data"""
+        raise NotImplementedError
+
+    def combine(self, total, snapshot):
+        """Add the values of a snapshot into total"""
+        raise NotImplementedError
+
+    def merge(self, total, snapshot):
+        """Add a snapshot from another process into total"""
+        self.combine(total, snapshot)
+
+    def samples(self, data):
+        """Yield (suffix, label_key, extra_label, value) for exposition"""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def combine(self, total, snapshot):
+        for key, value in snapshot:
+            key = tuple(key)
+            total[key] = total.get(key, 0) + value
+
+    def samples(self, data):
+        for key, value in sorted(data.items()):
+            yield '_total', key, None, value
+
+
+class Gauge(Counter):
+    """Value that goes up and down, optionally computed by a callback at scrape time.
+
+    Gauges are summed across worker processes unless local=True, which is
+    for values every worker observes identically, like free disk space.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, *args, callback=None, local=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.callback = callback
+        self.local = local
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def snapshot(self):
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception as e:
+                logger.error(f"Gauge {self.name} callback failed: {e}")
+                values = {}
+            if not isinstance(values, dict):
+                values = {(): values}
+            with self._lock:
+                self._values = {k if isinstance(k, tuple) else (k,): v for k, v in values.items()}
+        return super().snapshot()
+
+    def merge(self, total, snapshot):
+        if not self.local:
+            self.combine(total, snapshot)
+
+    def samples(self, data):
+        for key, value in sorted(data.items()):
+            yield '', key, None, value
+
+
+class Histogram(Metric):
+    """Distribution of observations in cumulative buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}  # label key -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, **labels):
+        """Context manager that observes the duration of its block"""
+        return _Timer(self, labels)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), list(series)] for key, series in self._values.items()]
+
+    def combine(self, total, snapshot):
+        for key, series in snapshot:
+            key = tuple(key)
+            current = total.get(key)
+            total[key] = series if current is None else [a + b for a, b in zip(current, series)]
+
+    def samples(self, data):
+        for key, series in sorted(data.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield '_bucket', key, ('le', _format_value(float(bound))), cumulative
+            yield '_sum', key, None, series[-2]
+            yield '_count', key, None, series[-1]
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together, shared across workers through a directory"""
+
+    def __init__(self, shared_dir=None, flush_interval=5):
+        self.shared_dir = shared_dir
+        self.flush_interval = flush_interval
+        self._metrics = []
+        if shared_dir:
+            os.makedirs(shared_dir, exist_ok=True)
+            thread = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+            thread.start()
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return Counter(self, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=(), callback=None, local=False):
+        return Gauge(self, name, documentation, labelnames, callback=callback, local=local)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return Histogram(self, name, documentation, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def flush(self):
+        """Write this process's snapshot into the shared directory"""
+        if not self.shared_dir:
+            return
+        path = os.path.join(self.shared_dir, f"metrics_{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        totals = {metric.name: {} for metric in self._metrics}
+        own = self.snapshot()
+        for metric in self._metrics:
+            metric.combine(totals[metric.name], own[metric.name])
+        for snapshot in self._foreign_snapshots():
+            for metric in self._metrics:
+                if metric.name in snapshot:
+                    metric.merge(totals[metric.name], snapshot[metric.name])
+
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, key, extra, value in metric.samples(totals[metric.name]):
+                labels = _format_labels(metric.labelnames, key, extra)
+                lines.append(f"{metric.name}{suffix}{labels} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def _foreign_snapshots(self):
+        """Yield snapshots written by other live worker processes"""
+        if not self.shared_dir:
+            return
+        for entry in os.scandir(self.shared_dir):
+            if not (entry.name.startswith('metrics_') and entry.name.endswith('.json')):
+                continue
+            try:
+                pid = int(entry.name[len('metrics_'):-len('.json')])
+            except ValueError:
+                continue
+            if pid == os.getpid():
+                continue
+            if not process_alive(pid):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(entry.path, 'r') as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Metrics flush failed: {e}")
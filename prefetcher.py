@@ -0,0 +1,110 @@
+"""
+Speculative background work with a bounded queue.
+
+The frontend validates a URL before it asks for the formats, so the server
+can start the format extraction while the user is still looking at the
+page. Prefetch jobs run on their own small worker pool and never hold up
+requests:
+- the queue is bounded; when it is full the oldest job is dropped
+- the newest job runs first, since the user who validated last is the one
+  most likely to be waiting
+- jobs that waited longer than max_age are dropped; that user has moved on
+- a request that needs the same work cancels a queued job and does the work
+  itself, or waits for a job that is already running instead of repeating it
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """Runs keyed, droppable jobs on a small pool of worker threads"""
+
+    def __init__(self, workers=1, max_queue=32, max_age=30):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_age = max_age
+        self._queue = OrderedDict()  # key -> (queued_at, fn)
+        self._running = {}  # key -> threading.Event set when the job ends
+        self._counts = {'queued': 0, 'completed': 0, 'failed': 0, 'dropped': 0, 'expired': 0, 'cancelled': 0}
+        self._cond = threading.Condition()
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"prefetch-worker-{i}", daemon=True)
+            thread.start()
+
+    def submit(self, key, fn):
+        """Queue fn() under key; returns False if it is disabled or already queued or running"""
+        if not self.workers or not self.max_queue:
+            return False
+        with self._cond:
+            if key in self._queue or key in self._running:
+                return False
+            if len(self._queue) >= self.max_queue:
+                dropped, _ = self._queue.popitem(last=False)
+                self._counts['dropped'] += 1
+                logger.debug(f"Prefetch queue full, dropped {dropped}")
+            self._queue[key] = (time.monotonic(), fn)
+            self._counts['queued'] += 1
+            self._cond.notify()
+            return True
+
+    def cancel(self, key):
+        """Remove a job that has not started yet; returns True if it was queued"""
+        with self._cond:
+            if self._queue.pop(key, None) is None:
+                return False
+            self._counts['cancelled'] += 1
+            return True
+
+    def claim(self, key, timeout=None):
+        """Take over the work for key from the prefetcher.
+
+        A queued job is cancelled so the caller can run it right away. A
+        running job is awaited; returns True if it finished within timeout,
+        in which case its result is wherever the job stores it.
+        """
+        with self._cond:
+            if self._queue.pop(key, None) is not None:
+                self._counts['cancelled'] += 1
+                return False
+            done = self._running.get(key)
+        if done is None:
+            return False
+        return done.wait(timeout)
+
+    def stats(self):
+        """Return queue occupancy and job outcomes for health checks"""
+        with self._cond:
+            return {
+                'workers': self.workers,
+                'running': len(self._running),
+                'queued_now': len(self._queue),
+                'max_queue': self.max_queue,
+                **self._counts
+            }
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                key, (queued_at, fn) = self._queue.popitem(last=True)
+                if time.monotonic() - queued_at > self.max_age:
+                    self._counts['expired'] += 1
+                    continue
+                done = self._running[key] = threading.Event()
+            outcome = 'failed'
+            try:
+                fn()
+                outcome = 'completed'
+            except Exception as e:
+                logger.info(f"Prefetch {key} failed: {e}")
+            finally:
+                with self._cond:
+                    self._running.pop(key, None)
+                    self._counts[outcome] += 1
+                done.set()
@@ -0,0 +1,88 @@
+"""
+Change notifications for download progress.
+
+Progress hooks call publish() whenever a session's state changes; streaming
+endpoints block in wait() until their session has a newer version instead of
+re-reading state on a fixed timer. Coroutines use wait_async(), which parks
+a future on the event loop instead of a thread, so one process can hold many
+open progress streams.
+"""
+
+import asyncio
+import threading
+
+
+class ProgressBroadcaster:
+    """Per-session version counters with condition variables to wait on"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}  # session_id -> version
+        self._conditions = {}  # session_id -> Condition
+        self._waiters = {}  # session_id -> set of (loop, future)
+
+    def publish(self, session_id):
+        """Bump the session version and wake everyone waiting on it"""
+        cond = self._condition(session_id)
+        with cond:
+            self._versions[session_id] = self._versions.get(session_id, 0) + 1
+            cond.notify_all()
+        with self._lock:
+            waiters = self._waiters.pop(session_id, ())
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def version(self, session_id):
+        """Return the current version of a session"""
+        return self._versions.get(session_id, 0)
+
+    def wait(self, session_id, last_version, timeout):
+        """Block until the session version differs from last_version or timeout expires"""
+        cond = self._condition(session_id)
+        with cond:
+            cond.wait_for(lambda: self._versions.get(session_id, 0) != last_version, timeout)
+            return self._versions.get(session_id, 0)
+
+    async def wait_async(self, session_id, last_version, timeout):
+        """Like wait(), but suspends the calling coroutine instead of blocking a thread"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self._lock:
+            if self._versions.get(session_id, 0) != last_version:
+                return self._versions.get(session_id, 0)
+            self._waiters.setdefault(session_id, set()).add(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(session_id)
+                if waiters:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[session_id]
+        return self._versions.get(session_id, 0)
+
+    def discard(self, session_id):
+        """Forget a finished session"""
+        with self._lock:
+            self._conditions.pop(session_id, None)
+            self._versions.pop(session_id, None)
+            waiters = self._waiters.pop(session_id, ())
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def _condition(self, session_id):
+        with self._lock:
+            cond = self._conditions.get(session_id)
+            if cond is None:
+                cond = self._conditions[session_id] = threading.Condition()
+            return cond
+
+
+def _resolve(future):
+    """Complete a wait_async() future on its own loop unless it already timed out"""
+    if not future.done():
+        future.set_result(None)
@@ -1,13 +1,38 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response
 import yt_dlp
 import os
 import tempfile
+import shutil
+import copy
 import threading
 import time
 import uuid
 import json
 import logging
+import hashlib
+import math
+from concurrent.futures import ThreadPoolExecutor
+import mimetypes
+from urllib.parse import quote
+from werkzeug.wsgi import ClosingIterator
 from datetime import datetime
+from info_cache import InfoCache
+from youtube_url import validate_youtube_url, video_id_from_url
+from session_store import create_session_store
+from analytics import create_analytics
+from download_scheduler import ClientQueueFullError, FairScheduler, QueueFullError
+from progress_events import ProgressBroadcaster
+from download_cache import DownloadCache
+from disk_reaper import DiskReaper
+from download_options import clip_label, clip_options, concurrency_options, parse_clip
+from format_metadata import extract_format_listing, project_info
+from prefetcher import Prefetcher
+from batch_jobs import BatchRunner, is_batch_source
+from media_merge import AudioPool, MergePool, audio_format_spec, audio_target, merged_extension, needs_transcode
+from archive_stream import tar_size, tar_stream, unique_names, zip_stream
+from job_registry import JobRegistry
+from metrics import MetricsRegistry
+from rate_limiter import RateLimiter, client_address
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
@@ -17,63 +42,123 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Simple analytics storage
-analytics_file = "/tmp/analytics.json"
+# Analytics events are appended by a background writer; counters stay in memory
+analytics_store = create_analytics()
 
 def log_visit(page, user_ip=None):
     """Log page visits for basic analytics"""
     try:
-        # Load existing data
-        if os.path.exists(analytics_file):
-            with open(analytics_file, 'r') as f:
-                data = json.load(f)
-        else:
-            data = {"visits": [], "downloads": 0}
-        
-        # Add new visit
-        visit = {
-            "timestamp": datetime.now().isoformat(),
-            "page": page,
-            "ip": user_ip or request.remote_addr if request else "unknown"
-        }
-        data["visits"].append(visit)
-        
-        # Keep only last 1000 visits
-        data["visits"] = data["visits"][-1000:]
-        
-        # Save data
-        with open(analytics_file, 'w') as f:
-            json.dump(data, f)
-            
-        logger.info(f"Visit logged: {page} from {visit['ip']}")
+        ip = user_ip or request.remote_addr if request else "unknown"
+        analytics_store.log_visit(page, ip)
+        logger.info(f"Visit logged: {page} from {ip}")
     except Exception as e:
         logger.error(f"Analytics logging error: {e}")
 
 def increment_downloads():
     """Track download count"""
     try:
-        if os.path.exists(analytics_file):
-            with open(analytics_file, 'r') as f:
-                data = json.load(f)
-        else:
-            data = {"visits": [], "downloads": 0}
-        
-        data["downloads"] = data.get("downloads", 0) + 1
-        
-        with open(analytics_file, 'w') as f:
-            json.dump(data, f)
-            
-        logger.info(f"Download count: {data['downloads']}")
+        total = analytics_store.increment_downloads()
+        logger.info(f"Download count: {total}")
     except Exception as e:
         logger.error(f"Download tracking error: {e}")
 
-# Store download sessions with file persistence
+# Shared info-dict cache so format lookups and downloads reuse one extraction
+info_cache = InfoCache(
+    max_bytes=int(os.environ.get('INFO_CACHE_MAX_MB', 64)) * 1024 * 1024,
+    ttl=int(os.environ.get('INFO_CACHE_TTL', 3600)),
+    disk_dir=os.environ.get('INFO_CACHE_DIR') or None
+)
+
+def extract_video_info(url):
+    """Return the sanitized info dict for a URL, extracting only on a cache miss"""
+    video_id = video_id_from_url(url)
+    info = info_cache.get(video_id)
+    if info is not None:
+        logger.info(f"Info cache hit: {video_id}")
+        return info
+
+    ydl_opts = {
+        # Select every format so extraction never fails on a format filter
+        'format': 'all',
+        'quiet': True,
+        'no_warnings': True,
+        'skip_download': True,
+        'extractor_retries': 3,
+        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'noplaylist': True,
+        'playlist_items': '1'
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl, extract_latency.time(mode='full'):
+        info = ydl.extract_info(url, download=False)
+    info = yt_dlp.YoutubeDL.sanitize_info(info, remove_private_keys=True)
+    info_cache.put(video_id or info.get('id'), info)
+    return info
+
+# Compact format listings from the lightweight extraction path
+listing_cache = InfoCache(
+    max_bytes=int(os.environ.get('LISTING_CACHE_MAX_MB', 8)) * 1024 * 1024,
+    ttl=int(os.environ.get('INFO_CACHE_TTL', 3600))
+)
+
+# Speculative listing extractions started by /api/validate_url
+prefetcher = Prefetcher(
+    workers=int(os.environ.get('PREFETCH_WORKERS', 1)),
+    max_queue=int(os.environ.get('PREFETCH_QUEUE_SIZE', 32)),
+    max_age=int(os.environ.get('PREFETCH_MAX_AGE', 30))
+)
+# Seconds a format request waits for a prefetch of the same video that is already running
+PREFETCH_WAIT = float(os.environ.get('PREFETCH_WAIT', 20))
+
+def cached_format_listing(video_id):
+    """Return the compact format listing for a video from the caches, or None"""
+    # A full extraction made for a download already has everything a listing needs
+    info = info_cache.get(video_id)
+    if info is not None:
+        return project_info(info)
+    return listing_cache.get(video_id)
+
+def extract_listing(url, video_id, mode='listing'):
+    """Run the lightweight extraction for a URL and cache its listing"""
+    user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    with extract_latency.time(mode=mode):
+        listing = extract_format_listing(url, user_agent=user_agent)
+    listing_cache.put(video_id or listing.get('id'), listing)
+    return listing
+
+def fetch_format_listing(url):
+    """Return the compact format listing for a URL, reusing any cached extraction"""
+    video_id = video_id_from_url(url)
+    listing = cached_format_listing(video_id)
+    if listing is not None:
+        return listing
+    # Take the work over from the prefetcher: run it now if it is still queued, or wait if it is running
+    if video_id and prefetcher.claim(video_id, timeout=PREFETCH_WAIT):
+        listing = cached_format_listing(video_id)
+        if listing is not None:
+            return listing
+    return extract_listing(url, video_id)
+
+def prefetch_format_listing(url):
+    """Queue a background listing extraction for a URL the user is likely to request formats for"""
+    video_id = video_id_from_url(url)
+    if not video_id or listing_cache.contains(video_id) or info_cache.contains(video_id):
+        return False
+    return prefetcher.submit(video_id, lambda: extract_listing(url, video_id, mode='prefetch'))
+
+# Store download sessions; snapshots are persisted by a write-coalescing session store
 download_sessions = {}
-import pickle
-import json
+session_store = create_session_store()
+
+# Running downloads by (video ID, format spec) so identical requests share one job
+inflight_downloads = {}
+inflight_lock = threading.Lock()
+progress_broadcaster = ProgressBroadcaster()
+
+# Running jobs and joined sessions shared by every worker process on the host
+job_registry = JobRegistry(os.environ.get('JOB_DB_PATH', '/tmp/jobs.db'))
 
 def save_session(session_id, download_mgr):
-    """Save session data to file"""
+    """Record session data; the store flushes it to disk on an interval"""
     try:
         session_data = {
             'status': download_mgr.status,
@@ -84,25 +169,338 @@ def save_session(session_id, download_mgr):
             'eta': download_mgr.eta,
             'filename': download_mgr.filename,
             'filepath': getattr(download_mgr, 'filepath', None),
+            'stream_path': download_mgr.stream_path,
             'error': download_mgr.error
         }
-        
-        session_file = f"/tmp/session_{session_id}.json"
-        with open(session_file, 'w') as f:
-            json.dump(session_data, f)
+        session_store.save(session_id, session_data)
+        progress_broadcaster.publish(session_id)
+        # Items of a batch also wake its feeder and its progress streams
+        batch_id = batch_runner.batch_for(session_id)
+        if batch_id:
+            batch_runner.notify(batch_id)
+            progress_broadcaster.publish(batch_id)
     except Exception as e:
-        print(f"Error saving session: {e}")
+        logger.error(f"Error saving session: {e}")
 
 def load_session(session_id):
-    """Load session data from file"""
+    """Load session data from the session store, following joins to another worker's job"""
+    session_data = session_store.get(session_id)
+    if session_data is None:
+        primary_id = job_registry.resolve(session_id)
+        if primary_id:
+            session_data = session_store.get(primary_id)
+    return session_data
+
+def schedule_forget(session_id, delay=10):
+    """Forget a finished session after a delay without holding a worker"""
+    cleanup = threading.Timer(delay, forget_session, args=(session_id,))
+    cleanup.daemon = True
+    cleanup.start()
+
+def forget_session(session_id):
+    """Drop a finished session from memory; its snapshot stays in the session store"""
+    download_mgr = download_sessions.pop(session_id, None)
+    progress_broadcaster.discard(session_id)
+    if download_mgr is not None:
+        download_cache.release(download_mgr.cache_key)
+
+# Fixed-size worker pool so bursts queue up instead of spawning unbounded yt-dlp jobs;
+# queued jobs start in weighted fair order between clients and smallest expected size first,
+# and a small-job lane runs short downloads while long ones hold the regular workers
+download_scheduler = FairScheduler(
+    workers=int(os.environ.get('DOWNLOAD_WORKERS', 2)),
+    max_queue=int(os.environ.get('DOWNLOAD_QUEUE_SIZE', 20)),
+    max_per_client=int(os.environ.get('DOWNLOAD_QUEUE_PER_CLIENT', 5)),
+    unit_cost=float(os.environ.get('DOWNLOAD_COST_UNIT_MB', 100)) * 1024 * 1024,
+    aging=float(os.environ.get('DOWNLOAD_AGING', 30)),
+    small_workers=int(os.environ.get('DOWNLOAD_SMALL_WORKERS', 1)),
+    small_cost=float(os.environ.get('DOWNLOAD_SMALL_MB', 50)) * 1024 * 1024
+)
+# Share of the workers a batch item gets relative to a single download from the same client
+BATCH_WEIGHT = float(os.environ.get('BATCH_WEIGHT', 0.5))
+
+# Token buckets per client IP for the endpoints that start yt-dlp work, and per video ID
+# for requests that would start a fresh extraction; state is in memory and compacted
+download_limiter = RateLimiter(
+    rate=float(os.environ.get('RATE_LIMIT_DOWNLOADS_PER_MIN', 10)) / 60,
+    burst=int(os.environ.get('RATE_LIMIT_DOWNLOADS_BURST', 5))
+)
+format_limiter = RateLimiter(
+    rate=float(os.environ.get('RATE_LIMIT_FORMATS_PER_MIN', 30)) / 60,
+    burst=int(os.environ.get('RATE_LIMIT_FORMATS_BURST', 10))
+)
+video_limiter = RateLimiter(
+    rate=float(os.environ.get('RATE_LIMIT_VIDEO_PER_MIN', 20)) / 60,
+    burst=int(os.environ.get('RATE_LIMIT_VIDEO_BURST', 10))
+)
+# Proxies in front of the app (Railway's edge is one) whose X-Forwarded-For entries are trusted
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 1))
+
+def request_client():
+    """Return the IP address of the client behind the current request"""
+    return client_address(request.remote_addr, request.headers.get('X-Forwarded-For'), TRUSTED_PROXIES)
+
+def check_rate_limit(limiter, client, url=None):
+    """Return a 429 (payload, status, headers) if the client or the URL's video is over its limit, else None"""
+    wait = limiter.acquire(client)
+    limit = 'client'
+    if not wait and url:
+        video_id = video_id_from_url(url)
+        # Only requests that would start a fresh extraction count against the video
+        if video_id and cached_format_listing(video_id) is None:
+            wait = video_limiter.acquire(video_id)
+            limit = 'video'
+            if wait:
+                # The request does no work, so it does not count against the client either
+                limiter.refund(client)
+    if not wait:
+        return None
+    rate_limited.inc(limit=limit)
+    retry_after = math.ceil(wait)
+    logger.warning(f"Rate limited {client} ({limit}), retry in {retry_after}s")
+    return {
+        'success': False,
+        'error': f'Too many requests, please try again in {retry_after} seconds'
+    }, 429, {'Retry-After': str(retry_after)}
+
+# Remuxes of separately downloaded video and audio, outside the download workers
+merge_pool = MergePool(
+    workers=int(os.environ.get('MERGE_WORKERS', 2)),
+    ffmpeg=os.environ.get('FFMPEG_PATH', 'ffmpeg')
+)
+
+# yt-dlp's section downloader only looks for ffmpeg on PATH, whatever ffmpeg_location says
+if merge_pool.available and os.path.dirname(merge_pool.ffmpeg) not in os.environ.get('PATH', '').split(os.pathsep):
+    os.environ['PATH'] = os.path.dirname(merge_pool.ffmpeg) + os.pathsep + os.environ.get('PATH', '')
+
+# Audio-only downloads are copied or transcoded here; transcodes are CPU-bound
+audio_pool = AudioPool(
+    workers=int(os.environ.get('TRANSCODE_WORKERS', 1)),
+    ffmpeg=os.environ.get('FFMPEG_PATH', 'ffmpeg')
+)
+
+# Audio-only streams below this bitrate are only used when nothing better exists
+AUDIO_MIN_KBPS = int(os.environ.get('AUDIO_MIN_KBPS', 96))
+
+def format_spec_for_quality(quality):
+    """Translate a quality choice or format ID into a yt-dlp format spec"""
+    target = audio_target(quality)
+    if target:
+        return audio_format_spec(target, AUDIO_MIN_KBPS, copy_only=not audio_pool.available)
+    # Without ffmpeg only progressive formats (video with audio) can be delivered
+    merge = merge_pool.available
+    if quality == "auto":
+        format_spec = "bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best" if merge else "best"
+    elif quality.isdigit():
+        # A video-only (DASH) format ID gets the best audio merged in
+        format_spec = f"{quality}[acodec=none]+bestaudio[ext=m4a]/{quality}[acodec=none]+bestaudio/{quality}" if merge else quality
+        logger.debug(f"Using format ID: {quality}")
+    elif quality[:-1].isdigit() and quality.endswith('p'):
+        height = quality[:-1]
+        if merge:
+            format_spec = (f"bestvideo[height<={height}][ext=mp4]+bestaudio[ext=m4a]/"
+                           f"bestvideo[height<={height}]+bestaudio/best[height<={height}]/best")
+        else:
+            format_spec = f"best[height<={height}],best"
+        logger.debug(f"Using quality filter: {format_spec}")
+    else:
+        format_spec = quality
+        logger.debug(f"Using format spec: {format_spec}")
+    return format_spec
+
+REAPER_INTERVAL = int(os.environ.get('REAPER_INTERVAL', 60))
+
+# Completed files are shared between sessions, keyed by (video_id, format_id);
+# leases are renewed every reaper pass, so they must outlast a few intervals
+download_cache = DownloadCache(
+    os.environ.get('DOWNLOAD_CACHE_DIR', '/tmp/download_cache'),
+    max_bytes=int(os.environ.get('DOWNLOAD_CACHE_MAX_MB', 2048)) * 1024 * 1024,
+    lease=3 * REAPER_INTERVAL
+)
+
+# Downloads are written to per-job directories under this root until published
+DOWNLOAD_WORK_DIR = os.environ.get('DOWNLOAD_WORK_DIR', '/tmp/downloads')
+# yt-dlp's in-progress files; a work directory holding any of them can be resumed
+PARTIAL_SUFFIXES = ('.part', '.ytdl', '.temp')
+
+def job_work_dir(job_key):
+    """Return the work directory of a job, the same every time so a rerun finds its .part files"""
+    return os.path.join(DOWNLOAD_WORK_DIR, 'job-' + hashlib.sha1(job_key.encode()).hexdigest()[:16])
+
+def has_partial_files(directory):
     try:
-        session_file = f"/tmp/session_{session_id}.json"
-        if os.path.exists(session_file):
-            with open(session_file, 'r') as f:
-                return json.load(f)
-    except Exception as e:
-        print(f"Error loading session: {e}")
-    return None
+        return any(name.endswith(PARTIAL_SUFFIXES) for name in os.listdir(directory))
+    except OSError:
+        return False
+
+def active_download_dirs():
+    """Return the work directories of downloads that are still running"""
+    return {mgr.download_dir for mgr in list(download_sessions.values())
+            if mgr.download_dir and mgr.status not in ('completed', 'error')}
+
+# Deletes stale work dirs, cached files and sessions, and enforces the disk quota
+disk_reaper = DiskReaper(
+    DOWNLOAD_WORK_DIR,
+    download_cache,
+    session_store,
+    active_dirs=active_download_dirs,
+    retention=int(os.environ.get('REAPER_RETENTION', 3600)),
+    quota_bytes=int(os.environ.get('DISK_QUOTA_MB', 4096)) * 1024 * 1024,
+    min_free_bytes=int(os.environ.get('MIN_FREE_MB', 512)) * 1024 * 1024,
+    interval=REAPER_INTERVAL
+)
+disk_reaper.start()
+
+# Hot-path metrics served at /metrics; workers merge snapshots through METRICS_DIR
+metrics = MetricsRegistry(os.environ.get('METRICS_DIR') or None)
+extract_latency = metrics.histogram(
+    'ytdlp_extract_seconds', 'Time spent in yt-dlp extraction on cache misses', ['mode'])
+download_duration = metrics.histogram(
+    'download_duration_seconds', 'Time from a download starting to it finishing', ['outcome'])
+merge_duration = metrics.histogram(
+    'merge_duration_seconds', 'Time ffmpeg spends remuxing video and audio streams')
+audio_duration = metrics.histogram(
+    'audio_extract_seconds', 'Time ffmpeg spends turning a stream into an audio file', ['mode'])
+first_byte_latency = metrics.histogram(
+    'download_first_byte_seconds', 'Time from a download starting to its first byte from upstream')
+send_throughput = metrics.histogram(
+    'file_send_bytes_per_second', 'Transfer rate of files sent to clients', ['mode'],
+    buckets=tuple(2 ** n * 64 * 1024 for n in range(13)))
+bytes_sent = metrics.counter('file_sent_bytes', 'Bytes of files sent to clients', ['mode'])
+ytdlp_errors = metrics.counter('ytdlp_errors', 'yt-dlp failures by error class', ['stage', 'error_class'])
+rate_limited = metrics.counter('rate_limited_requests', 'Requests rejected by a rate limit', ['limit'])
+metrics.gauge('download_jobs', 'Download jobs by state', ['state'], callback=lambda: {
+    ('active',): download_scheduler.stats()['active'],
+    ('queued',): download_scheduler.stats()['queued']
+})
+metrics.gauge('disk_bytes', 'Disk usage of downloads', ['kind'], local=True, callback=lambda: {
+    (kind,): disk_reaper.usage()[f'{kind}_bytes'] for kind in ('work', 'cache', 'free', 'quota')
+})
+
+# Substrings of yt-dlp error messages, checked in order, mapped to an error class
+YTDLP_ERROR_CLASSES = (
+    ('unavailable', ('video unavailable', 'private video', 'has been removed', 'not available in your country')),
+    ('sign_in', ('sign in to confirm', 'login required', 'confirm your age')),
+    ('rate_limited', ('http error 429', 'too many requests')),
+    ('forbidden', ('http error 403', 'forbidden')),
+    ('http_error', ('http error',)),
+    ('format_unavailable', ('requested format is not available',)),
+    ('timeout', ('timed out', 'timeout')),
+    ('network', ('connection', 'network', 'unable to download'))
+)
+
+def ytdlp_error_class(error):
+    """Classify a yt-dlp error message for the error counter"""
+    message = str(error).lower()
+    for error_class, needles in YTDLP_ERROR_CLASSES:
+        if any(needle in message for needle in needles):
+            return error_class
+    return 'other'
+
+def metered_body(body, mode):
+    """Yield a response body while recording how much was sent and how fast"""
+    start = time.perf_counter()
+    sent = 0
+    try:
+        for chunk in body:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        elapsed = time.perf_counter() - start
+        bytes_sent.inc(sent, mode=mode)
+        if sent and elapsed > 0:
+            send_throughput.observe(sent / elapsed, mode=mode)
+        if hasattr(body, 'close'):
+            body.close()
+
+# Seconds between two INFO progress lines for one download; other ticks log at DEBUG
+PROGRESS_LOG_INTERVAL = float(os.environ.get('PROGRESS_LOG_INTERVAL', 5))
+
+def select_formats(info, format_spec):
+    """Return the info dict with the formats yt-dlp would pick for format_spec"""
+    # Format selection on an already extracted info dict needs no network access
+    with yt_dlp.YoutubeDL({'format': format_spec, 'quiet': True, 'no_warnings': True}) as ydl:
+        return ydl.process_ie_result(copy.deepcopy(info), download=False)
+
+def cache_format_id(info, quality, clip=None):
+    """Return the download cache's format key; audio targets and clips differ from the source"""
+    format_id = info.get('format_id')
+    target = audio_target(quality)
+    if target:
+        format_id = f"{format_id}.{target}"
+    if clip:
+        format_id = f"{format_id}@{clip_label(clip)}"
+    return format_id
+
+def find_cached_download(info, quality, clip=None):
+    """Return a referenced download cache entry for the format yt-dlp would pick, or None"""
+    selected = select_formats(info, format_spec_for_quality(quality))
+    return download_cache.acquire(selected.get('id'), cache_format_id(selected, quality, clip))
+
+def expected_download_size(url, quality, clip=None):
+    """Estimate the bytes a download will fetch from the cached format listing, or None.
+
+    The largest format a quality choice allows stands in for yt-dlp's pick,
+    plus the largest audio stream when it would be merged in. Custom format
+    specs are not modelled and return None.
+    """
+    listing = cached_format_listing(video_id_from_url(url))
+    if not listing:
+        return None
+    duration = listing.get('duration')
+
+    def size(fmt):
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if not size and fmt.get('tbr') and duration:
+            size = fmt['tbr'] * 1000 / 8 * duration
+        return size
+
+    def has(fmt, codec):
+        return fmt.get(codec) not in (None, 'none')
+
+    formats = [fmt for fmt in listing.get('formats') or [] if size(fmt)]
+    audio = [size(fmt) for fmt in formats if has(fmt, 'acodec') and not has(fmt, 'vcodec')]
+    # Video with audio in one file, which is all "best" and "worst" pick and all there is without ffmpeg
+    progressive = [fmt for fmt in formats if has(fmt, 'vcodec') and has(fmt, 'acodec')]
+    merge = merge_pool.available
+    if audio_target(quality):
+        # The audio spec takes the smallest stream above AUDIO_MIN_KBPS
+        if not audio:
+            return None
+        total = min(audio)
+    else:
+        choose = max
+        if quality in ('best', 'worst'):
+            candidates = progressive
+            choose = max if quality == 'best' else min
+        elif quality == 'auto':
+            candidates = [fmt for fmt in formats if has(fmt, 'vcodec')] if merge else progressive
+        elif quality.isdigit():
+            candidates = [fmt for fmt in formats if fmt['format_id'] == quality]
+        elif quality[:-1].isdigit() and quality.endswith('p'):
+            height = int(quality[:-1])
+            fitting = [fmt for fmt in formats if has(fmt, 'vcodec') and (fmt.get('height') or 0) <= height]
+            if not merge:
+                fitting = [fmt for fmt in fitting if has(fmt, 'acodec')]
+            # The spec falls back to the best progressive format when nothing fits
+            candidates = fitting or progressive
+        else:
+            return None
+        if not candidates:
+            return None
+        chosen = choose(candidates, key=size)
+        total = size(chosen)
+        if merge and has(chosen, 'vcodec') and not has(chosen, 'acodec') and audio:
+            total += max(audio)
+    if clip and duration:
+        start, end = clip
+        total *= max(0.0, min(end or duration, duration) - start) / duration
+    return total
+
+def download_key(url, quality, clip=None):
+    """Return the key identical downloads share: video, format spec and clip range"""
+    key = (video_id_from_url(url) or url, format_spec_for_quality(quality))
+    return key + (clip_label(clip),) if clip else key
 
 class DownloadManager:
     def __init__(self, session_id):
@@ -115,16 +513,48 @@ class DownloadManager:
         self.eta = "Unknown"
         self.filename = ""
         self.error = None
-        
+        # Partial file that can be streamed to the client while it is being written
+        self.stream_path = None
+        # Download cache entry this session holds a reference on
+        self.cache_key = None
+        # Sessions that joined this download instead of starting their own
+        self.followers = []
+        # Work directory yt-dlp writes into
+        self.download_dir = None
+        self.sequential_output = True
+        # Timing for metrics and sampled progress logging
+        self.started_at = None
+        self.first_byte_seen = False
+        self.last_progress_log = 0
+        # (downloaded, total, speed) per format while video and audio download side by side
+        self.stream_bytes = {}
+            
+    def save(self):
+        """Save session data for this session and every session attached to it"""
+        save_session(self.session_id, self)
+        for follower_id in self.followers:
+            save_session(follower_id, self)
+            
     def progress_hook(self, d):
         """Progress callback for yt-dlp"""
         if d['status'] == 'downloading':
             # Update status first
             self.status = "downloading"
             
+            # Single-file progressive downloads are written sequentially, so the
+            # partial file can be tailed; merged or fragmented formats cannot
+            if self.stream_path is None and self.sequential_output and d.get('tmpfilename'):
+                info = d.get('info_dict') or {}
+                if not info.get('requested_formats') and info.get('protocol') in ('http', 'https'):
+                    self.stream_path = d['tmpfilename']
+                    self.filename = os.path.basename(d['filename'])
+            
             # Update bytes info first
             downloaded = d.get('downloaded_bytes', 0)
             total = d.get('total_bytes', 0)
+            if downloaded and not self.first_byte_seen and self.started_at:
+                self.first_byte_seen = True
+                first_byte_latency.observe(time.time() - self.started_at)
             
             if total > 0:
                 self.downloaded_bytes = downloaded
@@ -146,8 +576,13 @@ class DownloadManager:
             
             # Save session data
             if hasattr(self, 'session_id'):
-                save_session(self.session_id, self)
-                print(f"Progress update: {self.progress:.1f}% - {self.speed}")
+                self.save()
+                now = time.time()
+                if now - self.last_progress_log >= PROGRESS_LOG_INTERVAL:
+                    self.last_progress_log = now
+                    logger.info(f"Progress {self.session_id}: {self.progress:.1f}% - {self.speed}")
+                elif logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Progress {self.session_id}: {self.progress:.1f}% - {self.speed}")
             
         elif d['status'] == 'finished':
             self.status = "processing"
@@ -155,35 +590,141 @@ class DownloadManager:
             self.progress = 100.0
             self.downloaded_bytes = self.total_bytes  # Ensure bytes match
             if hasattr(self, 'session_id'):
-                save_session(self.session_id, self)
-                print(f"Download finished, progress set to 100%")
+                self.save()
+                logger.info(f"Download finished for {self.session_id}")
+    
+    def stream_progress_hook(self, format_id, d):
+        """Progress callback for one of several formats downloading in parallel"""
+        if d['status'] != 'downloading':
+            return
+        self.stream_bytes[format_id] = (
+            d.get('downloaded_bytes') or 0,
+            d.get('total_bytes') or d.get('total_bytes_estimate') or 0,
+            d.get('speed') or 0
+        )
+        # Report the streams as one download; the merge follows as its own phase
+        downloaded = sum(entry[0] for entry in self.stream_bytes.values())
+        speed = sum(entry[2] for entry in self.stream_bytes.values())
+        self.progress_hook({
+            'status': 'downloading',
+            'downloaded_bytes': downloaded,
+            'total_bytes': sum(entry[1] for entry in self.stream_bytes.values()),
+            '_speed_str': f"{yt_dlp.utils.format_bytes(speed)}/s"
+        })
+    
+    def merge_progress(self, percent):
+        self.progress = percent
+        self.save()
+    
+    def download_and_merge(self, info, selected, ydl_opts, download_dir):
+        """Download the video and audio formats of a selection in parallel, then remux them"""
+        formats = selected['requested_formats']
+        # Neither stream alone is the final file, so nothing can be streamed while downloading
+        self.sequential_output = False
+        
+        def fetch(fmt):
+            opts = dict(ydl_opts)
+            opts.update({
+                'format': fmt['format_id'],
+                'outtmpl': os.path.join(download_dir, f"%(title)s.f{fmt['format_id']}.%(ext)s"),
+                'progress_hooks': [lambda d: self.stream_progress_hook(fmt['format_id'], d)],
+                # The remux writes a fresh container, so per-stream container fixups are wasted passes
+                'fixup': 'never'
+            })
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                result = ydl.process_ie_result(copy.deepcopy(info), download=True)
+            return result['requested_downloads'][0]['filepath']
+        
+        with ThreadPoolExecutor(max_workers=len(formats)) as pool:
+            video_path, audio_path = pool.map(fetch, formats[:2])
+        
+        self.status = "merging"
+        self.progress = 0.0
+        self.save()
+        ext = merged_extension(formats[0].get('ext'), formats[1].get('ext'))
+        with yt_dlp.YoutubeDL({'outtmpl': ydl_opts['outtmpl']}) as ydl:
+            output_path = ydl.prepare_filename(dict(selected, ext=ext))
+        started = time.time()
+        merge_pool.submit(video_path, audio_path, output_path, selected.get('duration'),
+                          self.merge_progress).result()
+        merge_duration.observe(time.time() - started)
+        for path in (video_path, audio_path):
+            os.remove(path)
+        logger.info(f"Merged {selected['format_id']} into {os.path.basename(output_path)}")
+        return dict(selected, ext=ext)
+    
+    def extract_audio(self, info, target, output_template):
+        """Turn a downloaded stream into an audio file of the target format"""
+        def on_progress(percent):
+            self.status = "converting"
+            self.merge_progress(percent)
+        
+        started = time.time()
+        info, mode = audio_pool.extract(info, target, output_template, on_progress)
+        if mode:
+            audio_duration.observe(time.time() - started, mode=mode)
+            logger.info(f"Extracted {target} audio ({mode}) from format {info.get('format_id')}")
+        return info
     
-    def download_video(self, url, quality, format_only=False):
-        """Download video with specified quality or format ID"""
+    def use_cached_file(self, entry, info):
+        """Complete this session from a cached download without running yt-dlp"""
+        self.cache_key = entry.key
+        self.filename = entry.filename
+        self.filepath = entry.path
+        self.downloaded_bytes = self.total_bytes = entry.size
+        self.progress = 100.0
+        self.status = "completed"
+        self.save()
+        logger.info(f"Download cache hit: {self.filename} ({entry.size} bytes)")
+        return {
+            'success': True,
+            'title': info.get('title', 'Unknown'),
+            'filename': self.filename,
+            'filepath': self.filepath,
+            'size': f"{self.total_bytes / (1024*1024):.1f} MB"
+        }
+    
+    def download_video(self, url, quality, format_only=False, connections=None, work_dir=None, clip=None):
+        """Download video with specified quality or format ID, into work_dir if given.
+
+        clip is an optional (start, end) range in seconds; only that part is fetched.
+        """
         try:
             self.status = "starting"
+            if not format_only:
+                self.save()
             
-            # Use temporary directory for cloud deployment
-            download_dir = tempfile.mkdtemp()
+            if format_only:
+                # Just get format info, from the lightweight listing path
+                info = fetch_format_listing(url)
+                return {
+                    'success': True,
+                    'title': info.get('title', 'Unknown'),
+                    'formats': info.get('formats', [])
+                }
             
-            # Configure yt-dlp options
-            if quality == "auto":
-                format_spec = "best"
-            elif quality.isdigit():
-                format_spec = quality
-                print(f"🎯 Using format ID: {quality}")
-            elif quality in ["720p", "480p", "360p"]:
-                height = quality[:-1]
-                format_spec = f"best[height<={height}],best"
-                print(f"🎯 Using quality filter: {format_spec}")
+            self.started_at = time.time()
+            
+            # Use a work directory the disk reaper knows about
+            if work_dir:
+                os.makedirs(work_dir, exist_ok=True)
+                download_dir = work_dir
+                if has_partial_files(download_dir):
+                    logger.info(f"Resuming partial download in {download_dir}")
             else:
-                format_spec = quality
-                print(f"🎯 Using format spec: {format_spec}")
+                download_dir = tempfile.mkdtemp(dir=DOWNLOAD_WORK_DIR)
+            self.download_dir = download_dir
+            
+            # Configure yt-dlp options
+            format_spec = format_spec_for_quality(quality)
             
             ydl_opts = {
                 'format': format_spec,
                 'outtmpl': os.path.join(download_dir, '%(title)s.%(ext)s'),
                 'progress_hooks': [self.progress_hook],
+                # Route yt-dlp output through logging instead of a line per tick on stdout
+                'logger': logging.getLogger('yt_dlp'),
+                'noprogress': True,
                 'quiet': False,
                 'no_warnings': False,
                 'extractor_retries': 3,
@@ -194,107 +735,179 @@ class DownloadManager:
                 'noplaylist': True,
                 'playlist_items': '1',
                 'extract_flat': False,
-                'ignoreerrors': False
+                'ignoreerrors': False,
+                # Continue .part files left by an interrupted run of the same job
+                'continuedl': True
             }
+            # Parallel fragments, ranged chunks and optional aria2c, capped per job
+            ydl_opts.update(concurrency_options(connections))
+            # Files assembled out of order by an external downloader cannot be tailed
+            self.sequential_output = 'external_downloader' not in ydl_opts
+            if clip:
+                ydl_opts.update(clip_options(clip))
+                ydl_opts['outtmpl'] = os.path.join(download_dir, f"%(title)s ({clip_label(clip)}).%(ext)s")
+                # ffmpeg writes the clip in one pass and reports no progress until it is done
+                self.sequential_output = False
+                self.status = "clipping"
+                self.save()
             
-            if format_only:
-                ydl_opts['listformats'] = True
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                if format_only:
-                    # Just get format info
-                    info = ydl.extract_info(url, download=False)
-                    return {
-                        'success': True,
-                        'title': info.get('title', 'Unknown'),
-                        'formats': info.get('formats', [])
-                    }
-                else:
-                    # Download the video
-                    info = ydl.extract_info(url, download=True)
-                    
-                    # Wait a moment to ensure file is fully written
-                    import time
-                    time.sleep(2)
-                    
-                    # Find the actual downloaded file
-                    files = os.listdir(download_dir)
-                    if files:
-                        # Get the most recently modified file (the downloaded video)
-                        files_with_paths = [(f, os.path.join(download_dir, f)) for f in files]
-                        files_with_paths.sort(key=lambda x: os.path.getmtime(x[1]), reverse=True)
-                        
-                        self.filename = files_with_paths[0][0]
-                        self.filepath = files_with_paths[0][1]
-                        
-                        # Verify file exists and has reasonable size
-                        if os.path.exists(self.filepath):
-                            actual_size = os.path.getsize(self.filepath)
-                            if actual_size > 1024:  # File should be at least 1KB
-                                self.status = "completed"
-                                print(f"Download completed: {self.filename} ({actual_size} bytes)")
-                            else:
-                                self.status = "error"
-                                self.error = "Downloaded file is too small or corrupted"
-                                print(f"Error: Downloaded file is too small: {actual_size} bytes")
-                        else:
-                            self.status = "error"
-                            self.error = "File not found after download"
-                            print(f"Error: File not found after download: {self.filepath}")
+            # Serve from the download cache when this exact format was fetched before
+            info = extract_video_info(url)
+            selected = select_formats(info, format_spec)
+            entry = download_cache.acquire(selected.get('id'), cache_format_id(selected, quality, clip))
+            if entry:
+                shutil.rmtree(download_dir, ignore_errors=True)
+                download_duration.observe(time.time() - self.started_at, outcome='cached')
+                return self.use_cached_file(entry, info)
+            
+            if clip and info.get('duration') and clip[0] >= info['duration']:
+                raise ValueError(f"Clip starts after the end of the video ({info['duration']:g}s)")
+            
+            target = audio_target(quality)
+            output_template = ydl_opts['outtmpl']
+            if target:
+                # The stream is converted into the final file, so it is kept under its own name
+                ydl_opts['outtmpl'] = os.path.splitext(output_template)[0] + '.f%(format_id)s.%(ext)s'
+                ydl_opts['fixup'] = 'never'
+                self.sequential_output = False
+            
+            # A clip's video and audio are cut and merged by the same ffmpeg call
+            if selected.get('requested_formats') and merge_pool.available and not clip:
+                try:
+                    info = self.download_and_merge(info, selected, ydl_opts, download_dir)
+                except yt_dlp.utils.DownloadError as e:
+                    # Cached URLs may have been revoked early; retry with a fresh extraction,
+                    # which continues the streams' .part files from where they stopped
+                    logger.warning(f"Cached info failed ({e}), re-extracting")
+                    info_cache.invalidate(video_id_from_url(url))
+                    info = extract_video_info(url)
+                    info = self.download_and_merge(info, select_formats(info, format_spec),
+                                                   ydl_opts, download_dir)
+            else:
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    # Download from the shared extraction, like --load-info-json does
+                    try:
+                        info = ydl.process_ie_result(info, download=True)
+                    except yt_dlp.utils.DownloadError as e:
+                        # Cached URLs may have been revoked early; retry with a fresh extraction
+                        logger.warning(f"Cached info failed ({e}), re-extracting")
+                        info_cache.invalidate(video_id_from_url(url))
+                        info = ydl.extract_info(url, download=True)
+                if target:
+                    info = self.extract_audio(info, target, output_template)
+            
+            # Find the actual downloaded file, ignoring leftovers of interrupted runs
+            completed = False
+            files = [f for f in os.listdir(download_dir) if not f.endswith(PARTIAL_SUFFIXES)]
+            if files:
+                # Get the most recently modified file (the downloaded video)
+                files_with_paths = [(f, os.path.join(download_dir, f)) for f in files]
+                files_with_paths.sort(key=lambda x: os.path.getmtime(x[1]), reverse=True)
+                
+                self.filename = files_with_paths[0][0]
+                self.filepath = files_with_paths[0][1]
+                
+                # Verify file exists and has reasonable size
+                if os.path.exists(self.filepath):
+                    actual_size = os.path.getsize(self.filepath)
+                    if actual_size > 1024:  # File should be at least 1KB
+                        completed = True
+                        logger.info(f"Download completed: {self.filename} ({actual_size} bytes)")
                     else:
                         self.status = "error"
-                        self.error = "No files found in download directory"
-                        print(f"Error: No files found in download directory: {download_dir}")
-                    
-                    # Save final session data
-                    if hasattr(self, 'session_id'):
-                        save_session(self.session_id, self)
-                    
-                    return {
-                        'success': True,
-                        'title': info.get('title', 'Unknown'),
-                        'filename': self.filename,
-                        'filepath': self.filepath,
-                        'size': f"{self.total_bytes / (1024*1024):.1f} MB"
-                    }
-                    
+                        self.error = "Downloaded file is too small or corrupted"
+                        logger.error(f"Downloaded file is too small: {actual_size} bytes")
+                else:
+                    self.status = "error"
+                    self.error = "File not found after download"
+                    logger.error(f"File not found after download: {self.filepath}")
+            else:
+                self.status = "error"
+                self.error = "No files found in download directory"
+                logger.error(f"No files found in download directory: {download_dir}")
+            
+            # Publish into the download cache so later sessions skip yt-dlp entirely. The session
+            # only reads as completed once filepath names the published file, since the move and
+            # the work dir removal would fail a file request made in between
+            if completed:
+                try:
+                    entry = download_cache.publish(info['id'], cache_format_id(info, quality, clip),
+                                                   self.filepath, self.filename)
+                    self.cache_key = entry.key
+                    self.filepath = entry.path
+                    shutil.rmtree(download_dir, ignore_errors=True)
+                except Exception as e:
+                    logger.warning(f"Could not cache download: {e}")
+                self.status = "completed"
+            else:
+                shutil.rmtree(download_dir, ignore_errors=True)
+            
+            download_duration.observe(time.time() - self.started_at, outcome=self.status)
+            
+            # Save final session data
+            if hasattr(self, 'session_id'):
+                self.save()
+            
+            return {
+                'success': True,
+                'title': info.get('title', 'Unknown'),
+                'filename': self.filename,
+                'filepath': self.filepath,
+                'size': f"{self.total_bytes / (1024*1024):.1f} MB"
+            }
+            
         except Exception as e:
             self.error = str(e)
             self.status = "error"
+            error_class = ytdlp_error_class(e)
+            ytdlp_errors.inc(stage='extract' if format_only else 'download', error_class=error_class)
+            logger.error(f"{'Format lookup' if format_only else 'Download'} failed ({error_class}): {e}")
+            if self.started_at:
+                download_duration.observe(time.time() - self.started_at, outcome='error')
+            if self.download_dir and has_partial_files(self.download_dir):
+                # A retry of the same job picks these up; the disk reaper removes them if none comes
+                logger.info(f"Keeping partial download in {self.download_dir} for a retry")
+            elif self.download_dir:
+                shutil.rmtree(self.download_dir, ignore_errors=True)
+            if not format_only:
+                self.save()
             return {
                 'success': False,
                 'error': str(e)
             }
 
-def validate_youtube_url(url):
-    """Validate if the URL is a valid YouTube URL"""
-    if not url:
-        return False
-    
-    # YouTube URL patterns
-    patterns = [
-        r'(?:https?://)?(?:www\.)?youtube\.com/watch\?v=[\w-]+',
-        r'(?:https?://)?(?:www\.)?youtube\.com/embed/[\w-]+',
-        r'(?:https?://)?(?:www\.)?youtu\.be/[\w-]+',
-        r'(?:https?://)?(?:www\.)?youtube\.com/v/[\w-]+'
-    ]
-    
-    import re
-    for pattern in patterns:
-        if re.match(pattern, url):
-            return True
-    return False
-
 @app.route('/')
 def index():
     """Main page with web-based downloader"""
     log_visit("homepage")
-    return render_template('web_downloader.html')
+    return render_template('web_downloader.html', transcode=audio_pool.available)
 
 @app.route('/health')
 def health():
     """Health check endpoint for Railway"""
-    return jsonify({'status': 'healthy', 'message': 'YouTube Downloader API is running', 'version': '1.1'})
+    return jsonify({
+        'status': 'healthy',
+        'message': 'YouTube Downloader API is running',
+        'version': '1.1',
+        'downloads': download_scheduler.stats(),
+        'rate_limits': {
+            'downloads': download_limiter.stats(),
+            'formats': format_limiter.stats(),
+            'videos': video_limiter.stats()
+        },
+        'download_cache': download_cache.stats(),
+        'jobs': job_registry.stats(),
+        'prefetch': prefetcher.stats(),
+        'batches': batch_runner.stats(),
+        'merges': merge_pool.stats(),
+        'audio': audio_pool.stats(),
+        'disk': disk_reaper.usage()
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/robots.txt')
 def robots_txt():
@@ -317,40 +930,11 @@ def analytics():
         })
     
     try:
-        if os.path.exists(analytics_file):
-            with open(analytics_file, 'r') as f:
-                data = json.load(f)
-        else:
-            data = {"visits": [], "downloads": 0}
-        
-        # Calculate stats
-        total_visits = len(data.get("visits", []))
-        total_downloads = data.get("downloads", 0)
-        
-        # Recent visits (last 24 hours)
-        from datetime import datetime, timedelta
-        now = datetime.now()
-        day_ago = now - timedelta(days=1)
-        
-        recent_visits = []
-        for visit in data.get("visits", []):
-            try:
-                visit_time = datetime.fromisoformat(visit["timestamp"])
-                if visit_time > day_ago:
-                    recent_visits.append(visit)
-            except:
-                continue
-        
         return jsonify({
             'success': True,
-            'stats': {
-                'total_visits': total_visits,
-                'total_downloads': total_downloads,
-                'visits_24h': len(recent_visits),
-                'recent_visits': recent_visits[-20:]  # Last 20 visits
-            }
+            'stats': analytics_store.stats()
         })
-        
+            
     except Exception as e:
         return jsonify({
             'success': False,
@@ -363,63 +947,75 @@ def validate_url():
     try:
         data = request.get_json()
         url = data.get('url', '').strip()
-        
+            
         is_valid = validate_youtube_url(url)
-        
+        # Extract in the background so the formats are cached by the time they are requested.
+        # The extraction counts against the format lookup limits; a limited client still gets
+        # its answer, just without the prefetch
+        if is_valid and check_rate_limit(format_limiter, request_client(), url) is None:
+            prefetch_format_listing(url)
+            
         return jsonify({
             'success': True,
             'is_valid': is_valid
         })
-        
+            
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         })
 
+def format_listing(url):
+    """Fetch the formats shown to the user for a URL; blocks for the extraction"""
+    if not validate_youtube_url(url):
+        return {
+            'success': False,
+            'error': 'Invalid YouTube URL'
+        }
+        
+    # Create temporary download manager
+    session_id = str(uuid.uuid4())
+    download_mgr = DownloadManager(session_id)
+        
+    # Get format info
+    result = download_mgr.download_video(url, 'auto', format_only=True)
+        
+    if result['success']:
+        # Format the formats for frontend
+        formats = []
+        for fmt in result['formats']:
+            if fmt.get('height') and fmt.get('ext'):
+                formats.append({
+                    'quality': f"{fmt['height']}p",
+                    'ext': fmt['ext'],
+                    'size': f"{fmt.get('filesize', 0) / (1024*1024):.1f} MB" if fmt.get('filesize') else 'Unknown',
+                    'format_id': str(fmt['format_id'])
+                })
+        
+        return {
+            'success': True,
+            'formats': formats[:5],  # Limit to 5 formats
+            'title': result['title'],
+            'message': 'Formats fetched successfully'
+        }
+    else:
+        return {
+            'success': False,
+            'error': result.get('error', 'Failed to fetch formats')
+        }
+
 @app.route('/api/list_formats', methods=['POST'])
 def list_formats():
     """List available formats for a YouTube video"""
     try:
         data = request.get_json()
         url = data.get('url', '').strip()
-        
-        if not validate_youtube_url(url):
-            return jsonify({
-                'success': False,
-                'error': 'Invalid YouTube URL'
-            })
-        
-        # Create temporary download manager
-        session_id = str(uuid.uuid4())
-        download_mgr = DownloadManager(session_id)
-        
-        # Get format info
-        result = download_mgr.download_video(url, 'auto', format_only=True)
-        
-        if result['success']:
-            # Format the formats for frontend
-            formats = []
-            for fmt in result['formats']:
-                if fmt.get('height') and fmt.get('ext'):
-                    formats.append({
-                        'quality': f"{fmt['height']}p",
-                        'ext': fmt['ext'],
-                        'size': f"{fmt.get('filesize', 0) / (1024*1024):.1f} MB" if fmt.get('filesize') else 'Unknown',
-                        'format_id': str(fmt['format_id'])
-                    })
-            
-            return jsonify({
-                'success': True,
-                'formats': formats[:5],  # Limit to 5 formats
-                'title': result['title'],
-                'message': 'Formats fetched successfully'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'error': result.get('error', 'Failed to fetch formats')
-            })
+        limited = check_rate_limit(format_limiter, request_client(), url)
+        if limited:
+            payload, status, headers = limited
+            return jsonify(payload), status, headers
+        return jsonify(format_listing(url))
             
     except Exception as e:
         return jsonify({
@@ -427,50 +1023,225 @@ def list_formats():
             'error': f'Error fetching formats: {str(e)}'
         })
 
-@app.route('/api/download', methods=['POST'])
-def start_download():
-    """Start video download"""
-    data = request.get_json()
-    url = data.get('url', '').strip()
-    quality = data.get('quality', 'best')
-    
+def run_download_job(download_mgr, url, quality, connections, inflight_key, clip=None):
+    """Run a download on a pool worker, then hand its result to every attached session"""
+    session_id = download_mgr.session_id
+    job_key = ':'.join(inflight_key)
+    download_mgr.download_video(url, quality, connections=connections, work_dir=job_work_dir(job_key), clip=clip)
+    with inflight_lock:
+        inflight_downloads.pop(inflight_key, None)
+        job_registry.release(job_key, session_id)
+        followers = list(download_mgr.followers)
+    # Every attached session holds its own reference on the shared cached file
+    if download_mgr.cache_key:
+        for _ in followers:
+            download_cache.pin(download_mgr.filepath)
+    for sid in [session_id] + followers:
+        schedule_forget(sid)
+
+def begin_download(url, quality, connections=None, clip=None, client=None, weight=1.0):
+    """Start or join a download for a URL; returns (payload, HTTP status, headers).
+
+    client and weight decide the job's fair share of the download workers.
+    """
     if not url:
-        return jsonify({'success': False, 'error': 'URL is required'})
-    
-    # Track download attempt
-    increment_downloads()
-    log_visit("download_started")
+        return {'success': False, 'error': 'URL is required'}, 200, {}
+    if clip and not merge_pool.available:
+        return {'success': False, 'error': 'Clip downloads are not available on this server'}, 200, {}
+    target = audio_target(quality)
+    if target and not audio_pool.available and needs_transcode(target):
+        return {'success': False, 'error': f'{target.upper()} downloads are not available on this server'}, 200, {}
     
     # Create download manager for this session
     session_id = str(uuid.uuid4())
     download_mgr = DownloadManager(session_id)
-    download_sessions[session_id] = download_mgr
+    download_mgr.status = "queued"
     
-    # Start download in background
-    def download():
-        result = download_mgr.download_video(url, quality)
-        # Clean up session after delay
-        time.sleep(10)
-        if session_id in download_sessions:
-            del download_sessions[session_id]
+    # Repeat requests whose info is already cached are answered from the download cache
+    info = info_cache.get(video_id_from_url(url))
+    try:
+        entry = find_cached_download(info, quality, clip) if info else None
+    except Exception as e:
+        logger.warning(f"Download cache lookup failed: {e}")
+        entry = None
+    if entry:
+        download_sessions[session_id] = download_mgr
+        download_mgr.use_cached_file(entry, info)
+        schedule_forget(session_id)
+        increment_downloads()
+        log_visit("download_started")
+        return {
+            'success': True,
+            'session_id': session_id,
+            'queue_position': None,
+            'message': 'Download ready'
+        }, 200, {}
     
-    thread = threading.Thread(target=download)
-    thread.daemon = True
-    thread.start()
+    # Run download on the bounded worker pool
+    inflight_key = download_key(url, quality, clip)
+    job_key = ':'.join(inflight_key)
+    download = lambda: run_download_job(download_mgr, url, quality, connections, inflight_key, clip)
+    # Expected size decides the job's place in the queue and whether it may take the small-job lane
+    cost = expected_download_size(url, quality, clip)
     
-    return jsonify({
+    # Attach to an identical download that is already running instead of starting another
+    with inflight_lock:
+        primary = inflight_downloads.get(inflight_key)
+        remote_primary_id = None
+        if primary is not None:
+            primary.followers.append(session_id)
+            download_sessions[session_id] = primary
+        else:
+            # Another worker process may own the same job
+            remote_primary_id = job_registry.claim(job_key, session_id, request={
+                'url': url,
+                'quality': quality,
+                'connections': connections,
+                'clip': list(clip) if clip else None
+            })
+        if remote_primary_id is not None:
+            job_registry.alias(session_id, remote_primary_id)
+        elif primary is None:
+            if not disk_reaper.has_space():
+                job_registry.release(job_key, session_id)
+                logger.warning("Rejected download: low disk space")
+                return {
+                    'success': False,
+                    'error': 'Server is low on disk space, please try again later'
+                }, 503, {'Retry-After': '60'}
+            try:
+                download_scheduler.submit(session_id, download, client=client, weight=weight, cost=cost)
+            except ClientQueueFullError as e:
+                job_registry.release(job_key, session_id)
+                logger.warning(f"Rejected download for {client}: {e}")
+                return {
+                    'success': False,
+                    'error': 'You already have several downloads running or waiting, please try again when one finishes'
+                }, 429, {'Retry-After': '30'}
+            except QueueFullError as e:
+                job_registry.release(job_key, session_id)
+                logger.warning(f"Rejected download: {e}")
+                return {
+                    'success': False,
+                    'error': 'Server is busy, please try again in a minute'
+                }, 503, {'Retry-After': '30'}
+            inflight_downloads[inflight_key] = download_mgr
+            download_sessions[session_id] = download_mgr
+    
+    if remote_primary_id is not None:
+        increment_downloads()
+        log_visit("download_started")
+        logger.info(f"Session {session_id} joined download {remote_primary_id} in another worker")
+        return {
+            'success': True,
+            'session_id': session_id,
+            'queue_position': None,
+            'message': 'Download started'
+        }, 200, {}
+    
+    if primary is not None:
+        save_session(session_id, primary)
+        increment_downloads()
+        log_visit("download_started")
+        position = download_scheduler.position(primary.session_id)
+        logger.info(f"Session {session_id} joined download {primary.session_id}")
+        return {
+            'success': True,
+            'session_id': session_id,
+            'queue_position': position,
+            'message': 'Download queued' if position else 'Download started'
+        }, 200, {}
+    
+    save_session(session_id, download_mgr)
+    position = download_scheduler.position(session_id)
+    
+    # Track download attempt
+    increment_downloads()
+    log_visit("download_started")
+    
+    return {
         'success': True,
         'session_id': session_id,
-        'message': 'Download started'
-    })
+        'queue_position': position,
+        'message': 'Download queued' if position else 'Download started'
+    }, 200, {}
 
-@app.route('/api/progress/<session_id>', methods=['GET'])
-def get_progress(session_id):
-    """Get download progress for a session"""
+@app.route('/api/download', methods=['POST'])
+def start_download():
+    """Start video download"""
+    data = request.get_json()
+    try:
+        clip = parse_clip(data.get('start_time'), data.get('end_time'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    url = data.get('url', '').strip()
+    client = request_client()
+    limited = check_rate_limit(download_limiter, client, url)
+    if limited:
+        payload, status, headers = limited
+        return jsonify(payload), status, headers
+    payload, status, headers = begin_download(url, data.get('quality', 'best'),
+                                              data.get('connections'), clip, client)
+    return jsonify(payload), status, headers
+
+def resume_interrupted_downloads():
+    """Restart downloads whose worker process died, continuing from their .part files"""
+    for job_key, session_id, job_request in job_registry.orphans():
+        if not job_registry.adopt(job_key, session_id):
+            continue
+        url, quality = job_request['url'], job_request['quality']
+        connections = job_request.get('connections')
+        clip = tuple(job_request['clip']) if job_request.get('clip') else None
+        inflight_key = download_key(url, quality, clip)
+        download_mgr = DownloadManager(session_id)
+        download_mgr.status = "queued"
+        with inflight_lock:
+            try:
+                download_scheduler.submit(session_id, lambda mgr=download_mgr, url=url, quality=quality,
+                                          connections=connections, key=inflight_key, clip=clip:
+                                          run_download_job(mgr, url, quality, connections, key, clip),
+                                          cost=expected_download_size(url, quality, clip))
+            except QueueFullError:
+                job_registry.release(job_key, session_id)
+                download_mgr.status = "error"
+                download_mgr.error = "Download was interrupted by a server restart"
+            else:
+                inflight_downloads[inflight_key] = download_mgr
+                download_sessions[session_id] = download_mgr
+        save_session(session_id, download_mgr)
+        logger.info(f"Resuming interrupted download {session_id} ({job_key})")
+
+# Give the app a moment to finish starting, then pick up downloads a dead worker left behind
+if os.environ.get('RESUME_INTERRUPTED', '1') == '1':
+    resume_timer = threading.Timer(float(os.environ.get('RESUME_DELAY', 2)), resume_interrupted_downloads)
+    resume_timer.daemon = True
+    resume_timer.start()
+
+def cancel_queued_download(session_id):
+    """Cancel a download that has not started yet, unless other sessions joined it"""
+    with inflight_lock:
+        download_mgr = download_sessions.get(session_id)
+        if download_mgr is None or download_mgr.session_id != session_id or download_mgr.followers:
+            return False
+        if not download_scheduler.cancel(session_id):
+            return False
+        for inflight_key, inflight_mgr in list(inflight_downloads.items()):
+            if inflight_mgr is download_mgr:
+                inflight_downloads.pop(inflight_key)
+                job_registry.release(':'.join(inflight_key), session_id)
+    download_mgr.status = "error"
+    download_mgr.error = "Cancelled"
+    download_mgr.save()
+    schedule_forget(session_id)
+    logger.info(f"Cancelled queued download {session_id}")
+    return True
+
+def progress_payload(session_id):
+    """Build the progress response for a session, or None if it is unknown"""
     # First check in-memory sessions
     if session_id in download_sessions:
         download_mgr = download_sessions[session_id]
-        return jsonify({
+        return {
             'success': True,
             'status': download_mgr.status,
             'progress': download_mgr.progress,
@@ -481,39 +1252,170 @@ def get_progress(session_id):
             'filename': download_mgr.filename,
             'filepath': getattr(download_mgr, 'filepath', None),
             'session_id': session_id,
+            'queue_position': download_scheduler.position(download_mgr.session_id),
+            'streamable': download_mgr.stream_path is not None,
             'error': download_mgr.error
-        })
+        }
     
-    # If not in memory, try to load from file
+    # If not in memory, try to load from the session store
     session_data = load_session(session_id)
-    if session_data:
-        return jsonify({
+    if session_data and not session_data.get('batch'):
+        stream_path = session_data.pop('stream_path', None)
+        return {
             'success': True,
             'session_id': session_id,
+            'queue_position': None,
+            'streamable': stream_path is not None,
             **session_data
-        })
+        }
+    return None
+
+@app.route('/api/progress/<session_id>', methods=['GET'])
+def get_progress(session_id):
+    """Get download progress for a session"""
+    payload = progress_payload(session_id)
+    if payload:
+        return jsonify(payload)
     
     return jsonify({
         'success': False,
         'error': 'Session not found'
     })
 
+# Minimum seconds between two progress events on one stream
+PROGRESS_STREAM_INTERVAL = float(os.environ.get('PROGRESS_STREAM_INTERVAL', 0.5))
+
+@app.route('/api/progress/<session_id>/stream', methods=['GET'])
+def stream_progress(session_id):
+    """Stream progress for a session as Server-Sent Events"""
+    def events():
+        last_payload = None
+        version = progress_broadcaster.version(session_id)
+        while True:
+            payload = progress_payload(session_id)
+            if payload is None:
+                yield f"data: {json.dumps({'success': False, 'error': 'Session not found'})}\n\n"
+                return
+            
+            # Only push when something the client shows has changed
+            if payload != last_payload:
+                yield f"data: {json.dumps(payload)}\n\n"
+                last_payload = payload
+            if payload['status'] in ('completed', 'error'):
+                return
+            
+            # Throttle, then sleep until the download publishes a change. Queued
+            # sessions and sessions owned by another process are re-read every
+            # second since nothing in this process publishes for them
+            time.sleep(PROGRESS_STREAM_INTERVAL)
+            local = session_id in download_sessions and payload['status'] != 'queued'
+            new_version = progress_broadcaster.wait(session_id, version, 15 if local else 1)
+            if new_version == version and local:
+                yield ": keepalive\n\n"
+            version = new_version
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# Container types yt-dlp produces that the platform mimetypes table may not know
+MEDIA_MIMETYPES = {
+    '.mp4': 'video/mp4',
+    '.m4a': 'audio/mp4',
+    '.webm': 'video/webm',
+    '.mkv': 'video/x-matroska',
+    '.mp3': 'audio/mpeg',
+    '.opus': 'audio/ogg',
+    '.ogg': 'audio/ogg',
+    '.flac': 'audio/flac',
+    '.wav': 'audio/wav'
+}
+
+def media_mimetype(filename):
+    """Return the mimetype for a downloaded file from its real extension"""
+    ext = os.path.splitext(filename or '')[1].lower()
+    return MEDIA_MIMETYPES.get(ext) or mimetypes.guess_type(filename or '')[0] or 'application/octet-stream'
+
+# Bytes read from a growing file per iteration while streaming
+STREAM_CHUNK_SIZE = 256 * 1024
+
+def stream_growing_file(download_mgr, f, remote=False):
+    """Yield an open file while yt-dlp is still writing it, until the download finishes"""
+    # The open handle stays valid when yt-dlp renames the .part file at the end
+    with f:
+        while True:
+            version = progress_broadcaster.version(download_mgr.session_id)
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            if chunk:
+                yield chunk
+                continue
+            if remote:
+                # Downloads in another worker only report progress through the session store
+                session_data = load_session(download_mgr.session_id) or {}
+                download_mgr.status = session_data.get('status', 'error')
+                download_mgr.error = session_data.get('error')
+            if download_mgr.status == 'error':
+                # Ending early leaves the client with a truncated, failed download
+                logger.warning(f"Stream aborted for {download_mgr.session_id}: {download_mgr.error}")
+                return
+            if download_mgr.status in ('processing', 'completed'):
+                # yt-dlp closes the file before reporting it finished, so what is
+                # left after the status changed is the final tail of the file
+                while True:
+                    chunk = f.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        return
+                    yield chunk
+            progress_broadcaster.wait(download_mgr.session_id, version, 1)
+
+def stream_download(download_mgr, remote=False):
+    """Respond with the partial file of an in-flight download, or None if it is gone"""
+    try:
+        f = open(download_mgr.stream_path, 'rb')
+    except OSError:
+        # Renamed or removed since the status check; serve the finished file instead
+        return None
+    logger.info(f"Streaming in-progress file: {download_mgr.stream_path}")
+    headers = {
+        'Content-Disposition': f"attachment; filename*=UTF-8''{quote(download_mgr.filename)}",
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+        # The file is still being written; clients can resume with a Range once it is complete
+        'Accept-Ranges': 'none'
+    }
+    # Only advertise a length when yt-dlp knows the exact size
+    if download_mgr.total_bytes:
+        headers['Content-Length'] = str(download_mgr.total_bytes)
+    body = metered_body(stream_growing_file(download_mgr, f, remote), 'stream')
+    return Response(body, mimetype=media_mimetype(download_mgr.filename), headers=headers)
+
 @app.route('/api/download_file/<session_id>', methods=['GET'])
 def download_file(session_id):
-    """Download the completed file"""
+    """Download the completed file, or stream it while it is still downloading"""
     # First check in-memory sessions
     if session_id in download_sessions:
         download_mgr = download_sessions[session_id]
+        if download_mgr.status == 'downloading' and download_mgr.stream_path:
+            response = stream_download(download_mgr)
+            if response is not None:
+                return response
     else:
         # Try to load from file
         session_data = load_session(session_id)
         if not session_data:
             return jsonify({'success': False, 'error': 'Session not found'})
-        
+            
         # Create a proper DownloadManager instance with session data
         download_mgr = DownloadManager(session_id)
         for key, value in session_data.items():
             setattr(download_mgr, key, value)
+        
+        # Downloading in another worker process: stream its partial file from disk
+        if download_mgr.status == 'downloading' and download_mgr.stream_path:
+            response = stream_download(download_mgr, remote=True)
+            if response is not None:
+                return response
     
     if download_mgr.status != 'completed':
         return jsonify({'success': False, 'error': f'Download not completed. Status: {download_mgr.status}'})
@@ -529,20 +1431,284 @@ def download_file(session_id):
     if file_size == 0:
         return jsonify({'success': False, 'error': 'File is empty (0 bytes)'})
     
-    print(f"Serving file: {download_mgr.filepath} ({file_size} bytes)")
+    logger.info(f"Serving file: {download_mgr.filepath} ({file_size} bytes)")
     
     # Serve the file directly to the user's browser (triggers browser download)
+    # Hold a reference so the download cache cannot evict the file mid-transfer
+    cache_key = download_cache.pin(download_mgr.filepath)
     try:
-        return send_file(
+        # Conditional responses answer Range and If-Range requests and send an
+        # ETag and Last-Modified, so a dropped client resumes instead of restarting
+        response = send_file(
             download_mgr.filepath,
             as_attachment=True,
             download_name=download_mgr.filename,
-            mimetype='video/mp4'
+            mimetype=media_mimetype(download_mgr.filename),
+            conditional=True,
+            etag=True
         )
+        # send_file responses bypass call_on_close, so release when the body is closed
+        response.response = ClosingIterator(metered_body(response.response, 'file'),
+                                            lambda: download_cache.release(cache_key))
+        return response
     except Exception as e:
-        print(f"Error serving file: {e}")
+        download_cache.release(cache_key)
+        logger.error(f"Error serving file: {e}")
         return jsonify({'success': False, 'error': f'Error serving file: {str(e)}'})
 
+def start_batch_item(url, quality, client=None):
+    """Start one batch item as an ordinary download and return its session ID.
+
+    Items take no download_limiter token: the batch paid one when it was
+    started, and BATCH_PARALLEL and the client's queue cap pace its items.
+    """
+    payload, status, _ = begin_download(url, quality, client=client, weight=BATCH_WEIGHT)
+    if status in (429, 503):
+        # Busy, low on disk or the client's queue share is used; the batch retries the item later
+        raise QueueFullError(payload['error'])
+    if not payload['success']:
+        raise ValueError(payload['error'])
+    return payload['session_id']
+
+def batch_item_status(session_id):
+    payload = progress_payload(session_id)
+    return payload['status'] if payload else 'error'
+
+def save_batch(job):
+    """Persist a batch snapshot so every worker can report it, and wake its streams"""
+    session_store.save(job.batch_id, job.snapshot())
+    progress_broadcaster.publish(job.batch_id)
+    if job.finished:
+        # Like a finished session, the batch's broadcaster entry is dropped once streams have seen the end
+        schedule_forget(job.batch_id)
+
+# Batches expand playlists lazily and feed a few items at a time to the download pool
+batch_runner = BatchRunner(
+    start_item=start_batch_item,
+    item_status=batch_item_status,
+    cancel_item=cancel_queued_download,
+    on_change=save_batch,
+    parallel=int(os.environ.get('BATCH_PARALLEL', 2)),
+    max_batches=int(os.environ.get('BATCH_MAX_ACTIVE', 4)),
+    max_items=int(os.environ.get('BATCH_MAX_ITEMS', 200)),
+    user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+)
+
+def batch_payload(batch_id):
+    """Build the progress response for a batch and its items, or None if it is unknown"""
+    job = batch_runner.get(batch_id)
+    snapshot = job.snapshot() if job else session_store.get(batch_id)
+    if not snapshot or not snapshot.get('batch'):
+        return None
+    
+    items = []
+    counts = {'completed': 0, 'error': 0, 'active': 0}
+    for index, item in enumerate(snapshot['items']):
+        entry = {
+            'index': index,
+            'url': item['url'],
+            'session_id': item['session_id'],
+            'status': 'error' if item['error'] else 'pending',
+            'progress': 0,
+            'filename': '',
+            'error': item['error']
+        }
+        if item['session_id']:
+            payload = progress_payload(item['session_id'])
+            if payload:
+                entry.update({key: payload.get(key) for key in ('status', 'progress', 'filename', 'error')})
+            else:
+                entry.update({'status': 'error', 'error': 'Session not found'})
+        if entry['status'] in counts:
+            counts[entry['status']] += 1
+        else:
+            counts['active'] += 1
+        items.append(entry)
+    
+    finished = snapshot['expanded'] and counts['active'] == 0
+    return {
+        'success': True,
+        'batch_id': batch_id,
+        'status': 'completed' if finished else 'running',
+        'expanded': snapshot['expanded'],
+        'cancelled': snapshot['cancelled'],
+        'error': snapshot['error'],
+        'total': len(items),
+        'completed': counts['completed'],
+        'failed': counts['error'],
+        'items': items
+    }
+
+@app.route('/api/batch', methods=['POST'])
+def start_batch():
+    """Start a batch download of several video URLs and/or playlist URLs"""
+    data = request.get_json() or {}
+    urls = data.get('urls') or []
+    if isinstance(urls, str):
+        urls = [urls]
+    urls = [url.strip() for url in urls if isinstance(url, str) and url.strip()]
+    if not urls:
+        return jsonify({'success': False, 'error': 'At least one URL is required'})
+    invalid = [url for url in urls if not is_batch_source(url)]
+    if invalid:
+        return jsonify({'success': False, 'error': f'Invalid YouTube video or playlist URL: {invalid[0]}'})
+    client = request_client()
+    limited = check_rate_limit(download_limiter, client)
+    if limited:
+        payload, status, headers = limited
+        return jsonify(payload), status, headers
+    
+    try:
+        job = batch_runner.submit(urls, data.get('quality', 'best'), client)
+    except QueueFullError as e:
+        logger.warning(f"Rejected batch: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Server is busy, please try again in a minute'
+        }), 503, {'Retry-After': '30'}
+    
+    log_visit("batch_started")
+    return jsonify({
+        'success': True,
+        'batch_id': job.batch_id,
+        'message': 'Batch started'
+    })
+
+@app.route('/api/batch/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    """Get progress for a batch and each of its items"""
+    payload = batch_payload(batch_id)
+    if payload:
+        return jsonify(payload)
+    
+    return jsonify({
+        'success': False,
+        'error': 'Batch not found'
+    })
+
+@app.route('/api/batch/<batch_id>/stream', methods=['GET'])
+def stream_batch(batch_id):
+    """Stream batch progress as Server-Sent Events, same protocol as progress streams"""
+    def events():
+        last_payload = None
+        version = progress_broadcaster.version(batch_id)
+        try:
+            while True:
+                payload = batch_payload(batch_id)
+                if payload is None:
+                    yield f"data: {json.dumps({'success': False, 'error': 'Batch not found'})}\n\n"
+                    return
+                
+                if payload != last_payload:
+                    yield f"data: {json.dumps(payload)}\n\n"
+                    last_payload = payload
+                if payload['status'] == 'completed':
+                    return
+                
+                # Batches run by another worker are re-read every second
+                time.sleep(PROGRESS_STREAM_INTERVAL)
+                local = batch_runner.get(batch_id) is not None
+                new_version = progress_broadcaster.wait(batch_id, version, 15 if local else 1)
+                if new_version == version and local:
+                    yield ": keepalive\n\n"
+                version = new_version
+        finally:
+            # Waiting on a batch this worker does not run left an entry nothing else removes
+            if batch_runner.get(batch_id) is None:
+                progress_broadcaster.discard(batch_id)
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/batch/<batch_id>/cancel', methods=['POST'])
+def cancel_batch(batch_id):
+    """Stop a batch: no new items start, queued items are cancelled, running items finish"""
+    if not batch_runner.cancel(batch_id):
+        return jsonify({'success': False, 'error': 'Batch not found or not running in this worker'})
+    return jsonify({'success': True, 'message': 'Batch cancelled'})
+
+@app.route('/api/batch/<batch_id>/download', methods=['GET'])
+def download_batch(batch_id):
+    """Download every completed item of a finished batch as one streamed ZIP (or ?format=tar)"""
+    payload = batch_payload(batch_id)
+    if payload is None:
+        return jsonify({'success': False, 'error': 'Batch not found'})
+    if payload['status'] != 'completed':
+        return jsonify({'success': False, 'error': 'Batch not completed yet'})
+    
+    files = []
+    for item in payload['items']:
+        if item['status'] != 'completed':
+            continue
+        session_data = progress_payload(item['session_id']) or {}
+        if session_data.get('filepath'):
+            files.append((item['filename'] or os.path.basename(session_data['filepath']), session_data['filepath']))
+    if not files:
+        return jsonify({'success': False, 'error': 'No completed files in this batch'})
+    return archive_response(files, batch_id, request.args.get('format', 'zip'))
+
+# Files one archive request may bundle
+ARCHIVE_MAX_FILES = int(os.environ.get('ARCHIVE_MAX_FILES', 100))
+
+def archive_response(files, archive_name, archive_format):
+    """Stream (filename, path) pairs as an uncompressed ZIP or tar archive"""
+    if archive_format not in ('zip', 'tar'):
+        return jsonify({'success': False, 'error': 'Archive format must be zip or tar'})
+    
+    # Hold references so the download cache cannot evict the files mid-transfer
+    cache_keys = [download_cache.pin(path) for _, path in files]
+    def release():
+        for cache_key in cache_keys:
+            download_cache.release(cache_key)
+    entries = list(zip(unique_names([name for name, _ in files]), [path for _, path in files]))
+    headers = {
+        'Content-Disposition': f'attachment; filename="{archive_name}.{archive_format}"',
+        'X-Accel-Buffering': 'no'
+    }
+    if archive_format == 'tar':
+        body, mimetype = tar_stream(entries), 'application/x-tar'
+        size = tar_size(entries)
+        if size is not None:
+            headers['Content-Length'] = str(size)
+    else:
+        body, mimetype = zip_stream(entries), 'application/zip'
+    logger.info(f"Serving {archive_name} as {archive_format} ({len(entries)} files)")
+    return Response(ClosingIterator(metered_body(body, 'archive'), release), mimetype=mimetype, headers=headers)
+
+@app.route('/api/archive', methods=['GET', 'POST'])
+def download_archive():
+    """Download several completed sessions as one streamed ZIP or tar archive.
+
+    GET takes ?sessions=id1,id2&format=zip so a link can start the download;
+    POST takes {"session_ids": [...], "format": "tar"}.
+    """
+    if request.method == 'POST':
+        data = request.get_json() or {}
+        session_ids = data.get('session_ids') or []
+        archive_format = data.get('format', 'zip')
+    else:
+        session_ids = [sid for sid in request.args.get('sessions', '').split(',') if sid]
+        archive_format = request.args.get('format', 'zip')
+    
+    if not session_ids:
+        return jsonify({'success': False, 'error': 'At least one session ID is required'})
+    if len(session_ids) > ARCHIVE_MAX_FILES:
+        return jsonify({'success': False, 'error': f'At most {ARCHIVE_MAX_FILES} files per archive'})
+    
+    files = []
+    for session_id in dict.fromkeys(session_ids):
+        payload = progress_payload(session_id)
+        if payload is None:
+            return jsonify({'success': False, 'error': f'Session not found: {session_id}'})
+        if payload['status'] != 'completed' or not payload.get('filepath'):
+            return jsonify({'success': False, 'error': f'Download not completed: {session_id}'})
+        if not os.path.exists(payload['filepath']):
+            return jsonify({'success': False, 'error': f'File not found on server for session {session_id}'})
+        files.append((payload['filename'] or os.path.basename(payload['filepath']), payload['filepath']))
+    return archive_response(files, 'downloads', archive_format)
+
 @app.route('/api/open_folder', methods=['POST'])
 def open_folder():
     """Open the download folder in the system file manager"""
@@ -556,7 +1722,7 @@ def open_folder():
         # Use platform-specific commands to open folder
         import platform
         system = platform.system()
-        
+            
         if system == "Darwin":  # macOS
             import subprocess
             subprocess.run(['open', folder_path], check=True)
@@ -568,9 +1734,9 @@ def open_folder():
             subprocess.run(['xdg-open', folder_path], check=True)
         else:
             return jsonify({'success': False, 'error': 'Unsupported operating system'})
-        
+            
         return jsonify({'success': True, 'message': 'Folder opened successfully'})
-        
+            
     except Exception as e:
         return jsonify({'success': False, 'error': f'Failed to open folder: {str(e)}'})
 
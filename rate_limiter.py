@@ -0,0 +1,95 @@
+"""
+Per-client and per-video request rate limits.
+
+Each key (a client address or a video ID) has a token bucket: it holds up
+to `burst` tokens, refills at `rate` tokens per second, and every request
+takes one. Buckets are refilled lazily from the time of their last use, so
+a check is a dict lookup and a little arithmetic, with no timers per key.
+
+A bucket that has refilled to `burst` behaves exactly like a missing one,
+so every `compact_interval` seconds such buckets are dropped; memory stays
+proportional to the clients seen within the last refill period.
+
+State is per process. With several gunicorn workers a client can get up
+to `workers` times the configured rate, which still stops runaway clients.
+"""
+
+import threading
+import time
+
+
+def client_address(remote_addr, forwarded_for=None, trusted_proxies=0):
+    """Return the client IP, taking it from X-Forwarded-For behind trusted proxies.
+
+    Each trusted proxy appends the address it saw, so the entry
+    `trusted_proxies` from the end is the first one a client cannot forge.
+    """
+    if trusted_proxies and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(',') if hop.strip()]
+        if len(hops) >= trusted_proxies:
+            return hops[-trusted_proxies]
+    return remote_addr or 'unknown'
+
+
+class RateLimiter:
+    """Token buckets keyed by client or video; rate 0 disables the limit"""
+
+    def __init__(self, rate, burst, compact_interval=60):
+        self.rate = rate  # tokens per second
+        self.burst = burst
+        self.compact_interval = compact_interval
+        self._buckets = {}  # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+        self._next_compact = time.monotonic() + compact_interval
+        self._allowed = 0
+        self._rejected = 0
+
+    def acquire(self, key, cost=1):
+        """Take cost tokens from key's bucket; returns 0 if allowed, else seconds until it would be"""
+        if not self.rate:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_compact:
+                self._compact(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = self.burst
+            else:
+                tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            if tokens >= cost:
+                self._buckets[key] = [tokens - cost, now]
+                self._allowed += 1
+                return 0
+            self._buckets[key] = [tokens, now]
+            self._rejected += 1
+            return (cost - tokens) / self.rate
+
+    def refund(self, key, cost=1):
+        """Return tokens taken by acquire() for a request that was rejected further on"""
+        if not self.rate:
+            return
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(self.burst, bucket[0] + cost)
+                self._allowed -= 1
+
+    def stats(self):
+        """Return bucket counts for health checks"""
+        with self._lock:
+            return {
+                'per_minute': round(self.rate * 60, 2),
+                'burst': self.burst,
+                'tracked': len(self._buckets),
+                'allowed': self._allowed,
+                'rejected': self._rejected
+            }
+
+    def _compact(self, now):
+        """Drop buckets that have refilled to full; caller holds the lock"""
+        full = [key for key, (tokens, updated_at) in self._buckets.items()
+                if tokens + (now - updated_at) * self.rate >= self.burst]
+        for key in full:
+            del self._buckets[key]
+        self._next_compact = now + self.compact_interval
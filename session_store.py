@@ -0,0 +1,219 @@
+"""
+Write-coalescing storage for download session state.
+
+Progress hooks call save() on every yt-dlp tick, which only updates an
+in-memory snapshot and marks the session dirty. A background thread flushes
+the latest snapshot of each dirty session on an interval, so a download
+produces one write per interval instead of one per progress callback.
+
+Two backends are available:
+- MemorySessionStore flushes to one JSON file per session (the historical
+  /tmp/session_<id>.json layout)
+- SQLiteSessionStore flushes every dirty session in a single transaction to
+  one database file that all workers can share
+"""
+
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """Base class holding in-process snapshots and the periodic flusher"""
+
+    def __init__(self, flush_interval=1.0, retention=3600):
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self._sessions = {}  # session_id -> (updated_at, data)
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def save(self, session_id, data):
+        """Record the latest state of a session; persisted on the next flush"""
+        with self._lock:
+            self._sessions[session_id] = (time.time(), dict(data))
+            self._dirty.add(session_id)
+
+    def get(self, session_id):
+        """Return session data, touching the backend only for foreign sessions"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        if entry:
+            return dict(entry[1])
+        try:
+            return self._read(session_id)
+        except Exception as e:
+            logger.error(f"Error loading session {session_id}: {e}")
+            return None
+
+    def delete(self, session_id):
+        """Forget a session in memory and in the backend"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._dirty.discard(session_id)
+        try:
+            self._delete(session_id)
+        except Exception as e:
+            logger.error(f"Error deleting session {session_id}: {e}")
+
+    def purge(self, max_age):
+        """Delete sessions not updated for max_age seconds; returns how many were removed"""
+        cutoff = time.time() - max_age
+        with self._lock:
+            for sid in [sid for sid, (updated_at, _) in self._sessions.items() if updated_at < cutoff]:
+                del self._sessions[sid]
+                self._dirty.discard(sid)
+        try:
+            return self._purge(cutoff)
+        except Exception as e:
+            logger.error(f"Error purging sessions: {e}")
+            return 0
+
+    def flush(self):
+        """Persist every dirty session and drop stale clean ones from memory"""
+        with self._lock:
+            batch = {sid: self._sessions[sid][1] for sid in self._dirty if sid in self._sessions}
+            self._dirty.clear()
+            cutoff = time.time() - self.retention
+            for sid in [sid for sid, (updated_at, _) in self._sessions.items()
+                        if updated_at < cutoff and sid not in batch]:
+                del self._sessions[sid]
+        if not batch:
+            return
+        try:
+            self._write_batch(batch)
+        except Exception as e:
+            logger.error(f"Error flushing {len(batch)} sessions: {e}")
+            with self._lock:
+                self._dirty.update(sid for sid in batch if sid in self._sessions)
+
+    def close(self):
+        """Stop the flusher and write out anything still pending"""
+        if not self._stop.is_set():
+            self._stop.set()
+            self.flush()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _write_batch(self, batch):
+        raise NotImplementedError
+
+    def _read(self, session_id):
+        raise NotImplementedError
+
+    def _delete(self, session_id):
+        raise NotImplementedError
+
+    def _purge(self, cutoff):
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Keeps sessions in memory and flushes them to per-session JSON files"""
+
+    def __init__(self, directory='/tmp', **kwargs):
+        self.directory = directory
+        super().__init__(**kwargs)
+
+    def _path(self, session_id):
+        return os.path.join(self.directory, f"session_{session_id}.json")
+
+    def _write_batch(self, batch):
+        for session_id, data in batch.items():
+            path = self._path(session_id)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+
+    def _read(self, session_id):
+        path = self._path(session_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _delete(self, session_id):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def _purge(self, cutoff):
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if not (entry.name.startswith('session_') and entry.name.endswith('.json')):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+class SQLiteSessionStore(SessionStore):
+    """Keeps sessions in memory and flushes them to a shared SQLite database"""
+
+    def __init__(self, path='/tmp/sessions.db', **kwargs):
+        self.path = path
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+        super().__init__(**kwargs)
+
+    def _write_batch(self, batch):
+        now = time.time()
+        rows = [(sid, json.dumps(data), now) for sid, data in batch.items()]
+        with self._db_lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)',
+                rows
+            )
+
+    def _read(self, session_id):
+        with self._db_lock:
+            row = self._conn.execute(
+                'SELECT data FROM sessions WHERE session_id = ?', (session_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _delete(self, session_id):
+        with self._db_lock, self._conn:
+            self._conn.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+
+    def _purge(self, cutoff):
+        with self._db_lock, self._conn:
+            return self._conn.execute('DELETE FROM sessions WHERE updated_at < ?', (cutoff,)).rowcount
+
+
+def create_session_store():
+    """Build the session store selected by the SESSION_STORE environment variable"""
+    backend = os.environ.get('SESSION_STORE', 'memory').lower()
+    flush_interval = float(os.environ.get('SESSION_FLUSH_INTERVAL', 1.0))
+    if backend == 'sqlite':
+        path = os.environ.get('SESSION_DB_PATH', '/tmp/sessions.db')
+        logger.info(f"Using SQLite session store at {path}")
+        return SQLiteSessionStore(path, flush_interval=flush_interval)
+    if backend != 'memory':
+        logger.warning(f"Unknown SESSION_STORE '{backend}', falling back to memory")
+    return MemorySessionStore(os.environ.get('SESSION_DIR', '/tmp'), flush_interval=flush_interval)
@@ -0,0 +1,114 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from archive_stream import tar_size, tar_stream, unique_names, zip_stream
+
+
+def make_entries(tmp_path, sizes, name='file'):
+    entries = []
+    for i, size in enumerate(sizes):
+        path = tmp_path / f"{i}.bin"
+        path.write_bytes(os.urandom(size))
+        entries.append((f"{name} {i}.bin", str(path)))
+    return entries
+
+
+@pytest.mark.parametrize('sizes', [
+    [],
+    [0],
+    [1],
+    [511],
+    [512],
+    [513],
+    [10239, 10240, 10241],
+    [3 * 1024 * 1024 + 7],
+])
+def test_tar_size_matches_the_stream(tmp_path, sizes):
+    entries = make_entries(tmp_path, sizes)
+    data = b''.join(tar_stream(entries))
+    assert tar_size(entries) == len(data)
+    assert len(data) % tarfile.RECORDSIZE == 0
+
+
+def test_tar_size_with_long_and_unicode_names(tmp_path):
+    entries = make_entries(tmp_path, [100, 2000], name='Ünïcødé title ' + 'x' * 150)
+    data = b''.join(tar_stream(entries))
+    assert tar_size(entries) == len(data)
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        assert archive.getnames() == [arcname for arcname, _ in entries]
+
+
+def test_tar_stream_contents(tmp_path):
+    entries = make_entries(tmp_path, [0, 700, 5000])
+    data = b''.join(tar_stream(entries, block_size=256))
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        for arcname, path in entries:
+            with open(path, 'rb') as f:
+                assert archive.extractfile(arcname).read() == f.read()
+
+
+def test_tar_stream_yields_bounded_blocks(tmp_path):
+    entries = make_entries(tmp_path, [5000])
+    chunks = list(tar_stream(entries, block_size=1024))
+    assert max(len(chunk) for chunk in chunks) <= 10240
+    assert sum(len(chunk) for chunk in chunks) == tar_size(entries)
+
+
+def test_tar_skips_unreadable_files(tmp_path):
+    entries = make_entries(tmp_path, [100, 200])
+    entries.insert(1, ('missing.bin', str(tmp_path / 'missing.bin')))
+    assert tar_size(entries) is None
+    data = b''.join(tar_stream(entries))
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        assert archive.getnames() == ['file 0.bin', 'file 1.bin']
+    assert len(data) == tar_size([entries[0], entries[2]])
+
+
+def test_tar_stream_keeps_the_header_size_when_a_file_shrinks(tmp_path):
+    entries = make_entries(tmp_path, [3000])
+    stream = tar_stream(entries, block_size=1000)
+    expected = tar_size(entries)
+    chunks = [next(stream), next(stream)]
+    with open(entries[0][1], 'r+b') as f:
+        f.truncate(1500)
+    chunks.extend(stream)
+    assert sum(len(chunk) for chunk in chunks) == expected
+
+
+@pytest.mark.parametrize('sizes', [[], [0], [1, 1024 * 1024, 1024 * 1024 + 1]])
+def test_zip_stream_contents(tmp_path, sizes):
+    entries = make_entries(tmp_path, sizes)
+    chunks = list(zip_stream(entries, block_size=64 * 1024))
+    # An empty chunk would end a chunked response
+    assert all(chunks)
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == [arcname for arcname, _ in entries]
+        for info, (_, path) in zip(archive.infolist(), entries):
+            assert info.compress_type == zipfile.ZIP_STORED
+            assert info.file_size == os.path.getsize(path)
+            with open(path, 'rb') as f:
+                assert archive.read(info) == f.read()
+
+
+def test_zip_stream_holds_one_block_at_a_time(tmp_path):
+    entries = make_entries(tmp_path, [1024 * 1024])
+    chunks = list(zip_stream(entries, block_size=64 * 1024))
+    assert max(len(chunk) for chunk in chunks) <= 64 * 1024 + 1024
+
+
+def test_zip_skips_unreadable_files(tmp_path):
+    entries = make_entries(tmp_path, [10])
+    entries.append(('missing.bin', str(tmp_path / 'missing.bin')))
+    with zipfile.ZipFile(io.BytesIO(b''.join(zip_stream(entries)))) as archive:
+        assert archive.namelist() == ['file 0.bin']
+
+
+def test_unique_names():
+    assert unique_names(['a.mp4', 'b.mp4', 'a.mp4', 'a.mp4', 'a (2).mp4']) == \
+        ['a.mp4', 'b.mp4', 'a (2).mp4', 'a (3).mp4', 'a (2) (2).mp4']
+    assert unique_names(['noext', 'noext']) == ['noext', 'noext (2)']
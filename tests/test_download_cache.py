@@ -0,0 +1,170 @@
+import os
+import time
+
+import pytest
+
+from download_cache import DownloadCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DownloadCache(str(tmp_path / 'cache'), max_bytes=1000)
+
+
+def make_file(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b'x' * size)
+    return str(path)
+
+
+def publish(cache, tmp_path, video_id, size=100, format_id='18'):
+    src = make_file(tmp_path, f"{video_id}-{format_id}.mp4", size)
+    return cache.publish(video_id, format_id, src, f"{video_id}.mp4")
+
+
+def end_lease(entry, age=3600):
+    """Make an entry look unused by every process for age seconds"""
+    past = time.time() - age
+    os.utime(f"{entry.path}.json", (past, past))
+    entry.last_access = past
+
+
+def test_publish_moves_the_file_into_the_cache(cache, tmp_path):
+    src = make_file(tmp_path, 'video.mp4', 100)
+    entry = cache.publish('abc', '18', src, 'Title.mp4')
+    assert not os.path.exists(src)
+    assert entry.path.startswith(cache.root)
+    assert entry.path.endswith('.mp4')
+    assert entry.filename == 'Title.mp4'
+    assert entry.size == 100
+    assert entry.refs == 1
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['bytes'] == 100
+
+
+def test_key_depends_on_video_and_format():
+    keys = {DownloadCache.make_key('abc', '18'), DownloadCache.make_key('abc', '22'),
+            DownloadCache.make_key('abd', '18')}
+    assert len(keys) == 3
+    assert DownloadCache.make_key('abc', '18') == DownloadCache.make_key('abc', '18')
+
+
+def test_acquire_counts_hits_and_misses(cache, tmp_path):
+    entry = publish(cache, tmp_path, 'abc')
+    cache.release(entry.key)
+    assert cache.acquire('abc', '22') is None
+    assert cache.acquire(None, '18') is None
+    hit = cache.acquire('abc', '18')
+    assert hit is entry
+    assert hit.refs == 1
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_publishing_existing_content_keeps_the_first_file(cache, tmp_path):
+    first = publish(cache, tmp_path, 'abc')
+    src = make_file(tmp_path, 'again.mp4', 100)
+    second = cache.publish('abc', '18', src, 'again.mp4')
+    assert second is first
+    assert first.refs == 2
+    assert not os.path.exists(src)
+    assert cache.stats()['bytes'] == 100
+
+
+def test_pin_references_an_entry_by_path(cache, tmp_path):
+    entry = publish(cache, tmp_path, 'abc')
+    cache.release(entry.key)
+    assert cache.pin(entry.path) == entry.key
+    assert entry.refs == 1
+    assert cache.pin(str(tmp_path / 'elsewhere.mp4')) is None
+
+
+def test_release_never_goes_below_zero(cache, tmp_path):
+    entry = publish(cache, tmp_path, 'abc')
+    cache.release(entry.key)
+    cache.release(entry.key)
+    cache.release(None)
+    assert entry.refs == 0
+
+
+def test_file_removed_behind_the_cache_s_back_is_forgotten(cache, tmp_path):
+    entry = publish(cache, tmp_path, 'abc')
+    cache.release(entry.key)
+    os.remove(entry.path)
+    assert cache.acquire('abc', '18') is None
+    assert cache.stats()['entries'] == 0
+    assert cache.stats()['bytes'] == 0
+
+
+def test_least_recently_used_idle_entries_are_evicted(cache, tmp_path):
+    entries = [publish(cache, tmp_path, f"v{i}", size=400) for i in range(2)]
+    for age, entry in zip((2000, 1000), entries):
+        cache.release(entry.key)
+        end_lease(entry, age)
+    third = publish(cache, tmp_path, 'v2', size=400)
+    # 1200 bytes is over budget; the oldest idle entry goes first
+    assert not os.path.exists(entries[0].path)
+    assert not os.path.exists(f"{entries[0].path}.json")
+    assert os.path.exists(entries[1].path)
+    assert os.path.exists(third.path)
+    assert cache.stats()['bytes'] == 800
+
+
+def test_referenced_entries_are_not_evicted(cache, tmp_path):
+    held = publish(cache, tmp_path, 'held', size=600)
+    end_lease(held)
+    other = publish(cache, tmp_path, 'other', size=600)
+    assert os.path.exists(held.path)
+    assert os.path.exists(other.path)
+    assert cache.evict_to(0) == 0
+    # Dropping the last reference evicts it to get back under budget
+    cache.release(held.key)
+    assert not os.path.exists(held.path)
+    assert cache.stats()['bytes'] == 600
+
+
+def test_expire_removes_only_idle_old_entries(cache, tmp_path):
+    old = publish(cache, tmp_path, 'old')
+    recent = publish(cache, tmp_path, 'recent')
+    held = publish(cache, tmp_path, 'held')
+    for entry in (old, recent):
+        cache.release(entry.key)
+    end_lease(old)
+    end_lease(held)
+    assert cache.expire(600) == 1
+    assert not os.path.exists(old.path)
+    assert os.path.exists(recent.path)
+    assert os.path.exists(held.path)
+
+
+def test_entries_survive_a_restart(cache, tmp_path):
+    entry = publish(cache, tmp_path, 'abc')
+    reopened = DownloadCache(cache.root, max_bytes=1000)
+    hit = reopened.acquire('abc', '18')
+    assert hit.path == entry.path
+    assert hit.filename == 'abc.mp4'
+    assert reopened.stats()['bytes'] == 100
+
+
+def test_files_published_by_another_process_are_found(cache, tmp_path):
+    other = DownloadCache(cache.root, max_bytes=1000)
+    publish(other, tmp_path, 'abc')
+    assert cache.acquire('abc', '18') is not None
+
+
+def test_entry_leased_by_another_process_is_not_reaped(cache, tmp_path):
+    entry = publish(cache, tmp_path, 'abc')
+    cache.release(entry.key)
+    end_lease(entry)
+    other = DownloadCache(cache.root, max_bytes=1000, lease=300)
+    assert other.acquire('abc', '18') is not None
+    # This process holds no reference, but the other one's lease protects the file
+    assert cache.expire(600) == 0
+    assert cache.evict_to(0) == 0
+    assert os.path.exists(entry.path)
+    end_lease(entry)
+    assert other.renew_leases() == 1
+    assert cache.evict_to(0) == 0
+    end_lease(entry)
+    assert cache.evict_to(0) == 1
+    assert not os.path.exists(entry.path)
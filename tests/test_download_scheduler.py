@@ -0,0 +1,198 @@
+import threading
+import time
+
+import pytest
+
+import download_scheduler
+from download_scheduler import ClientQueueFullError, DownloadScheduler, FairScheduler, QueueFullError
+
+
+def wait_until_running(scheduler, job_id):
+    # Polls a bounded number of times, since some tests freeze time.monotonic
+    for _ in range(5000):
+        if scheduler.position(job_id) == 0:
+            return
+        time.sleep(0.001)
+    raise AssertionError(f"no worker took {job_id}")
+
+
+class Recorder:
+    """Holds a scheduler's only regular worker so jobs can be queued, then records the order they run in"""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.order = []
+        self.gate = threading.Event()
+        self._done = threading.Semaphore(0)
+        scheduler.submit('gate', self.gate.wait)
+        wait_until_running(scheduler, 'gate')
+
+    def job(self, job_id):
+        def run():
+            self.order.append(job_id)
+            self._done.release()
+        return run
+
+    def wait(self, count):
+        for _ in range(count):
+            assert self._done.acquire(timeout=5), f"only {self.order} ran"
+        return self.order
+
+    def drain(self, count):
+        self.gate.set()
+        return self.wait(count)
+
+
+def test_fifo_order_and_positions():
+    scheduler = DownloadScheduler(workers=1, max_queue=5)
+    recorder = Recorder(scheduler)
+    assert [scheduler.submit(job_id, recorder.job(job_id)) for job_id in 'abc'] == [1, 2, 3]
+    assert scheduler.position('gate') == 0
+    assert scheduler.position('b') == 2
+    assert scheduler.position('unknown') is None
+    assert recorder.drain(3) == ['a', 'b', 'c']
+
+
+def test_full_queue_is_rejected():
+    scheduler = DownloadScheduler(workers=1, max_queue=2)
+    recorder = Recorder(scheduler)
+    scheduler.submit('a', recorder.job('a'))
+    scheduler.submit('b', recorder.job('b'))
+    with pytest.raises(QueueFullError):
+        scheduler.submit('c', recorder.job('c'))
+    assert scheduler.cancel('a')
+    assert not scheduler.cancel('a')
+    scheduler.submit('c', recorder.job('c'))
+    assert recorder.drain(2) == ['b', 'c']
+
+
+def test_clients_take_turns():
+    scheduler = FairScheduler(workers=1, max_queue=10)
+    recorder = Recorder(scheduler)
+    for job_id in ('a1', 'a2', 'a3'):
+        scheduler.submit(job_id, recorder.job(job_id), client='a')
+    assert scheduler.submit('b1', recorder.job('b1'), client='b') == 2
+    assert scheduler.stats()['clients'] == 2
+    assert recorder.drain(4) == ['a1', 'b1', 'a2', 'a3']
+
+
+def test_workers_are_shared_by_weight():
+    scheduler = FairScheduler(workers=1, max_queue=10)
+    recorder = Recorder(scheduler)
+    for job_id in ('a1', 'a2', 'a3', 'a4'):
+        scheduler.submit(job_id, recorder.job(job_id), client='a', weight=2)
+    for job_id in ('b1', 'b2'):
+        scheduler.submit(job_id, recorder.job(job_id), client='b')
+    assert recorder.drain(6) == ['a1', 'a2', 'b1', 'a3', 'a4', 'b2']
+
+
+def test_per_client_cap_counts_running_and_queued_jobs():
+    scheduler = FairScheduler(workers=1, max_queue=10, max_per_client=2)
+    gate = threading.Event()
+    scheduler.submit('running', gate.wait, client='a')
+    wait_until_running(scheduler, 'running')
+    scheduler.submit('queued', lambda: None, client='a')
+    with pytest.raises(ClientQueueFullError):
+        scheduler.submit('extra', lambda: None, client='a')
+    # Other clients and jobs without a client are not affected
+    scheduler.submit('other', lambda: None, client='b')
+    scheduler.submit('anonymous1', lambda: None)
+    scheduler.submit('anonymous2', lambda: None)
+    scheduler.submit('anonymous3', lambda: None)
+    assert scheduler.cancel('queued')
+    scheduler.submit('extra', lambda: None, client='a')
+    gate.set()
+
+
+def test_client_cap_error_is_a_queue_full_error():
+    assert issubclass(ClientQueueFullError, QueueFullError)
+
+
+def test_cancel_moves_the_client_s_later_jobs_up():
+    scheduler = FairScheduler(workers=1, max_queue=10)
+    recorder = Recorder(scheduler)
+    for job_id in ('a1', 'a2'):
+        scheduler.submit(job_id, recorder.job(job_id), client='a')
+    scheduler.submit('b1', recorder.job('b1'), client='b')
+    assert scheduler.position('a2') == 3
+    assert scheduler.cancel('a1')
+    assert scheduler.position('a2') == 1
+    assert scheduler.position('a1') is None
+    assert recorder.drain(2) == ['a2', 'b1']
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(download_scheduler.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_client_s_shortest_jobs_start_first():
+    scheduler = FairScheduler(workers=1, max_queue=10, unit_cost=100)
+    recorder = Recorder(scheduler)
+    for job_id, cost in (('long', 300), ('short', 100), ('medium', 200)):
+        scheduler.submit(job_id, recorder.job(job_id), client='a', cost=cost)
+    assert [scheduler.position(job_id) for job_id in ('short', 'medium', 'long')] == [1, 2, 3]
+    assert recorder.drain(3) == ['short', 'medium', 'long']
+
+
+def test_equal_costs_keep_arrival_order():
+    scheduler = FairScheduler(workers=1, max_queue=10, unit_cost=100)
+    recorder = Recorder(scheduler)
+    for job_id in ('first', 'second', 'third'):
+        scheduler.submit(job_id, recorder.job(job_id), client='a', cost=100)
+    assert recorder.drain(3) == ['first', 'second', 'third']
+
+
+def test_unknown_cost_counts_as_one_unit():
+    scheduler = FairScheduler(workers=1, max_queue=10, unit_cost=100)
+    recorder = Recorder(scheduler)
+    scheduler.submit('big', recorder.job('big'), client='a', cost=250)
+    scheduler.submit('unknown', recorder.job('unknown'), client='a')
+    scheduler.submit('small', recorder.job('small'), client='a', cost=50)
+    assert recorder.drain(3) == ['small', 'unknown', 'big']
+
+
+def test_short_job_of_another_client_goes_first():
+    scheduler = FairScheduler(workers=1, max_queue=10, unit_cost=100)
+    recorder = Recorder(scheduler)
+    scheduler.submit('a-long', recorder.job('a-long'), client='a', cost=500)
+    assert scheduler.submit('b-short', recorder.job('b-short'), client='b', cost=100) == 1
+    assert recorder.drain(2) == ['b-short', 'a-long']
+
+
+def test_waiting_jobs_age_ahead_of_newer_short_ones(clock):
+    scheduler = FairScheduler(workers=1, max_queue=10, unit_cost=100, aging=10)
+    recorder = Recorder(scheduler)
+    scheduler.submit('a-long', recorder.job('a-long'), client='a', cost=500)
+    # Five units of cost are worth 50s of waiting; after 60s the long job no longer yields
+    clock[0] += 60
+    scheduler.submit('b-short', recorder.job('b-short'), client='b', cost=100)
+    assert scheduler.position('a-long') == 1
+    assert recorder.drain(2) == ['a-long', 'b-short']
+
+
+def test_short_waits_do_not_age_past_newer_short_jobs(clock):
+    scheduler = FairScheduler(workers=1, max_queue=10, unit_cost=100, aging=10)
+    recorder = Recorder(scheduler)
+    scheduler.submit('a-long', recorder.job('a-long'), client='a', cost=500)
+    clock[0] += 30
+    scheduler.submit('b-short', recorder.job('b-short'), client='b', cost=100)
+    assert scheduler.position('b-short') == 1
+    assert recorder.drain(2) == ['b-short', 'a-long']
+
+
+def test_small_lane_runs_short_jobs_while_regular_workers_are_busy():
+    scheduler = FairScheduler(workers=1, max_queue=10, unit_cost=100, small_workers=1, small_cost=100)
+    recorder = Recorder(scheduler)
+    scheduler.submit('long', recorder.job('long'), client='a', cost=1000)
+    scheduler.submit('unknown', recorder.job('unknown'), client='a')
+    scheduler.submit('short', recorder.job('short'), client='b', cost=50)
+    # Only the short job may use the small lane; the others wait for the held regular worker
+    assert recorder.wait(1) == ['short']
+    assert scheduler.position('long') and scheduler.position('unknown')
+    stats = scheduler.stats()
+    assert stats['small_workers'] == 1
+    assert stats['small_queued'] == 0
+    assert recorder.drain(2) == ['short', 'unknown', 'long']
@@ -0,0 +1,129 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, client_address
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_burst_then_wait_time(clock):
+    limiter = RateLimiter(rate=2, burst=3)
+    assert [limiter.acquire('a') for _ in range(3)] == [0, 0, 0]
+    # Empty bucket: one token refills in 1 / rate seconds
+    assert limiter.acquire('a') == pytest.approx(0.5)
+    clock[0] += 0.25
+    assert limiter.acquire('a') == pytest.approx(0.25)
+
+
+def test_refill_is_capped_at_burst(clock):
+    limiter = RateLimiter(rate=1, burst=2)
+    limiter.acquire('a')
+    limiter.acquire('a')
+    clock[0] += 100
+    assert [limiter.acquire('a') for _ in range(2)] == [0, 0]
+    assert limiter.acquire('a') == pytest.approx(1.0)
+
+
+def test_partial_refill(clock):
+    limiter = RateLimiter(rate=4, burst=1)
+    assert limiter.acquire('a') == 0
+    clock[0] += 0.125
+    # Half a token back; the other half takes another 0.125s
+    assert limiter.acquire('a') == pytest.approx(0.125)
+    clock[0] += 0.125
+    assert limiter.acquire('a') == 0
+
+
+def test_cost_takes_several_tokens(clock):
+    limiter = RateLimiter(rate=1, burst=5)
+    assert limiter.acquire('a', cost=4) == 0
+    assert limiter.acquire('a', cost=3) == pytest.approx(2.0)
+    assert limiter.acquire('a', cost=1) == 0
+
+
+def test_keys_have_separate_buckets(clock):
+    limiter = RateLimiter(rate=1, burst=1)
+    assert limiter.acquire('a') == 0
+    assert limiter.acquire('a') > 0
+    assert limiter.acquire('b') == 0
+
+
+def test_rejection_does_not_take_tokens(clock):
+    limiter = RateLimiter(rate=1, burst=1)
+    limiter.acquire('a')
+    clock[0] += 0.5
+    assert limiter.acquire('a') == pytest.approx(0.5)
+    clock[0] += 0.5
+    assert limiter.acquire('a') == 0
+
+
+def test_refund_returns_tokens_and_the_allowed_count(clock):
+    limiter = RateLimiter(rate=1, burst=2)
+    limiter.acquire('a')
+    limiter.acquire('a')
+    limiter.refund('a')
+    assert limiter.stats()['allowed'] == 1
+    assert limiter.acquire('a') == 0
+    assert limiter.acquire('a') == pytest.approx(1.0)
+
+
+def test_refund_is_capped_at_burst(clock):
+    limiter = RateLimiter(rate=1, burst=2)
+    limiter.acquire('a')
+    limiter.refund('a', cost=5)
+    assert [limiter.acquire('a') for _ in range(2)] == [0, 0]
+    assert limiter.acquire('a') > 0
+
+
+def test_refund_of_an_unknown_key_is_ignored(clock):
+    limiter = RateLimiter(rate=1, burst=2)
+    limiter.refund('a')
+    assert limiter.stats()['tracked'] == 0
+    assert limiter.stats()['allowed'] == 0
+
+
+def test_zero_rate_disables_the_limit(clock):
+    limiter = RateLimiter(rate=0, burst=0)
+    assert all(limiter.acquire('a') == 0 for _ in range(100))
+    limiter.refund('a')
+    assert limiter.stats()['tracked'] == 0
+
+
+def test_stats_count_allowed_and_rejected(clock):
+    limiter = RateLimiter(rate=0.5, burst=1)
+    limiter.acquire('a')
+    limiter.acquire('a')
+    limiter.acquire('b')
+    assert limiter.stats() == {'per_minute': 30.0, 'burst': 1, 'tracked': 2, 'allowed': 2, 'rejected': 1}
+
+
+def test_full_buckets_are_compacted(clock):
+    limiter = RateLimiter(rate=1, burst=2, compact_interval=10)
+    limiter.acquire('a')
+    limiter.acquire('b', cost=2)
+    clock[0] += 1.5
+    limiter.acquire('c')
+    # Compaction waits for its interval
+    assert limiter.stats()['tracked'] == 3
+    clock[0] += 10
+    limiter.acquire('c')
+    # Every bucket had refilled; only c, taken from again just now, is left
+    assert limiter.stats()['tracked'] == 1
+
+
+@pytest.mark.parametrize('remote, forwarded, trusted, expected', [
+    ('10.0.0.1', None, 0, '10.0.0.1'),
+    ('10.0.0.1', '1.2.3.4', 0, '10.0.0.1'),
+    ('10.0.0.1', '1.2.3.4', 1, '1.2.3.4'),
+    ('10.0.0.1', 'forged, 1.2.3.4', 1, '1.2.3.4'),
+    ('10.0.0.1', 'forged, 1.2.3.4, 10.0.0.2', 2, '1.2.3.4'),
+    ('10.0.0.1', '1.2.3.4', 2, '10.0.0.1'),
+    (None, None, 0, 'unknown'),
+])
+def test_client_address(remote, forwarded, trusted, expected):
+    assert client_address(remote, forwarded, trusted) == expected
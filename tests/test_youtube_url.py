@@ -0,0 +1,87 @@
+import pytest
+
+from youtube_url import parse_youtube_url, playlist_id_from_url, validate_youtube_url, video_id_from_url
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+CANONICAL = f"https://www.youtube.com/watch?v={VIDEO_ID}"
+
+
+@pytest.mark.parametrize('url', [
+    f"https://www.youtube.com/watch?v={VIDEO_ID}",
+    f"http://youtube.com/watch?v={VIDEO_ID}",
+    f"youtube.com/watch?v={VIDEO_ID}",
+    f"https://m.youtube.com/watch?v={VIDEO_ID}",
+    f"https://music.youtube.com/watch?v={VIDEO_ID}",
+    f"https://www.youtube.com/watch/?v={VIDEO_ID}",
+    f"https://youtu.be/{VIDEO_ID}",
+    f"https://youtu.be/{VIDEO_ID}/",
+    f"https://www.youtube.com/embed/{VIDEO_ID}",
+    f"https://www.youtube-nocookie.com/embed/{VIDEO_ID}",
+    f"https://www.youtube.com/shorts/{VIDEO_ID}",
+    f"https://www.youtube.com/live/{VIDEO_ID}",
+    f"https://www.youtube.com/v/{VIDEO_ID}",
+    f"  https://youtu.be/{VIDEO_ID}  ",
+])
+def test_accepted_shapes_share_one_video_id(url):
+    parsed = parse_youtube_url(url)
+    assert parsed.video_id == VIDEO_ID
+    assert parsed.canonical_url == CANONICAL
+    assert video_id_from_url(url) == VIDEO_ID
+    assert validate_youtube_url(url)
+
+
+def test_other_query_parameters_are_ignored():
+    parsed = parse_youtube_url(f"https://www.youtube.com/watch?t=42&v={VIDEO_ID}&list=PL123&si=abc#comments")
+    assert parsed.video_id == VIDEO_ID
+    assert parsed.ignored_params == {'t': '42', 'list': 'PL123', 'si': 'abc'}
+
+
+def test_path_url_query_parameters_are_ignored():
+    parsed = parse_youtube_url(f"https://youtu.be/{VIDEO_ID}?t=7")
+    assert parsed.video_id == VIDEO_ID
+    assert parsed.ignored_params == {'t': '7'}
+
+
+def test_duplicate_v_keeps_the_last_value():
+    other = 'aaaaaaaaaaa'
+    assert video_id_from_url(f"https://www.youtube.com/watch?v={other}&v={VIDEO_ID}") == VIDEO_ID
+    parsed = parse_youtube_url(f"https://www.youtube.com/watch?v={other}&t=1&v={VIDEO_ID}")
+    assert parsed.video_id == VIDEO_ID
+    assert parsed.ignored_params == {'t': '1'}
+
+
+def test_duplicate_v_with_an_invalid_last_value_is_rejected():
+    assert parse_youtube_url(f"https://www.youtube.com/watch?v={VIDEO_ID}&v=short") is None
+    assert parse_youtube_url(f"https://www.youtube.com/watch?v={VIDEO_ID}&v={VIDEO_ID}X") is None
+
+
+@pytest.mark.parametrize('url', [
+    f"https://www.youtube.com/watch?v={VIDEO_ID}X",
+    f"https://www.youtube.com/watch?v={VIDEO_ID}-",
+    f"https://youtu.be/{VIDEO_ID}X",
+    f"https://www.youtube.com/embed/{VIDEO_ID}X",
+    f"https://www.youtube.com/shorts/{VIDEO_ID}X?feature=share",
+])
+def test_over_long_ids_are_rejected(url):
+    assert parse_youtube_url(url) is None
+    assert video_id_from_url(url) is None
+    assert not validate_youtube_url(url)
+
+
+@pytest.mark.parametrize('url', [
+    None,
+    '',
+    'https://www.youtube.com/watch?v=short',
+    'https://www.youtube.com/watch?list=PL123',
+    f"https://vimeo.com/watch?v={VIDEO_ID}",
+    f"https://youtu.be/{VIDEO_ID}/extra",
+    'https://www.youtube.com/playlist?list=PL123',
+])
+def test_non_video_urls_are_rejected(url):
+    assert parse_youtube_url(url) is None
+    assert not validate_youtube_url(url)
+
+
+def test_playlist_id():
+    assert playlist_id_from_url('https://www.youtube.com/playlist?list=PLabc_-123') == 'PLabc_-123'
+    assert playlist_id_from_url(f"https://www.youtube.com/watch?v={VIDEO_ID}&list=PL123") is None
@@ -6,8 +6,12 @@ import tempfile
 import threading
 import time
 import uuid
-from urllib.parse import urlparse
 import json
+from download_scheduler import DownloadScheduler, QueueFullError
+from download_options import concurrency_options
+from format_metadata import extract_format_listing
+from youtube_url import validate_youtube_url
+from media_merge import AudioPool, audio_format_spec, audio_target
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
@@ -18,6 +22,18 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 # Store download sessions
 download_sessions = {}
 
+# Fixed-size worker pool so bursts queue up instead of spawning unbounded yt-dlp jobs
+download_scheduler = DownloadScheduler(
+    workers=int(os.environ.get('DOWNLOAD_WORKERS', 2)),
+    max_queue=int(os.environ.get('DOWNLOAD_QUEUE_SIZE', 20))
+)
+
+# Audio-only downloads are copied or transcoded by ffmpeg with bounded concurrency
+audio_pool = AudioPool(
+    workers=int(os.environ.get('TRANSCODE_WORKERS', 1)),
+    ffmpeg=os.environ.get('FFMPEG_PATH', 'ffmpeg')
+)
+
 class DownloadManager:
     def __init__(self, session_id):
         self.session_id = session_id
@@ -75,6 +91,18 @@ class DownloadManager:
                 'status': 'processing'
             }, room=self.session_id)
     
+    def extract_audio(self, info, target, output_template):
+        """Turn the downloaded stream into an audio file of the target format"""
+        def on_progress(percent):
+            self.status = "converting"
+            socketio.emit('download_progress', {
+                'session_id': self.session_id,
+                'status': 'converting',
+                'progress': percent
+            }, room=self.session_id)
+        
+        audio_pool.extract(info, target, output_template, on_progress)
+    
     def download_video(self, url, quality, format_only=False):
         """Download video with specified quality or format ID"""
         try:
@@ -89,8 +117,13 @@ class DownloadManager:
             temp_dir = tempfile.mkdtemp()
             
             # Configure yt-dlp options
-            # quality can be either a format ID (e.g., "18") or a quality string (e.g., "720p")
-            if quality == "auto":
+            # quality can be either a format ID (e.g., "18"), a quality string (e.g., "720p")
+            # or an audio-only choice (e.g., "audio-mp3")
+            target = audio_target(quality)
+            if target:
+                format_spec = audio_format_spec(target, copy_only=not audio_pool.available)
+                print(f"🎵 Audio only: {format_spec}")
+            elif quality == "auto":
                 format_spec = "best"
             elif quality.isdigit():
                 # If it's a number, treat it as a format ID
@@ -110,80 +143,77 @@ class DownloadManager:
                 'progress_hooks': [self.progress_hook],
                 'ignoreerrors': False,
                 'no_warnings': False,
-                'extractaudio': False,
             }
+            if target:
+                # The stream is converted into the final file, so it is kept under its own name
+                ydl_opts['outtmpl'] = os.path.join(temp_dir, '%(title)s.f%(format_id)s.%(ext)s')
+                ydl_opts['fixup'] = 'never'
             
             if format_only:
-                # Just get format info - ultra-optimized for speed
-                ydl_opts['quiet'] = True
-                ydl_opts['no_warnings'] = True
-                ydl_opts['extract_flat'] = True  # Faster extraction
-                ydl_opts['skip_download'] = True  # Skip download info
-                ydl_opts['no_color'] = True  # Disable colors
-                ydl_opts['no_check_certificate'] = True  # Skip SSL verification for speed
-                ydl_opts['socket_timeout'] = 10  # 10 second timeout
-                ydl_opts['retries'] = 1  # Minimal retries for speed
+                # Just get format info from the lightweight listing path
+                os.rmdir(temp_dir)  # nothing is written for a listing
+                info = extract_format_listing(url)
+                formats = info.get('formats', [])
+                title = info.get('title', 'Unknown Video')
                 
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    formats = info.get('formats', [])
-                    title = info.get('title', 'Unknown Video')
-                    
-                    # Format the formats list - ultra-optimized processing
-                    formatted_formats = []
-                    seen_qualities = set()  # Avoid duplicates
+                # Format the formats list - ultra-optimized processing
+                formatted_formats = []
+                seen_qualities = set()  # Avoid duplicates
 
-                    # Only process video formats (skip audio-only)
-                    video_formats = [f for f in formats if f.get('height') and f.get('ext') in ['mp4', 'webm']]
+                # Only process video formats (skip audio-only)
+                video_formats = [f for f in formats if f.get('height') and f.get('ext') in ['mp4', 'webm']]
 
-                    for fmt in video_formats:
-                        height = fmt.get('height')
-                        ext = fmt.get('ext')
-                        quality = f"{height}p"
+                for fmt in video_formats:
+                    height = fmt.get('height')
+                    ext = fmt.get('ext')
+                    quality = f"{height}p"
 
-                        # Only add if we haven't seen this quality
-                        if quality not in seen_qualities:
-                            seen_qualities.add(quality)
+                    # Only add if we haven't seen this quality
+                    if quality not in seen_qualities:
+                        seen_qualities.add(quality)
 
-                            # Try multiple ways to get file size
-                            filesize = fmt.get('filesize') or fmt.get('filesize_approx')
-                            if filesize:
-                                size_mb = f"{filesize / (1024*1024):.1f} MB"
-                            else:
-                                # Estimate size based on quality and duration
-                                duration = info.get('duration', 0)
-                                if duration and height:
-                                    # Rough estimate: 1MB per minute for 720p, 2MB for 1080p
-                                    if height >= 1080:
-                                        estimated_mb = (duration / 60) * 2
-                                    elif height >= 720:
-                                        estimated_mb = (duration / 60) * 1.5
-                                    else:
-                                        estimated_mb = (duration / 60) * 1
-                                    size_mb = f"~{estimated_mb:.1f} MB (estimated)"
+                        # Try multiple ways to get file size
+                        filesize = fmt.get('filesize') or fmt.get('filesize_approx')
+                        if filesize:
+                            size_mb = f"{filesize / (1024*1024):.1f} MB"
+                        else:
+                            # Estimate size based on quality and duration
+                            duration = info.get('duration', 0)
+                            if duration and height:
+                                # Rough estimate: 1MB per minute for 720p, 2MB for 1080p
+                                if height >= 1080:
+                                    estimated_mb = (duration / 60) * 2
+                                elif height >= 720:
+                                    estimated_mb = (duration / 60) * 1.5
                                 else:
-                                    size_mb = "Size unknown"
+                                    estimated_mb = (duration / 60) * 1
+                                size_mb = f"~{estimated_mb:.1f} MB (estimated)"
+                            else:
+                                size_mb = "Size unknown"
 
-                            formatted_formats.append({
-                                'quality': quality,
-                                'ext': ext,
-                                'size': size_mb,
-                                'format_id': fmt.get('format_id', 'best')  # Store the actual format ID
-                            })
-                    
-                    # Sort by quality (highest first) - limit to top 5 for speed
-                    formatted_formats.sort(key=lambda x: int(x['quality'][:-1]) if x['quality'][:-1].isdigit() else 0, reverse=True)
-                    formatted_formats = formatted_formats[:5]  # Only show top 5 qualities
-                    
-                    return {
-                        'success': True,
-                        'title': title,
-                        'formats': formatted_formats
-                    }
+                        formatted_formats.append({
+                            'quality': quality,
+                            'ext': ext,
+                            'size': size_mb,
+                            'format_id': fmt.get('format_id', 'best')  # Store the actual format ID
+                        })
+                
+                # Sort by quality (highest first) - limit to top 5 for speed
+                formatted_formats.sort(key=lambda x: int(x['quality'][:-1]) if x['quality'][:-1].isdigit() else 0, reverse=True)
+                formatted_formats = formatted_formats[:5]  # Only show top 5 qualities
+                
+                return {
+                    'success': True,
+                    'title': title,
+                    'formats': formatted_formats
+                }
             else:
-                # Download the video
+                # Download the video with parallel fragments and ranged chunks
+                ydl_opts.update(concurrency_options())
                 with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([url])
+                    info = ydl.extract_info(url, download=True)
+                if target:
+                    self.extract_audio(info, target, os.path.join(temp_dir, '%(title)s.%(ext)s'))
                 
                 # Find the downloaded file
                 files = os.listdir(temp_dir)
@@ -241,7 +271,7 @@ class DownloadManager:
 @app.route('/')
 def index():
     """Main page with web-based downloader"""
-    return render_template('web_downloader.html')
+    return render_template('web_downloader.html', transcode=audio_pool.available)
 
 @app.route('/health')
 def health():
@@ -257,9 +287,7 @@ def validate_url():
     if not url:
         return jsonify({'valid': False, 'error': 'URL is required'})
     
-    # Check if it's a YouTube URL
-    parsed = urlparse(url)
-    is_valid = 'youtube.com' in parsed.netloc or 'youtu.be' in parsed.netloc
+    is_valid = validate_youtube_url(url)
     
     return jsonify({
         'valid': is_valid,
@@ -313,24 +341,33 @@ def start_download():
     # Create download manager for this session
     session_id = str(uuid.uuid4())
     download_mgr = DownloadManager(session_id)
+    download_mgr.status = "queued"
     download_sessions[session_id] = download_mgr
     
-    # Start download in background
+    # Run download on the bounded worker pool
     def download():
         result = download_mgr.download_video(url, quality)
-        # Clean up session after delay
-        time.sleep(10)
-        if session_id in download_sessions:
-            del download_sessions[session_id]
+        # Clean up session after delay without holding the worker
+        cleanup = threading.Timer(10, download_sessions.pop, args=(session_id, None))
+        cleanup.daemon = True
+        cleanup.start()
+    
+    try:
+        download_scheduler.submit(session_id, download)
+    except QueueFullError:
+        del download_sessions[session_id]
+        return jsonify({
+            'success': False,
+            'error': 'Server is busy, please try again in a minute'
+        }), 503, {'Retry-After': '30'}
     
-    thread = threading.Thread(target=download)
-    thread.daemon = True
-    thread.start()
+    position = download_scheduler.position(session_id)
     
     return jsonify({
         'success': True,
         'session_id': session_id,
-        'message': 'Download started'
+        'queue_position': position,
+        'message': 'Download queued' if position else 'Download started'
     })
 
 @app.route('/api/open_folder', methods=['POST'])
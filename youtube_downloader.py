@@ -4,12 +4,17 @@ import yt_dlp
 import os
 import threading
 from urllib.parse import urlparse
+from media_merge import AudioPool, audio_format_spec, audio_target
+from download_options import clip_label, clip_options, parse_clip
+
+# Audio-only downloads are copied or transcoded by ffmpeg, one conversion at a time
+audio_pool = AudioPool(workers=1)
 
 class YouTubeDownloader:
     def __init__(self, root):
         self.root = root
         self.root.title("YouTube Video Downloader")
-        self.root.geometry("700x500")  # Increased window size
+        self.root.geometry("700x550")  # Increased window size
         self.root.resizable(True, True)  # Allow resizing
         
         # Configure style
@@ -48,7 +53,8 @@ class YouTubeDownloader:
         ttk.Label(main_frame, text="Quality:", font=("Arial", 10, "bold")).grid(row=3, column=0, sticky=tk.W, pady=8)
         self.quality_var = tk.StringVar(value="best")
         quality_combo = ttk.Combobox(main_frame, textvariable=self.quality_var, 
-                                    values=["best", "worst", "720p", "480p", "360p", "auto"], 
+                                    values=["best", "worst", "720p", "480p", "360p", "auto",
+                                            "audio-m4a", "audio-opus", "audio-mp3"], 
                                     state="readonly", width=18, font=("Arial", 10))
         quality_combo.grid(row=3, column=1, sticky=tk.W, pady=8, padx=(10, 0))
         
@@ -57,14 +63,26 @@ class YouTubeDownloader:
                                      command=self.list_formats, width=20)
         list_formats_btn.grid(row=3, column=2, padx=(10, 0), pady=8)
         
+        # Optional clip range; only the part between start and end is downloaded
+        ttk.Label(main_frame, text="Clip (optional):", font=("Arial", 10, "bold")).grid(row=4, column=0, sticky=tk.W, pady=8)
+        clip_frame = ttk.Frame(main_frame)
+        clip_frame.grid(row=4, column=1, columnspan=2, sticky=tk.W, pady=8, padx=(10, 0))
+        ttk.Label(clip_frame, text="from", font=("Arial", 10)).pack(side=tk.LEFT)
+        self.clip_start_entry = ttk.Entry(clip_frame, width=10, font=("Arial", 10))
+        self.clip_start_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Label(clip_frame, text="to", font=("Arial", 10)).pack(side=tk.LEFT)
+        self.clip_end_entry = ttk.Entry(clip_frame, width=10, font=("Arial", 10))
+        self.clip_end_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Label(clip_frame, text="(e.g. 1:30 or 90)", font=("Arial", 9), foreground="gray").pack(side=tk.LEFT)
+        
         # Download button
         self.download_btn = ttk.Button(main_frame, text="Download Video", 
                                       command=self.start_download, style="Accent.TButton", width=25)
-        self.download_btn.grid(row=4, column=0, columnspan=3, pady=25)
+        self.download_btn.grid(row=5, column=0, columnspan=3, pady=25)
         
         # Progress section
         progress_frame = ttk.LabelFrame(main_frame, text="Download Progress", padding="15")
-        progress_frame.grid(row=5, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
+        progress_frame.grid(row=6, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
         progress_frame.columnconfigure(0, weight=1)
         
         # Progress bar with percentage
@@ -119,6 +137,12 @@ class YouTubeDownloader:
             messagebox.showerror("Error", "Please select a valid download location")
             return
         
+        try:
+            clip = parse_clip(self.clip_start_entry.get(), self.clip_end_entry.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid clip range: {e}")
+            return
+        
         # Reset progress
         self.progress['value'] = 0
         self.downloaded_bytes = 0
@@ -133,7 +157,7 @@ class YouTubeDownloader:
         self.download_info.config(text="")
         
         # Start download in thread
-        download_thread = threading.Thread(target=self.download_video, args=(url, download_path))
+        download_thread = threading.Thread(target=self.download_video, args=(url, download_path, clip))
         download_thread.daemon = True
         download_thread.start()
     
@@ -230,12 +254,16 @@ class YouTubeDownloader:
         self.status_label.config(text="Failed to fetch formats")
         messagebox.showerror("Error", f"Failed to fetch formats:\n\n{error_msg}")
     
-    def download_video(self, url, download_path):
+    def download_video(self, url, download_path, clip=None):
         try:
             # Configure yt-dlp options with better format handling
             quality = self.quality_var.get()
+            target = audio_target(quality)
             
-            if quality == "auto":
+            if target:
+                # Fetch only the smallest suitable audio stream, then copy or convert it
+                format_spec = audio_format_spec(target, copy_only=not audio_pool.available)
+            elif quality == "auto":
                 # Let yt-dlp automatically choose the best available format
                 format_spec = "best"
             elif quality in ["720p", "480p", "360p"]:
@@ -245,20 +273,34 @@ class YouTubeDownloader:
             else:
                 format_spec = quality
             
+            title = f"%(title)s ({clip_label(clip)})" if clip else '%(title)s'
+            output_template = os.path.join(download_path, f"{title}.%(ext)s")
+            if target:
+                # The stream is converted into the final file, so it is kept under its own name
+                download_template = os.path.join(download_path, f"{title}.f%(format_id)s.%(ext)s")
+            else:
+                download_template = output_template
+            
             # First attempt with standard options
             ydl_opts = {
-                'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
+                'outtmpl': download_template,
                 'format': format_spec,
                 'progress_hooks': [self.progress_hook],
                 'ignoreerrors': False,
                 'no_warnings': False,
-                'extractaudio': False,  # Don't extract audio only
-                'audioformat': 'mp3',
             }
+            if target:
+                ydl_opts['fixup'] = 'never'
+            if clip:
+                # ffmpeg fetches only the range and cuts it on keyframes without re-encoding
+                ydl_opts.update(clip_options(clip))
+                self.root.after(0, lambda: self.status_label.config(text="Downloading clip..."))
             
             try:
                 with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([url])
+                    info = ydl.extract_info(url, download=True)
+                if target:
+                    self.extract_audio(info, target, output_template)
                 # Update UI on success
                 self.root.after(0, self.download_complete, True)
                 return
@@ -268,16 +310,21 @@ class YouTubeDownloader:
                 
                 # Try with different format selection
                 fallback_opts = {
-                    'outtmpl': os.path.join(download_path, '%(title)s.%(ext)s'),
-                    'format': 'best',  # Just use best available
+                    'outtmpl': download_template,
+                    'format': 'bestaudio/best' if target else 'best',  # Just use best available
                     'progress_hooks': [self.progress_hook],
                     'ignoreerrors': False,
                     'no_warnings': False,
-                    'extractaudio': False,
                 }
+                if target:
+                    fallback_opts['fixup'] = 'never'
+                if clip:
+                    fallback_opts.update(clip_options(clip))
                 
                 with yt_dlp.YoutubeDL(fallback_opts) as ydl:
-                    ydl.download([url])
+                    info = ydl.extract_info(url, download=True)
+                if target:
+                    self.extract_audio(info, target, output_template)
                 
                 # Update UI on success
                 self.root.after(0, self.download_complete, True)
@@ -286,6 +333,14 @@ class YouTubeDownloader:
             # Update UI on error
             self.root.after(0, self.download_complete, False, str(e))
     
+    def extract_audio(self, info, target, output_template):
+        """Turn the downloaded stream into an audio file of the target format"""
+        def on_progress(percent):
+            self.root.after(0, lambda: self.progress.config(value=percent))
+            self.root.after(0, lambda: self.status_label.config(text=f"Converting audio... {percent:.0f}%"))
+        
+        audio_pool.extract(info, target, output_template, on_progress)
+    
     def progress_hook(self, d):
         """Real-time progress tracking"""
         if d['status'] == 'downloading':
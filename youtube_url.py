@@ -0,0 +1,74 @@
+"""
+Parsing of YouTube video URLs.
+
+One precompiled pattern recognises every accepted URL shape and captures
+the 11 character video ID in the same pass:
+- youtube.com/watch?v=ID (v may appear anywhere in the query; the last v wins)
+- youtu.be/ID
+- youtube.com/embed/ID and youtube-nocookie.com/embed/ID
+- youtube.com/shorts/ID, youtube.com/live/ID and youtube.com/v/ID
+
+with or without a scheme, on the www., m. and music. hosts. Caches, job
+coalescing and rate limits key on the video ID, so every spelling of a
+video shares one entry. Query parameters other than v (t, list, si,
+feature, ...) do not change the video and are returned as ignored_params.
+
+Playlist links (youtube.com/playlist?list=ID) are recognised separately by
+playlist_id_from_url(); a watch URL that carries a list parameter still
+names a single video.
+"""
+
+import re
+from collections import namedtuple
+from urllib.parse import parse_qsl
+
+_URL_RE = re.compile(
+    r'\s*(?:https?://)?(?:(?:www|m|music)\.)?'
+    r'(?:'
+    r'youtube\.com/watch/?\?(?P<watch_query>(?:[^#]*?&)?v=(?P<watch_id>[\w-]{11})(?![\w-])(?![^#]*&v=)[^#]*)'
+    r'|(?:youtube\.com/(?:embed|shorts|live|v)|youtube-nocookie\.com/embed|youtu\.be)/(?P<path_id>[\w-]{11})'
+    r'(?:/?\?(?P<path_query>[^#]*)|/?(?=#|\s*$))'
+    r')',
+    re.IGNORECASE
+)
+
+_PLAYLIST_RE = re.compile(
+    r'\s*(?:https?://)?(?:(?:www|m|music)\.)?youtube\.com/playlist/?\?(?:[^#]*?&)?list=(?P<list_id>[\w-]+)',
+    re.IGNORECASE
+)
+
+ParsedURL = namedtuple('ParsedURL', ['video_id', 'canonical_url', 'ignored_params'])
+
+
+def parse_youtube_url(url):
+    """Return a ParsedURL for a YouTube video URL, or None if it is not one"""
+    match = _URL_RE.match(url or '')
+    if not match:
+        return None
+    video_id = match.group('watch_id') or match.group('path_id')
+    query = match.group('watch_query') or match.group('path_query')
+    ignored_params = {}
+    if query:
+        for key, value in parse_qsl(query, keep_blank_values=True):
+            if key != 'v':
+                ignored_params[key] = value
+    return ParsedURL(video_id, f"https://www.youtube.com/watch?v={video_id}", ignored_params)
+
+
+def video_id_from_url(url):
+    """Return the YouTube video ID for a URL, or None if it has none"""
+    match = _URL_RE.match(url or '')
+    if not match:
+        return None
+    return match.group('watch_id') or match.group('path_id')
+
+
+def validate_youtube_url(url):
+    """Validate if the URL is a valid YouTube URL"""
+    return _URL_RE.match(url or '') is not None
+
+
+def playlist_id_from_url(url):
+    """Return the playlist ID of a YouTube playlist URL, or None if it is not one"""
+    match = _PLAYLIST_RE.match(url or '')
+    return match.group('list_id') if match else None